@@ -0,0 +1,268 @@
+"""
+Batch position analysis.
+
+Scores a stream of positions (one FEN or EPD per line, or PGN games) and
+yields one result per position, in input order:
+
+    {"id": ..., "fen": ..., "best_move": "e2e4", "score": 35, "depth": 6,
+     "nodes": 12345, "time": 0.81}
+
+score is in centipawns from the side to move's view, as in UCI. Searches
+run in a SearchExecutor process pool with a bounded number of positions in
+flight, and input is read lazily, so memory stays flat however large the
+input is. mode="eval" skips the search and reports evaluate_board instead,
+scoring EVAL_BATCH_SIZE positions at a time with batch_eval when NumPy is
+installed.
+
+Used by POST /analyze, and from the command line:
+
+    python analysis.py puzzles.epd --movetime 500 --workers 4 > results.jsonl
+    python analysis.py games.pgn --depth 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import chess
+import chess.pgn
+
+import batch_eval
+import chess_ai
+from search_pool import PoolSaturated, SearchExecutor
+
+INPUT_FORMATS = ("auto", "fen", "epd", "pgn")
+ANALYSIS_MODES = ("search", "eval")
+
+# Positions scored together by mode="eval"
+EVAL_BATCH_SIZE = 256
+
+# Extra time a search gets beyond its movetime before its result is given up on
+ANALYSIS_GRACE_S = 5
+
+
+class _PushbackReader:
+    """Line reader that can return lines already read (used to sniff the format)."""
+
+    def __init__(self, stream, lines=()):
+        self.stream = stream
+        self.lines = deque(lines)
+
+    def readline(self):
+        if self.lines:
+            return self.lines.popleft()
+        return self.stream.readline()
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+def read_positions(stream, input_format="auto"):
+    """
+    Yields (id, board) for every position in a text stream. FEN and EPD
+    input has one position per line (the EPD "id" opcode names it); PGN
+    input yields every position of each game's mainline, named
+    "<game>:<ply>". Unparseable lines yield (id, None) so they can be reported.
+    """
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"Unknown input format: {input_format}")
+    reader = _PushbackReader(stream)
+
+    if input_format == "auto":
+        skipped = []
+        line = reader.readline()
+        while line and not line.strip():
+            skipped.append(line)
+            line = reader.readline()
+        reader = _PushbackReader(stream, skipped + [line])
+        input_format = "pgn" if line.lstrip().startswith(("[", "1.")) else "epd"
+
+    if input_format == "pgn":
+        game_number = 0
+        while True:
+            game = chess.pgn.read_game(reader)
+            if game is None:
+                return
+            game_number += 1
+            board = game.board()
+            yield f"{game_number}:0", board.copy(stack=False)
+            for ply, move in enumerate(game.mainline_moves(), 1):
+                board.push(move)
+                yield f"{game_number}:{ply}", board.copy(stack=False)
+        return
+
+    for line_number, line in enumerate(reader, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        position_id = str(line_number)
+        try:
+            board = chess.Board(line)  # Plain FEN, with move counters
+        except ValueError:
+            try:
+                board, ops = chess.Board.from_epd(line)
+            except ValueError:
+                yield position_id, None
+                continue
+            position_id = str(ops.get("id", position_id))
+        yield position_id, board
+
+
+def _game_over_result(board):
+    """Result for a position without moves to search."""
+    if board.is_checkmate():
+        score = -chess_ai.MATE_SCORE
+    else:
+        score = 0
+    return {"best_move": None, "score": score, "depth": 0, "nodes": 0, "time": 0.0,
+            "result": board.result(claim_draw=False)}
+
+
+def evaluate_positions(batch):
+    """
+    mode="eval": fills in (result, board) pairs with evaluate_board, turned to
+    the side to move's view. time is each position's share of the batch.
+    """
+    started = time.perf_counter()
+    boards = [board for _, board in batch]
+    if batch_eval.np is not None:
+        scores = batch_eval.evaluate_batch(boards).tolist()
+    else:
+        scores = [chess_ai.evaluate_board(board) for board in boards]
+    elapsed = (time.perf_counter() - started) / len(batch)
+    for (result, board), score in zip(batch, scores):
+        result.update(best_move=None, score=score if board.turn == chess.WHITE else -score,
+                      depth=0, nodes=0, time=elapsed)
+
+
+def analyze(positions, executor, budget=None, window=None, mode="search"):
+    """
+    Analyses (id, board) pairs and yields a result dict for each, in input
+    order. At most window positions (default: what the executor accepts
+    without queueing further) are searched at the same time. mode="eval"
+    needs no executor.
+    """
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    budget = dict(budget or {}, use_book=False)
+    if window is None:
+        window = executor.workers + executor.max_queue if executor is not None else 1
+    timeout = budget["movetime"] / 1000 + ANALYSIS_GRACE_S if budget.get("movetime") else None
+    pending = deque()  # (result, job or None), oldest first
+    batch = []  # (result, board) waiting to be evaluated, mode="eval"
+
+    def finish(result, job):
+        if job is not None:
+            try:
+                found = job.result(timeout)
+            except Exception as error:
+                result["error"] = str(error) or type(error).__name__
+            else:
+                result.update(best_move=found["move"], score=found["score"], depth=found["depth"],
+                              nodes=found["nodes"] + found["qnodes"],
+                              time=found["finished"] - found["started"])
+        return result
+
+    for position_id, board in positions:
+        result = {"id": position_id, "fen": board.fen() if board is not None else None}
+        job = None
+        if board is None:
+            result["error"] = "Invalid position"
+        elif not board.is_valid():
+            result["error"] = "Illegal position"
+        elif board.is_game_over():
+            result.update(_game_over_result(board))
+        elif mode == "eval":
+            batch.append((result, board))
+        else:
+            while job is None:
+                if len(pending) >= window:
+                    yield finish(*pending.popleft())
+                    continue
+                try:
+                    job = executor.submit(board.fen(), (), (), budget)
+                except PoolSaturated:
+                    # The pool is shared with other callers: wait for our oldest search
+                    if pending:
+                        yield finish(*pending.popleft())
+                    else:
+                        time.sleep(0.1)
+        pending.append((result, job))
+        if batch:
+            if len(batch) < EVAL_BATCH_SIZE:
+                continue  # Results wait for their batch's scores
+            evaluate_positions(batch)
+            batch = []
+        while pending and (pending[0][1] is None or pending[0][1].done()):
+            yield finish(*pending.popleft())
+
+    if batch:
+        evaluate_positions(batch)
+    while pending:
+        yield finish(*pending.popleft())
+
+
+def create_analysis_executor():
+    """
+    Process pool for POST /analyze, kept apart from the game searches so a
+    large batch cannot starve live games. ANALYSIS_WORKERS defaults to 1.
+    """
+    workers = int(os.environ.get("ANALYSIS_WORKERS", 1))
+    return SearchExecutor(workers=workers, max_queue=workers)
+
+
+def summary(count, started):
+    """Throughput line closing a result stream."""
+    elapsed = time.perf_counter() - started
+    return {"summary": {"positions": count, "time": elapsed,
+                        "positions_per_sec": count / elapsed if elapsed > 0 else 0.0}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse FEN/EPD/PGN positions, writing JSONL results")
+    parser.add_argument("input", nargs="?", default="-", help="input file (default: stdin)")
+    parser.add_argument("--format", choices=INPUT_FORMATS, default="auto")
+    parser.add_argument("--mode", choices=ANALYSIS_MODES, default="search")
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--movetime", type=int, help="milliseconds per position")
+    parser.add_argument("--nodes", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    budget = {name: getattr(args, name) for name in ("depth", "movetime", "nodes")
+              if getattr(args, name) is not None}
+    if not budget:
+        budget["depth"] = chess_ai.DEFAULT_DEPTH
+
+    # Results go to stdout; the engine's own prints (here and in the workers) to stderr
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    stream = sys.stdin if args.input == "-" else open(args.input)
+    executor = SearchExecutor(workers=args.workers, max_queue=args.workers) if args.mode == "search" else None
+    started = time.perf_counter()
+    count = 0
+    try:
+        for result in analyze(read_positions(stream, args.format), executor, budget, mode=args.mode):
+            count += 1
+            print(json.dumps(result), file=output, flush=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if stream is not sys.stdin:
+            stream.close()
+    result = summary(count, started)
+    print(json.dumps(result), file=output, flush=True)
+    print(f"Analysed {count} positions in {result['summary']['time']:.1f}s "
+          f"({result['summary']['positions_per_sec']:.1f} positions/sec)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+NumPy batch evaluation.
+
+evaluate_batch() scores many positions at once, equal to evaluate_board on
+each. The static terms, material and piece-square tables (endgame tables
+once few pieces remain), king pawn shield and pawn structure (doubled,
+isolated and passed pawns), are computed from each position's twelve piece
+bitboards with array operations over the whole batch. Mobility and center
+control need move generation and stay per board; the legal move count also
+tells mates and stalemates apart, which evaluate_board finds with separate
+game-over checks. analysis.py scores mode="eval" batches with it.
+
+NumPy is optional; without it evaluate_batch raises ImportError.
+"""
+import chess
+
+import chess_ai
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency
+    np = None
+
+
+_tables = None
+
+
+def _get_tables():
+    """Lookup tables as arrays, built on first use."""
+    global _tables
+    if _tables is None:
+        _tables = {
+            "material": np.array(chess_ai.MATERIAL_BY_INDEX, dtype=np.int64),
+            "midgame_pst": np.array(chess_ai.MIDGAME_PST_BY_INDEX, dtype=np.int64),
+            "endgame_pst": np.array(chess_ai.ENDGAME_PST_BY_INDEX, dtype=np.int64),
+            "files": np.array(chess.BB_FILES, dtype=np.uint64),
+            "passed": np.array(chess_ai.PASSED_PAWN_MASKS, dtype=np.uint64),
+            "shield": np.array(chess_ai.KING_SHIELD_MASKS, dtype=np.uint64),
+            # Passed pawn bonus by color and square
+            "passed_bonus": np.array(
+                [[chess_ai.PASSED_PAWN_BONUS[7 - chess.square_rank(square)] for square in chess.SQUARES],
+                 [chess_ai.PASSED_PAWN_BONUS[chess.square_rank(square)] for square in chess.SQUARES]],
+                dtype=np.int64),
+        }
+    return _tables
+
+
+def _popcount(bitboards):
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+        return np.bitwise_count(bitboards).astype(np.int64)
+    bits = np.unpackbits(bitboards[..., np.newaxis].view(np.uint8), axis=-1)
+    return bits.sum(axis=-1, dtype=np.int64)
+
+
+def piece_bitboards(boards):
+    """
+    (N, 12) uint64 array of piece bitboards, in Zobrist piece order
+    (2 * (piece_type - 1) + color), so bit s of column i is table index 64 * i + s.
+    """
+    rows = [[board.pieces_mask(piece_type, color)
+             for piece_type in chess.PIECE_TYPES for color in (chess.BLACK, chess.WHITE)]
+            for board in boards]
+    return np.array(rows, dtype=np.uint64).reshape(len(rows), 12)
+
+
+def evaluate_batch(boards):
+    """evaluate_board (White's view) of each board; returns an int64 array."""
+    if np is None:
+        raise ImportError("evaluate_batch needs NumPy (pip install numpy)")
+    tables = _get_tables()
+    bitboards = piece_bitboards(boards)
+    count = len(bitboards)
+
+    # One bit per (piece, square): little-endian bytes put square s at bit s
+    squares = np.unpackbits(bitboards.view(np.uint8), axis=1, bitorder="little").astype(np.int64)
+    material = squares @ tables["material"]
+    piece_count = squares.sum(axis=1)
+    is_endgame = piece_count <= chess_ai.ENDGAME_PIECE_COUNT
+    score = material + np.where(is_endgame, squares @ tables["endgame_pst"],
+                                squares @ tables["midgame_pst"])
+
+    pawn_column = 2 * (chess.PAWN - 1)
+    king_column = 2 * (chess.KING - 1)
+    pawns = [bitboards[:, pawn_column + chess.BLACK], bitboards[:, pawn_column + chess.WHITE]]
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        own, enemy = pawns[color], pawns[not color]
+
+        # King shield
+        king_squares = squares[:, 64 * (king_column + color):64 * (king_column + color + 1)]
+        has_king = king_squares.any(axis=1)
+        shield = tables["shield"][int(color)][king_squares.argmax(axis=1)]
+        score += sign * np.where(has_king, _popcount(shield & own), 0) * chess_ai.KING_SHIELD_BONUS
+
+        # Doubled and isolated pawns from the per-file counts
+        on_file = _popcount(own[:, np.newaxis] & tables["files"][np.newaxis, :])
+        score -= sign * np.maximum(on_file - 1, 0).sum(axis=1) * chess_ai.DOUBLED_PAWN_PENALTY
+        occupied_files = on_file > 0
+        neighbours = np.zeros_like(occupied_files)
+        neighbours[:, 1:] |= occupied_files[:, :-1]
+        neighbours[:, :-1] |= occupied_files[:, 1:]
+        score -= sign * (on_file * ~neighbours).sum(axis=1) * chess_ai.ISOLATED_PAWN_PENALTY
+
+        # Passed pawns: own pawns with no enemy pawn in their passed-pawn mask
+        own_squares = squares[:, 64 * (pawn_column + color):64 * (pawn_column + color + 1)]
+        blocked = (enemy[:, np.newaxis] & tables["passed"][int(color)][np.newaxis, :]) != 0
+        score += sign * (own_squares * ~blocked * tables["passed_bonus"][int(color)]).sum(axis=1)
+
+    score = score.reshape(count)
+
+    # Terms that need move generation, and the game-over scores of evaluate_board
+    for index, board in enumerate(boards):
+        mobility = chess_ai.evaluate_mobility(board)
+        if not mobility and not any(board.generate_legal_moves()):
+            score[index] = (-100000 if board.turn else 100000) if board.is_check() else 0
+        elif board.is_insufficient_material():
+            score[index] = 0
+        else:
+            score[index] += mobility + chess_ai.evaluate_center_control(board)
+    return score
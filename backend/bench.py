@@ -0,0 +1,205 @@
+"""
+Engine benchmark and regression check.
+
+Searches every position of an EPD suite (bench_positions.epd by default) to a
+fixed depth with fresh search caches, then times the evaluation terms and
+move ordering on the same positions:
+
+    python bench.py --depth 4 --json bench.json
+    python bench.py --depth 4 --compare bench.json --threshold 5
+
+The total node count is the bench signature: it only changes when the search
+or the evaluation does, so a change meant to be a pure speedup must keep it.
+Per position it reports the move, nodes, time, nodes/sec and the time at
+which each depth was reached; the microbenchmarks report microseconds per
+call. --compare reads the JSON of an earlier run, prints both side by side
+and exits with status 1 when nodes/sec (overall or of a microbenchmark)
+dropped by more than --threshold percent, or when the signature changed and
+--same-signature was given.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import chess_ai
+import tablebase
+from bench_alloc import DEFAULT_POSITIONS, load_positions
+from result_cache import engine_version
+
+# Functions timed by the microbenchmarks: name -> function(board)
+MICROBENCHMARKS = {
+    "simple_evaluate": chess_ai.simple_evaluate,
+    "evaluate_board": chess_ai.evaluate_board,
+    "evaluate_opening_principles": chess_ai.evaluate_opening_principles,
+    "evaluate_piece_activity": chess_ai.evaluate_piece_activity,
+    "evaluate_king_safety_simple": chess_ai.evaluate_king_safety_simple,
+    "evaluate_center_control_simple": chess_ai.evaluate_center_control_simple,
+    "evaluate_piece_development": chess_ai.evaluate_piece_development,
+    "evaluate_mobility": chess_ai.evaluate_mobility,
+    "evaluate_king_safety": chess_ai.evaluate_king_safety,
+    "evaluate_pawn_structure": chess_ai.evaluate_pawn_structure,
+    "evaluate_center_control": chess_ai.evaluate_center_control,
+    "material_balance": chess_ai.material_balance,
+    "order_moves": chess_ai.order_moves,
+    # What a node that cuts off on its first move pays for move generation
+    "staged_moves_first": lambda board: next(chess_ai.staged_moves(board), None),
+    "legal_moves": lambda board: list(board.legal_moves),
+    "position_key": chess_ai.position_key,
+}
+
+
+def search_positions(positions, depth, repeat):
+    """Searches each position to depth (best of repeat runs); returns one result dict per position."""
+    results = []
+    for name, board in positions:
+        best = None
+        for _ in range(repeat):
+            searcher = chess_ai.Searcher()
+            depth_times = []
+            start = time.perf_counter()
+            move = chess_ai.get_best_move(board.copy(), depth=depth, searcher=searcher, use_book=False,
+                                          info_callback=lambda info: depth_times.append(info["time"]))
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best["time"]:
+                nodes = searcher.stats["nodes"] + searcher.stats["qnodes"]
+                best = {
+                    "position": name,
+                    "move": move.uci() if move else None,
+                    "depth": searcher.stats["depth"],
+                    "nodes": nodes,
+                    "time": elapsed,
+                    "nps": nodes / elapsed if elapsed > 0 else 0.0,
+                    "time_to_depth": depth_times,
+                }
+        results.append(best)
+    return results
+
+
+def run_microbenchmarks(positions, min_time, rounds=5):
+    """
+    Microseconds per call of each MICROBENCHMARKS function over all positions:
+    the fastest of rounds timings of min_time / rounds seconds each, which
+    filters out most of the noise of a busy machine.
+    """
+    boards = [chess_ai.SearchBoard.from_board(board) for _, board in positions]
+    results = {}
+    for name, function in MICROBENCHMARKS.items():
+        best = None
+        for _ in range(rounds):
+            calls = 0
+            start = time.perf_counter()
+            while True:
+                for board in boards:
+                    function(board)
+                calls += len(boards)
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time / rounds:
+                    break
+            per_call = elapsed / calls * 1e6
+            best = per_call if best is None else min(best, per_call)
+        results[name] = best
+    return results
+
+
+def run_bench(args):
+    positions = load_positions(args.positions)
+    searches = search_positions(positions, args.depth, args.repeat)
+    nodes = sum(result["nodes"] for result in searches)
+    elapsed = sum(result["time"] for result in searches)
+    return {
+        "engine_version": engine_version(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "positions_file": os.path.basename(args.positions),
+        "depth": args.depth,
+        "tablebase": tablebase.get_tablebase() is not None,
+        "signature": nodes,
+        "nodes": nodes,
+        "time": elapsed,
+        "nps": nodes / elapsed if elapsed > 0 else 0.0,
+        "searches": searches,
+        "micro_us": run_microbenchmarks(positions, args.micro_time) if args.micro_time > 0 else {},
+    }
+
+
+def print_bench(bench):
+    print(f"depth {bench['depth']}, engine {bench['engine_version']}, Python {bench['python']}")
+    print(f"{'position':<16}{'move':>7}{'nodes':>10}{'time s':>9}{'nodes/s':>10}  time to depth (s)")
+    for result in bench["searches"]:
+        depths = " ".join(f"{seconds:.2f}" for seconds in result["time_to_depth"])
+        print(f"{result['position']:<16}{result['move'] or '-':>7}{result['nodes']:>10}{result['time']:>9.2f}"
+              f"{result['nps']:>10.0f}  {depths}")
+    print(f"{'total':<16}{'':>7}{bench['nodes']:>10}{bench['time']:>9.2f}{bench['nps']:>10.0f}")
+    print(f"signature: {bench['signature']}")
+    if bench["micro_us"]:
+        print(f"\n{'function':<32}{'us/call':>10}")
+        for name, micro in bench["micro_us"].items():
+            print(f"{name:<32}{micro:>10.2f}")
+
+
+def compare(before, after, threshold, same_signature):
+    """Prints before/after and returns the list of regressions."""
+    regressions = []
+
+    def check(name, old_rate, new_rate):
+        change = (new_rate - old_rate) / old_rate * 100 if old_rate else 0.0
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(f"{name}: {change:+.1f}%")
+        return change, flag
+
+    print(f"\n{'':<32}{'before':>12}{'after':>12}{'change':>9}")
+    change, flag = check("nodes/s", before["nps"], after["nps"])
+    print(f"{'nodes/s':<32}{before['nps']:>12.0f}{after['nps']:>12.0f}{change:>+8.1f}%{flag}")
+    signature_flag = "" if before["signature"] == after["signature"] else "  CHANGED"
+    print(f"{'signature':<32}{before['signature']:>12}{after['signature']:>12}{'':>9}{signature_flag}")
+    if signature_flag and same_signature:
+        regressions.append("signature changed")
+    if before["depth"] != after["depth"] or before.get("positions_file") != after.get("positions_file"):
+        print("warning: the runs used different depths or position suites")
+
+    for name in after["micro_us"]:
+        if name not in before.get("micro_us", {}):
+            continue
+        old, new = before["micro_us"][name], after["micro_us"][name]
+        # Calls per second, so a slowdown is a negative change as for nodes/s
+        change, flag = check(name, 1 / old, 1 / new)
+        print(f"{name:<32}{old:>10.2f}us{new:>10.2f}us{change:>+8.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed-depth engine benchmark with regression check")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--positions", default=DEFAULT_POSITIONS, help="EPD suite")
+    parser.add_argument("--repeat", type=int, default=1, help="searches per position (best time counts)")
+    parser.add_argument("--micro-time", type=float, default=0.5,
+                        help="seconds per microbenchmark (0 skips them)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="JSON of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=5.0,
+                        help="nodes/sec drop in percent that counts as a regression")
+    parser.add_argument("--same-signature", action="store_true",
+                        help="also fail when the node count signature changed")
+    args = parser.parse_args()
+
+    bench = run_bench(args)
+    print_bench(bench)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(bench, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(json.load(baseline), bench, args.threshold, args.same_signature)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
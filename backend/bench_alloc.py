@@ -0,0 +1,138 @@
+"""
+Allocation benchmark for the search.
+
+Runs get_best_move at a fixed depth over the positions in bench_positions.epd
+and reports nodes/sec (quiescence nodes included) and peak traced memory per
+position. Pass --compare with the path of another chess_ai.py (e.g. one
+checked out from an older commit) to print before/after numbers side by side:
+
+    git show <old-commit>:backend/chess_ai.py > /tmp/chess_ai_old.py
+    python bench_alloc.py --compare /tmp/chess_ai_old.py
+"""
+import argparse
+import importlib.util
+import os
+import time
+import tracemalloc
+
+import chess
+
+# Benchmarks never need sound
+os.environ.setdefault("RENDER", "1")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ENGINE = os.path.join(BASE_DIR, "chess_ai.py")
+DEFAULT_POSITIONS = os.path.join(BASE_DIR, "bench_positions.epd")
+
+
+def load_engine(path, name):
+    """Imports a chess_ai.py from path under its own module name."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    if not hasattr(module, "simple_minimax"):
+        # Engines with a Searcher count their own nodes (and quiescence nodes, since it exists)
+        module.bench_counter = module.search_stats
+        return module
+
+    # Older engines: count nodes by wrapping the recursive search function
+    # (recursive calls go through the module global).
+    counter = {"nodes": 0}
+    search = module.simple_minimax
+
+    def counted_search(*args, **kwargs):
+        counter["nodes"] += 1
+        return search(*args, **kwargs)
+
+    module.simple_minimax = counted_search
+    module.bench_counter = counter
+    return module
+
+
+def load_positions(path):
+    positions = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                board, ops = chess.Board.from_epd(line)
+                positions.append((ops.get("id", board.fen()), board))
+    return positions
+
+
+def reset_engine(engine):
+    if hasattr(engine, "default_searcher"):
+        engine.default_searcher.clear()
+    else:
+        engine.transposition_table.clear()
+    if hasattr(engine, "move_history"):
+        engine.move_history.clear()
+    for counter in ("nodes", "qnodes"):
+        if counter in engine.bench_counter:
+            engine.bench_counter[counter] = 0
+
+
+def searched_nodes(engine):
+    """Nodes of the last search, quiescence included, as bench.py and tactics.py count them."""
+    return engine.bench_counter["nodes"] + engine.bench_counter.get("qnodes", 0)
+
+
+def run_engine(engine, positions, depth):
+    """Returns one result dict per position."""
+    results = []
+    for name, board in positions:
+        # Timed pass without tracemalloc, which slows allocation down a lot
+        reset_engine(engine)
+        start = time.perf_counter()
+        move = engine.get_best_move(board.copy(), depth)
+        elapsed = time.perf_counter() - start
+        nodes = searched_nodes(engine)
+
+        # Memory pass
+        reset_engine(engine)
+        tracemalloc.start()
+        engine.get_best_move(board.copy(), depth)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.append({
+            "position": name,
+            "move": move.uci() if move else None,
+            "nodes": nodes,
+            "time": elapsed,
+            "nps": nodes / elapsed if elapsed > 0 else 0.0,
+            "peak_kb": peak / 1024,
+        })
+    return results
+
+
+def print_results(label, results):
+    print(f"\n{label}")
+    print(f"{'position':<16}{'move':>7}{'nodes':>10}{'time s':>9}{'nodes/s':>10}{'peak KB':>10}")
+    for r in results:
+        print(f"{r['position']:<16}{r['move'] or '-':>7}{r['nodes']:>10}{r['time']:>9.2f}"
+              f"{r['nps']:>10.0f}{r['peak_kb']:>10.1f}")
+    nodes = sum(r["nodes"] for r in results)
+    elapsed = sum(r["time"] for r in results)
+    peak = max(r["peak_kb"] for r in results)
+    print(f"{'total':<16}{'':>7}{nodes:>10}{elapsed:>9.2f}{nodes / elapsed:>10.0f}{peak:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search nodes/sec and peak memory benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--positions", default=DEFAULT_POSITIONS)
+    parser.add_argument("--engine", default=DEFAULT_ENGINE, help="chess_ai.py to benchmark")
+    parser.add_argument("--compare", help="older chess_ai.py to benchmark as the 'before' run")
+    args = parser.parse_args()
+
+    positions = load_positions(args.positions)
+    if args.compare:
+        before = run_engine(load_engine(args.compare, "chess_ai_before"), positions, args.depth)
+        print_results(f"before: {args.compare}", before)
+    after = run_engine(load_engine(args.engine, "chess_ai_after"), positions, args.depth)
+    print_results(f"after: {args.engine}", after)
+
+
+if __name__ == "__main__":
+    main()
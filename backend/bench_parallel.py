@@ -0,0 +1,74 @@
+"""
+Scaling benchmark for the parallel search.
+
+Searches every position in bench_positions.epd to a fixed depth with 1, 2,
+4 and 8 workers (see --workers) and reports time-to-depth, nodes/sec and
+the speedup over the first worker count:
+
+    python bench_parallel.py --depth 5 --workers 1,2,4,8
+
+Worker processes are started and warmed up before the clock starts. Node
+counts grow with the worker count since the workers do not share their
+transposition tables; time-to-depth is the number that matters.
+"""
+import argparse
+import os
+import time
+
+from bench_alloc import DEFAULT_POSITIONS, load_positions
+from parallel_search import ParallelSearcher
+
+
+def run_workers(workers, positions, depth, tt_size_mb):
+    """Returns one result dict per position."""
+    searcher = ParallelSearcher(workers=workers, tt_size_mb=tt_size_mb)
+    try:
+        searcher.search(positions[0][1], depth=2)  # Start the worker processes
+        results = []
+        for name, board in positions:
+            searcher.clear()
+            start = time.perf_counter()
+            move = searcher.search(board, depth=depth)
+            elapsed = time.perf_counter() - start
+            nodes = searcher.stats["nodes"] + searcher.stats["qnodes"]
+            results.append({
+                "position": name,
+                "move": move.uci() if move else None,
+                "nodes": nodes,
+                "time": elapsed,
+                "nps": nodes / elapsed if elapsed > 0 else 0.0,
+            })
+        return results
+    finally:
+        searcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel search time-to-depth and nodes/sec")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--positions", default=DEFAULT_POSITIONS)
+    parser.add_argument("--tt-mb", type=float, default=16)
+    args = parser.parse_args()
+
+    positions = load_positions(args.positions)
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    print(f"{os.cpu_count()} CPUs, depth {args.depth}")
+
+    totals = []
+    for workers in worker_counts:
+        results = run_workers(workers, positions, args.depth, args.tt_mb)
+        print(f"\nworkers: {workers}")
+        print(f"{'position':<16}{'move':>7}{'nodes':>10}{'time s':>9}{'nodes/s':>10}")
+        for r in results:
+            print(f"{r['position']:<16}{r['move'] or '-':>7}{r['nodes']:>10}{r['time']:>9.2f}{r['nps']:>10.0f}")
+        totals.append((workers, sum(r["nodes"] for r in results), sum(r["time"] for r in results)))
+
+    base_time = totals[0][2]
+    print(f"\n{'workers':<10}{'nodes':>10}{'time s':>9}{'nodes/s':>10}{'speedup':>9}")
+    for workers, nodes, elapsed in totals:
+        print(f"{workers:<10}{nodes:>10}{elapsed:>9.2f}{nodes / elapsed:>10.0f}{base_time / elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Startup benchmark: import time and memory of a fresh worker process.
+
+Imports each module in a new interpreter (as a gunicorn or search pool
+worker would) and reports the wall time of the import and the process's
+resident memory afterwards, next to a bare interpreter for reference:
+
+    python bench_startup.py --modules chess_ai,server --repeat 5
+    python bench_startup.py --sounds   # also load pygame and the move sounds
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child process; prints {"time": seconds, "rss_mb": resident MB}
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+for name in sys.argv[1].split(","):
+    if name:
+        __import__(name)
+if sys.argv[2] == "1":
+    import sounds
+    sounds.load_sounds()
+elapsed = time.perf_counter() - started
+with open("/proc/self/statm") as statm:
+    rss = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+print(json.dumps({"time": elapsed, "rss_mb": rss / 2 ** 20}))
+"""
+
+
+def measure(modules, sounds, repeat):
+    """Median import time and RSS over repeat fresh processes."""
+    env = dict(os.environ)
+    if not sounds:
+        env["RENDER"] = "1"  # As on the server
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", PROBE, modules, "1" if sounds else "0"],
+                                cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return (statistics.median(run["time"] for run in runs),
+            statistics.median(run["rss_mb"] for run in runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and RSS of a fresh worker process")
+    parser.add_argument("--modules", default="chess_ai,server", help="comma-separated modules")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sounds", action="store_true", help="also load the move sounds")
+    args = parser.parse_args()
+
+    base_time, base_rss = measure("", False, args.repeat)
+    print(f"{'module':<16}{'import ms':>10}{'RSS MB':>9}{'+RSS MB':>9}")
+    print(f"{'(interpreter)':<16}{base_time * 1000:>10.1f}{base_rss:>9.1f}{0:>9.1f}")
+    for module in args.modules.split(","):
+        elapsed, rss = measure(module, args.sounds, args.repeat)
+        print(f"{module:<16}{elapsed * 1000:>10.1f}{rss:>9.1f}{rss - base_rss:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Opening book lookup.
+
+OpeningBook combines a compiled Polyglot book (a sorted file of 16-byte
+entries keyed by Zobrist hash, memory-mapped and binary searched) with the
+small built-in book from chess_ai.opening_book. Both are keyed by Zobrist
+hash, so a lookup never formats a FEN and finds transpositions regardless
+of the move clocks. A move is picked at random, weighted by its book weight.
+
+Compile a Polyglot book from PGN games with build_book.py and point
+CHESS_BOOK_PATH at it.
+"""
+import os
+import random
+
+import chess
+import chess.polyglot
+
+
+def _from_polyglot(board, raw_move):
+    """Decodes a Polyglot move; castling is stored as the king taking its own rook."""
+    from_square = raw_move >> 6 & 0x3F
+    to_square = raw_move & 0x3F
+    promotion = raw_move >> 12 & 0x7
+    if promotion:
+        return chess.Move(from_square, to_square, promotion + 1)
+    if (not board.chess960 and from_square == board.king(board.turn)
+            and board.castling_rights & chess.BB_SQUARES[to_square]):
+        # e1h1 -> e1g1, e1a1 -> e1c1
+        to_square = chess.square(6 if to_square > from_square else 2, chess.square_rank(from_square))
+    return chess.Move(from_square, to_square)
+
+
+class OpeningBook:
+    """Polyglot book (optional) plus built-in moves, looked up by Zobrist hash."""
+
+    def __init__(self, path=None, builtin=None, rng=None):
+        """
+        path is a Polyglot .bin file (None for none); builtin maps FENs to
+        UCI moves, best first; rng (a random.Random) makes choices repeatable.
+        """
+        self.path = path
+        self.reader = chess.polyglot.open_reader(path) if path else None
+        self.rng = rng or random.Random()
+        self.builtin = {}  # Zobrist key -> [(move, weight)]
+        for fen, moves in (builtin or {}).items():
+            board = chess.Board(fen)
+            entries = self.builtin.setdefault(chess.polyglot.zobrist_hash(board), [])
+            # Listed best first: earlier moves get more weight
+            for rank, uci in enumerate(moves):
+                entries.append((chess.Move.from_uci(uci), len(moves) - rank))
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def moves(self, board, key=None):
+        """
+        Legal book moves for board as (move, weight) pairs; empty when out of
+        book. key is board's Zobrist hash, if the caller already has it.
+        """
+        if key is None:
+            key = chess.polyglot.zobrist_hash(board)
+        if self.reader is not None:
+            entries = []
+            for entry in self.reader.find_all(key):
+                move = _from_polyglot(board, entry.raw_move)
+                if board.is_legal(move):
+                    entries.append((move, entry.weight))
+            if entries:
+                return entries
+        return [(move, weight) for move, weight in self.builtin.get(key, ())
+                if board.is_legal(move)]
+
+    def choose_move(self, board, key=None):
+        """A book move for board, picked at random by weight, or None."""
+        entries = self.moves(board, key)
+        if not entries:
+            return None
+        total = sum(weight for _, weight in entries)
+        pick = self.rng.randint(1, total)
+        for move, weight in entries:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return entries[-1][0]
+
+
+def open_book(builtin=None):
+    """The book to play from: CHESS_BOOK_PATH (if set) plus the built-in moves."""
+    path = os.environ.get("CHESS_BOOK_PATH") or None
+    return OpeningBook(path, builtin)
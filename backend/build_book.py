@@ -0,0 +1,96 @@
+"""
+Compiles PGN games into a Polyglot opening book.
+
+Every move played in the first --max-ply plies of the games is counted per
+position and weighted by the result for the side that played it (win 2,
+draw 1, loss 0). Moves seen fewer than --min-games times are dropped, and
+the entries are written sorted by Zobrist key, as Polyglot readers expect:
+
+    python build_book.py games1.pgn games2.pgn -o book.bin --max-ply 16
+    CHESS_BOOK_PATH=book.bin python server.py
+"""
+import argparse
+import struct
+from collections import Counter, defaultdict
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+# Result points for the side to move: (white's points, black's points)
+RESULT_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}
+
+MAX_WEIGHT = 0xFFFF  # Polyglot weights are 16 bits
+
+
+def encode_move(board, move):
+    """Polyglot move encoding; castling is written as the king taking its rook."""
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if board.is_kingside_castling(move) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | move.from_square << 6 | promotion << 12
+
+
+def count_moves(paths, max_ply):
+    """Returns {zobrist_key: {encoded_move: [games, weight]}} over all games."""
+    positions = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    games = 0
+    for path in paths:
+        with open(path) as pgn:
+            while True:
+                game = chess.pgn.read_game(pgn)
+                if game is None:
+                    break
+                games += 1
+                points = RESULT_POINTS.get(game.headers.get("Result"), (1, 1))
+                board = game.board()
+                for ply, move in enumerate(game.mainline_moves()):
+                    if ply >= max_ply:
+                        break
+                    entry = positions[chess.polyglot.zobrist_hash(board)][encode_move(board, move)]
+                    entry[0] += 1
+                    entry[1] += points[0] if board.turn == chess.WHITE else points[1]
+                    board.push(move)
+    return positions, games
+
+
+def book_entries(positions, min_games):
+    """Sorted (key, move, weight) entries; weights are scaled to fit 16 bits."""
+    entries = []
+    for key, moves in positions.items():
+        kept = {move: weight for move, (games, weight) in moves.items() if games >= min_games}
+        top = max(kept.values(), default=0)
+        scale = MAX_WEIGHT / top if top > MAX_WEIGHT else 1
+        for move, weight in kept.items():
+            # Keep moves that only lost in the book, with the least weight
+            entries.append((key, move, max(1, int(weight * scale))))
+    entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1]))
+    return entries
+
+
+def write_book(path, entries):
+    packer = struct.Struct(">QHHI")  # key, move, weight, learn
+    with open(path, "wb") as book:
+        for key, move, weight in entries:
+            book.write(packer.pack(key, move, weight, 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile PGN games into a Polyglot opening book")
+    parser.add_argument("pgn", nargs="+", help="PGN files")
+    parser.add_argument("-o", "--output", default="book.bin")
+    parser.add_argument("--max-ply", type=int, default=20, help="book depth in plies")
+    parser.add_argument("--min-games", type=int, default=1, help="drop moves played in fewer games")
+    args = parser.parse_args()
+
+    positions, games = count_moves(args.pgn, args.max_ply)
+    entries = book_entries(positions, args.min_games)
+    write_book(args.output, entries)
+    print(f"{games} games: {len(entries)} moves in {len({key for key, _, _ in entries})} positions "
+          f"written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
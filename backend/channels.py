@@ -0,0 +1,127 @@
+"""
+Game channels: one event stream per game.
+
+A client follows its game over a single Server-Sent Events stream
+(GET /games/<id>/events) and sends moves with POST /games/<id>/move. The
+stream carries the acknowledgement of the player's move, the engine's
+progress and the AI's reply, plus heartbeats, so a turn costs one short
+POST instead of a /player_move + /ai_move pair.
+
+Each channel keeps its last events so a client that reconnects with
+Last-Event-ID gets what it missed; when those are gone (or the client's
+position hash is stale) it gets a "state" event with the full position
+instead. Channels live in the worker process that serves them, like jobs;
+an idle stream checks the session store every second, so moves made through
+another worker still reach it (as a "state" event). The number of open
+streams per worker is capped.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Events kept per game for reconnecting clients
+CHANNEL_EVENT_BUFFER = 64
+
+
+class ChannelLimitReached(Exception):
+    """This worker already holds its maximum of open game streams."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many open game streams, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class GameChannel:
+    """The recent events of one game, with ids increasing from 1."""
+
+    def __init__(self, game_id, buffer=CHANNEL_EVENT_BUFFER):
+        self.game_id = game_id
+        self.events = deque(maxlen=buffer)  # {"id": n, "event": type, "data": ...}
+        self.last_id = 0
+        self.connections = 0
+        self.last_active = time.time()
+        self._condition = threading.Condition()
+
+    def publish(self, event, data):
+        """Appends an event and wakes up the streams waiting for it."""
+        with self._condition:
+            self.last_id += 1
+            self.events.append({"id": self.last_id, "event": event, "data": data})
+            self.last_active = time.time()
+            self._condition.notify_all()
+
+    def wait_events(self, after, timeout):
+        """
+        Returns the events with ids above after, waiting up to timeout seconds
+        for one (empty list if none came). Returns None if some of them are
+        no longer kept, so the client has to resync.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.last_id > after, timeout)
+            if self.last_id - after > len(self.events):
+                return None
+            return [event for event in self.events if event["id"] > after]
+
+
+class ChannelManager:
+    """
+    Game channels of this worker, with at most max_connections open streams.
+    Channels without streams expire ttl seconds after their last event.
+    """
+
+    def __init__(self, max_connections=100, ttl=3600):
+        self.max_connections = max_connections
+        self.ttl = ttl
+        self._channels = OrderedDict()
+        self._connections = 0
+        self._lock = threading.Lock()
+
+    def get(self, game_id):
+        """The game's channel, created on first use."""
+        with self._lock:
+            self._expire()
+            channel = self._channels.get(game_id)
+            if channel is None:
+                channel = self._channels[game_id] = GameChannel(game_id)
+            return channel
+
+    def open(self, game_id):
+        """
+        Registers a new stream on the game's channel and returns the channel.
+        Raises ChannelLimitReached when the worker is full; pair with release().
+        """
+        channel = self.get(game_id)
+        with self._lock:
+            if self._connections >= self.max_connections:
+                raise ChannelLimitReached(retry_after=5)
+            self._connections += 1
+            channel.connections += 1
+        return channel
+
+    def release(self, channel):
+        with self._lock:
+            self._connections -= 1
+            channel.connections -= 1
+            channel.last_active = time.time()
+
+    def connections(self):
+        with self._lock:
+            return self._connections
+
+    def _expire(self):
+        # Caller holds self._lock
+        expired_before = time.time() - self.ttl
+        for game_id in [game_id for game_id, channel in self._channels.items()
+                        if not channel.connections and channel.last_active < expired_before]:
+            del self._channels[game_id]
+
+
+def create_channel_manager():
+    """
+    Builds the channel manager from CHANNEL_MAX_CONNECTIONS (default 100) and
+    CHANNEL_TTL (seconds, default 3600). Every open stream holds a server
+    thread, so keep the cap below gunicorn's --threads.
+    """
+    return ChannelManager(max_connections=int(os.environ.get("CHANNEL_MAX_CONNECTIONS", 100)),
+                          ttl=float(os.environ.get("CHANNEL_TTL", 3600)))
@@ -1,17 +1,19 @@
+import cProfile
+import functools
+import inspect
+import logging
 import os
+import random
+import time
+from array import array
 import chess
-import pygame
+import chess.polyglot
 
-# Initialize Pygame
-pygame.init()
+import tablebase
+from book import open_book
+from engine_config import DEFAULT_CONFIG, DEFAULT_DEPTH, DEFAULT_WEIGHTS, MAX_SKILL
 
-# Disable sound if running on Render (headless server)
-USE_SOUND = "RENDER" not in os.environ
-
-if USE_SOUND:
-    pygame.mixer.init()
-else:
-    pygame.mixer.quit()
+logger = logging.getLogger(__name__)
 
 piece_values = {
     chess.PAWN: 100,
@@ -113,26 +115,408 @@ endgame_piece_square_tables = {
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SOUND_DIR = os.path.join(BASE_DIR, "static", "sounds")
 PIECES_DIR = os.path.join(BASE_DIR, "static", "pieces")
 
-# Load sound effects
-if USE_SOUND:
-    move_sound = pygame.mixer.Sound(os.path.join(SOUND_DIR, "move.wav"))
-    capture_sound = pygame.mixer.Sound(os.path.join(SOUND_DIR, "capture.wav"))
-    check_sound = pygame.mixer.Sound(os.path.join(SOUND_DIR, "check.wav"))
-    checkmate_sound = pygame.mixer.Sound(os.path.join(SOUND_DIR, "checkmate.wav"))
-    castle_sound = pygame.mixer.Sound(os.path.join(SOUND_DIR, "castle.wav"))
+# Polyglot Zobrist random numbers (pieces 0-767, castling 768-771, ep file 772-779, turn 780)
+ZOBRIST_KEYS = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+
+
+# Material and piece-square values by Zobrist piece index (64 * (2 * (type - 1) + color) + square),
+# signed from White's view. Tables are indexed by square for both colors, as in evaluate_board.
+def _signed_piece_table(values):
+    table = []
+    for piece_type in chess.PIECE_TYPES:
+        for color in (chess.BLACK, chess.WHITE):
+            sign = 1 if color == chess.WHITE else -1
+            table.extend(sign * values(piece_type, square) for square in chess.SQUARES)
+    return table
+
+
+MATERIAL_BY_INDEX = _signed_piece_table(lambda piece_type, square: piece_values[piece_type])
+MIDGAME_PST_BY_INDEX = _signed_piece_table(
+    lambda piece_type, square: piece_square_tables[piece_type][square])
+ENDGAME_PST_BY_INDEX = _signed_piece_table(
+    lambda piece_type, square: endgame_piece_square_tables.get(
+        piece_type, piece_square_tables[piece_type])[square])
+
+# evaluate_board switches to the endgame tables at this many pieces (kings included) or fewer
+ENDGAME_PIECE_COUNT = 12
+
+# Set CHESS_AI_CHECK_EVAL=1 to compare the incremental terms with a full recompute on every use
+CHECK_INCREMENTAL_EVAL = os.environ.get("CHESS_AI_CHECK_EVAL") == "1"
+
+# Bitboard masks for the positional terms
+CENTER_MASK = chess.BB_D4 | chess.BB_D5 | chess.BB_E4 | chess.BB_E5
+ROOK_START_MASK = chess.BB_A1 | chess.BB_H1 | chess.BB_A8 | chess.BB_H8
+KNIGHT_START_MASK = chess.BB_B1 | chess.BB_G1 | chess.BB_B8 | chess.BB_G8
+BISHOP_START_MASK = chess.BB_C1 | chess.BB_F1 | chess.BB_C8 | chess.BB_F8
+ADJACENT_FILES_MASKS = [(chess.BB_FILES[file - 1] if file > 0 else 0)
+                        | (chess.BB_FILES[file + 1] if file < 7 else 0) for file in range(8)]
+
+
+def _ranks_ahead_mask(color, rank):
+    """Every square on the ranks in front of rank, from color's side."""
+    ranks = range(rank + 1, 8) if color == chess.WHITE else range(rank)
+    mask = 0
+    for ahead in ranks:
+        mask |= chess.BB_RANKS[ahead]
+    return mask
+
+
+# By color and square: squares an enemy pawn must not occupy for a pawn there to be passed
+PASSED_PAWN_MASKS = [
+    [_ranks_ahead_mask(color, chess.square_rank(square))
+     & (chess.BB_FILES[chess.square_file(square)] | ADJACENT_FILES_MASKS[chess.square_file(square)])
+     for square in chess.SQUARES]
+    for color in chess.COLORS
+]
+
+# By color and king square: the (up to) three squares in front of the king
+KING_SHIELD_MASKS = [
+    [(chess.shift_up if color == chess.WHITE else chess.shift_down)(
+        chess.BB_SQUARES[square] | chess.shift_left(chess.BB_SQUARES[square])
+        | chess.shift_right(chess.BB_SQUARES[square]))
+     for square in chess.SQUARES]
+    for color in chess.COLORS
+]
+
+KING_SHIELD_BONUS = 10
+DOUBLED_PAWN_PENALTY = 20  # Per extra pawn on a file
+ISOLATED_PAWN_PENALTY = 15  # Per pawn with no friendly pawns on the neighbouring files
+PASSED_PAWN_BONUS = [0, 5, 10, 20, 35, 60, 100, 0]  # By rank from the pawn's side
+
+
+class SearchBoard(chess.Board):
+    """
+    Board used inside the search. Keeps the piece-square part of the Polyglot
+    Zobrist key up to date on every push/pop so hashing a node is a few XORs
+    instead of a full chess.polyglot.zobrist_hash() walk over the board.
+
+    The same updates maintain the evaluation terms that only depend on where
+    the pieces are: material, midgame and endgame piece-square sums (White's
+    view) and the piece count that decides the game phase (see eval_terms).
+
+    Only push()/pop() keep these in sync; don't edit pieces directly.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._state_stack = []
+        self._piece_key = 0
+        self.material = 0
+        self.midgame_pst = 0
+        self.endgame_pst = 0
+        self.piece_count = 0
+        super().__init__(*args, **kwargs)
+        self._reset_incremental()
+
+    @classmethod
+    def from_board(cls, board):
+        """Builds a SearchBoard with the same position and move stack as board."""
+        search_board = cls(board.root().fen(), chess960=board.chess960)
+        for move in board.move_stack:
+            search_board.push(move)
+        return search_board
+
+    def _reset_incremental(self):
+        self._state_stack = []
+        self._piece_key = chess.polyglot.ZobristHasher(ZOBRIST_KEYS).hash_board(self)
+        self.material, self.midgame_pst, self.endgame_pst, self.piece_count = compute_eval_terms(self)
+
+    def copy(self, *args, **kwargs):
+        board = super().copy(*args, **kwargs)
+        board._reset_incremental()
+        return board
+
+    def eval_terms(self):
+        """(material, midgame PST, endgame PST, piece count) of the current position."""
+        return self.material, self.midgame_pst, self.endgame_pst, self.piece_count
+
+    def check_eval_terms(self):
+        """Raises AssertionError if the incremental terms differ from a full recompute."""
+        expected = compute_eval_terms(self)
+        if self.eval_terms() != expected:
+            raise AssertionError(f"Incremental eval terms {self.eval_terms()} != {expected} "
+                                 f"after {[move.uci() for move in self.move_stack]} in {self.fen()}")
+
+    def zobrist_key(self):
+        """Returns the Polyglot Zobrist hash of the current position."""
+        key = self._piece_key
+        rights = self.castling_rights
+        if rights & chess.BB_H1:
+            key ^= ZOBRIST_KEYS[768]
+        if rights & chess.BB_A1:
+            key ^= ZOBRIST_KEYS[769]
+        if rights & chess.BB_H8:
+            key ^= ZOBRIST_KEYS[770]
+        if rights & chess.BB_A8:
+            key ^= ZOBRIST_KEYS[771]
+        if self.ep_square:
+            if self.turn == chess.WHITE:
+                ep_mask = chess.shift_down(chess.BB_SQUARES[self.ep_square])
+            else:
+                ep_mask = chess.shift_up(chess.BB_SQUARES[self.ep_square])
+            ep_mask = chess.shift_left(ep_mask) | chess.shift_right(ep_mask)
+            if ep_mask & self.pawns & self.occupied_co[self.turn]:
+                key ^= ZOBRIST_KEYS[772 + chess.square_file(self.ep_square)]
+        if self.turn == chess.WHITE:
+            key ^= ZOBRIST_KEYS[780]
+        return key
+
+    def push(self, move):
+        self._state_stack.append((self._piece_key, self.material, self.midgame_pst,
+                                  self.endgame_pst, self.piece_count))
+        if move:
+            self._apply_move(move)
+        super().push(move)
+
+    def pop(self):
+        move = super().pop()
+        (self._piece_key, self.material, self.midgame_pst,
+         self.endgame_pst, self.piece_count) = self._state_stack.pop()
+        return move
+
+    def _toggle(self, piece_type, color, square, sign):
+        # Adds (sign 1) or removes (sign -1) a piece from the key and eval terms
+        index = 64 * ((piece_type - 1) * 2 + color) + square
+        self._piece_key ^= ZOBRIST_KEYS[index]
+        self.material += sign * MATERIAL_BY_INDEX[index]
+        self.midgame_pst += sign * MIDGAME_PST_BY_INDEX[index]
+        self.endgame_pst += sign * ENDGAME_PST_BY_INDEX[index]
+        self.piece_count += sign
+
+    def _apply_move(self, move):
+        # Runs before the move is made on the board
+        color = self.turn
+        piece_type = self.piece_type_at(move.from_square)
+        from_sq, to_sq = move.from_square, move.to_square
+        self._toggle(piece_type, color, from_sq, -1)
+
+        if piece_type == chess.KING and self.is_castling(move):
+            rank = chess.square_rank(from_sq)
+            if self.is_kingside_castling(move):
+                king_to, rook_to = chess.square(6, rank), chess.square(5, rank)
+                rook_from = to_sq if self.piece_type_at(to_sq) == chess.ROOK else chess.square(7, rank)
+            else:
+                king_to, rook_to = chess.square(2, rank), chess.square(3, rank)
+                rook_from = to_sq if self.piece_type_at(to_sq) == chess.ROOK else chess.square(0, rank)
+            self._toggle(chess.ROOK, color, rook_from, -1)
+            self._toggle(chess.KING, color, king_to, 1)
+            self._toggle(chess.ROOK, color, rook_to, 1)
+            return
+
+        if piece_type == chess.PAWN and to_sq == self.ep_square and not self.piece_type_at(to_sq):
+            captured_sq = to_sq - 8 if color == chess.WHITE else to_sq + 8
+            self._toggle(chess.PAWN, not color, captured_sq, -1)
+        else:
+            captured_type = self.piece_type_at(to_sq)
+            if captured_type:
+                self._toggle(captured_type, not color, to_sq, -1)
+
+        self._toggle(move.promotion or piece_type, color, to_sq, 1)
+
+
+def compute_eval_terms(board):
+    """
+    Material, midgame PST and endgame PST sums (White's view) and the piece
+    count, recomputed from scratch; SearchBoard keeps them incrementally.
+    """
+    material = midgame_pst = endgame_pst = 0
+    piece_map = board.piece_map()
+    for square, piece in piece_map.items():
+        index = 64 * ((piece.piece_type - 1) * 2 + piece.color) + square
+        material += MATERIAL_BY_INDEX[index]
+        midgame_pst += MIDGAME_PST_BY_INDEX[index]
+        endgame_pst += ENDGAME_PST_BY_INDEX[index]
+    return material, midgame_pst, endgame_pst, len(piece_map)
+
+
+def eval_terms(board):
+    """
+    (material, midgame PST, endgame PST, piece count) of board: O(1) on a
+    SearchBoard (checked against a recompute with CHESS_AI_CHECK_EVAL=1),
+    a full pass over the pieces otherwise.
+    """
+    if isinstance(board, SearchBoard):
+        if CHECK_INCREMENTAL_EVAL:
+            board.check_eval_terms()
+        return board.material, board.midgame_pst, board.endgame_pst, board.piece_count
+    return compute_eval_terms(board)
+
+
+def position_key(board):
+    """Zobrist key of board, incremental for SearchBoard, from scratch otherwise."""
+    if isinstance(board, SearchBoard):
+        return board.zobrist_key()
+    return chess.polyglot.zobrist_hash(board)
+
+
+# Transposition table bound types
+TT_EXACT = 0
+TT_LOWER = 1  # Score is a lower bound (search failed high)
+TT_UPPER = 2  # Score is an upper bound (search failed low)
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table keyed by 64-bit Zobrist hashes.
+
+    Entries live in flat typed arrays, so the memory budget is fixed up front
+    (16 bytes per slot) no matter how many positions get searched. A slot is
+    overwritten when it is empty, holds the same position, was written in an
+    older search, or the new result was searched at least as deep
+    (depth-preferred with ageing). Win and loss scores are stored counting
+    plies from their own node (score_to_tt), so they stay right when the
+    position comes up again at another ply.
+    """
+
+    ENTRY_BYTES = 16  # key 8 + score 4 + move 2 + depth 1 + flag/age 1
+
+    def __init__(self, size_mb=16):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        """Reallocates the table to fit in size_mb megabytes (rounded down to a power of two)."""
+        slots = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("i", bytes(4 * self.size))
+        self.moves = array("H", bytes(2 * self.size))
+        self.depths = array("b", bytes(self.size))
+        self.flags = array("B", bytes(self.size))  # low 2 bits bound type, high 6 bits age
+        self.age = 0
+        self.reset_stats()
+
+    def clear(self):
+        """Empties the table (new game)."""
+        self.resize(self.size * self.ENTRY_BYTES / (1024 * 1024))
+
+    def new_search(self):
+        """Bumps the age so entries from earlier searches become preferred victims."""
+        self.age = (self.age + 1) & 0x3F
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def probe(self, key):
+        """Returns (depth, score, bound, move) for key, or None."""
+        index = key & self.mask
+        stored_key = self.keys[index]
+        if stored_key == key:
+            self.hits += 1
+            packed = self.moves[index]
+            move = chess.Move(packed & 0x3F, (packed >> 6) & 0x3F, (packed >> 12) or None) if packed else None
+            return self.depths[index], self.scores[index], self.flags[index] & 0x3, move
+        if stored_key == 0:
+            self.misses += 1
+        else:
+            self.collisions += 1
+        return None
+
+    def get_move(self, key):
+        """Returns the stored best move for key without touching the counters."""
+        index = key & self.mask
+        packed = self.moves[index]
+        if self.keys[index] != key or not packed:
+            return None
+        return chess.Move(packed & 0x3F, (packed >> 6) & 0x3F, (packed >> 12) or None)
+
+    def store(self, key, depth, score, bound, move=None):
+        index = key & self.mask
+        stored_key = self.keys[index]
+        if (stored_key != 0 and stored_key != key and (self.flags[index] >> 2) == self.age
+                and self.depths[index] > depth):
+            return
+        if move is None and stored_key == key:
+            packed = self.moves[index]  # Keep the old best move for ordering
+        elif move is None:
+            packed = 0
+        else:
+            packed = move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+        self.keys[index] = key
+        self.scores[index] = int(score)
+        self.moves[index] = packed
+        self.depths[index] = depth
+        self.flags[index] = bound | (self.age << 2)
+        self.stores += 1
+
+    def stats(self):
+        """Returns probe/store counters and fill rate."""
+        probes = self.hits + self.misses + self.collisions
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "cutoffs": self.cutoffs,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
+
+
+MAX_SEARCH_DEPTH = 64
+
+# Bounds for negamax windows; larger than any evaluation
+INFINITY = 1000000
+
+# Score for delivering mate (as in simple_evaluate); shorter mates score higher
+MATE_SCORE = 10000
+
+# Scores beyond this are mates or tablebase wins, which count plies from the root
+WIN_BOUND = tablebase.TB_WIN_SCORE - 2 * MAX_SEARCH_DEPTH
+
+QUIESCENCE_MAX_DEPTH = 6
+
+
+def score_to_tt(score, ply):
+    """Makes a win or loss score count plies from the node at ply instead of the root, for storing."""
+    if score > WIN_BOUND:
+        return score + ply
+    if score < -WIN_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    """Inverse of score_to_tt: a stored score as seen from the root of the current search."""
+    if score > WIN_BOUND:
+        return score - ply
+    if score < -WIN_BOUND:
+        return score + ply
+    return score
+
+# Delta pruning: skip captures that cannot raise the score to alpha even with this margin
+DELTA_MARGIN = 200
 
-# Initialize chess board
-board = chess.Board()
-player_color = chess.WHITE  # Default to White; will be set by frontend
 
-# Transposition table for better performance
-transposition_table = {}
+# Set SEARCH_PHASE_TIMING=1 to time move generation, evaluation and move ordering in every search
+SEARCH_PHASE_TIMING = os.environ.get("SEARCH_PHASE_TIMING") == "1"
 
-# Move history to prevent repetition
-move_history = []
+# Set SEARCH_PROFILE_DIR to dump a cProfile of one search in SEARCH_PROFILE_EVERY there
+SEARCH_PROFILE_DIR = os.environ.get("SEARCH_PROFILE_DIR")
+SEARCH_PROFILE_EVERY = int(os.environ.get("SEARCH_PROFILE_EVERY", 1))
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when its time or node budget is used up."""
+
+
+def allocate_time(board, wtime=None, btime=None, winc=0, binc=0, movestogo=None):
+    """
+    Turns the side to move's remaining clock (milliseconds, UCI style) into a
+    budget in seconds for this move, or None when there is no clock.
+    """
+    remaining = wtime if board.turn == chess.WHITE else btime
+    if remaining is None:
+        return None
+    increment = (winc if board.turn == chess.WHITE else binc) or 0
+    budget = remaining / (movestogo or 30) + increment * 0.75
+    # Never plan to use more than half of what is left on the clock
+    return max(1, min(budget, remaining / 2)) / 1000
 
 # Strategic opening book with development principles
 opening_book = {
@@ -152,105 +536,36 @@ opening_book = {
     "rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 0 1": ["d7d5", "g8f6", "c7c5", "e7e6"],
 }
 
-def set_player_color(color):
-    """Sets the player color based on frontend input."""
-    global player_color, board, transposition_table, move_history
-    print(f"Setting player color to: {color}")
-    player_color = chess.WHITE if color == "white" else chess.BLACK
-    board = chess.Board()  # Reset board
-    transposition_table.clear()  # Clear transposition table for new game
-    move_history.clear()  # Clear move history for new game
-    print(f"Player color set to: {player_color}, Board FEN: {board.fen()}")
-
-    # If the user chooses Black, AI plays first
-    if player_color == chess.BLACK:
-        print("Player chose Black, AI will make first move")
-        ai_move()
-    else:
-        print("Player chose White, player will move first")
-
-def get_board_fen():
-    """Returns the current FEN string of the board for the frontend."""
-    return board.fen()
-
-def make_move(move):
-    """Processes the player's move if it's legal."""
-    if move in [m.uci() for m in board.legal_moves]:
-        play_move_sound(move)
-        board.push(chess.Move.from_uci(move))
-        return True
-    return False
-
-def ai_move():
-    """Generates and plays AI's best move."""
-    global board, move_history
-    print(f"ai_move called. Game over: {board.is_game_over()}, Turn: {board.turn}")
-    
-    if board.is_game_over():
-        print("Game is over, AI cannot move")
-        return
-        
-    legal_moves = list(board.legal_moves)
-    print(f"AI thinking... Turn: {board.turn}, Legal moves: {len(legal_moves)}")
-    
-    if not legal_moves:
-        print("No legal moves available!")
-        return
-        
-    # Get the best move
-    best_move = get_best_move(board)
-    
-    if best_move and best_move in legal_moves:
-        print(f"AI playing: {best_move.uci()}")
-        # Verify the move is still legal
-        if best_move in board.legal_moves:
-            play_move_sound(best_move)
-            board.push(best_move)
-            # Track move history for anti-repetition
-            move_history.append(best_move.uci())
-            # Keep only recent moves (last 20 moves)
-            if len(move_history) > 20:
-                move_history.pop(0)
-            print(f"Board after AI move: {board.fen()}")
-        else:
-            print("Move became illegal, playing first legal move")
-            board.push(legal_moves[0])
-            move_history.append(legal_moves[0].uci())
-    else:
-        print("AI found no valid move, playing first legal move")
-        board.push(legal_moves[0])
-        move_history.append(legal_moves[0].uci())
-
-def play_move_sound(move):
-    if not USE_SOUND:
-        return  # No sound on Render
-
-    # Handle both string (UCI) and move object inputs
-    if isinstance(move, str):
-        move_obj = chess.Move.from_uci(move)
-    else:
-        move_obj = move
-    
-    target_square = move_obj.to_square
-    is_capture = board.piece_at(target_square) is not None  
-
-    if board.is_checkmate():
-        checkmate_sound.play()
-    elif board.is_check():
-        check_sound.play()
-    elif is_capture:
-        capture_sound.play()
-    elif is_castling(move_obj):
-        castle_sound.play()
-    else:
-        move_sound.play()
+# Looked up by Zobrist hash; a Polyglot book at CHESS_BOOK_PATH takes precedence
+book = open_book(opening_book)
 
 def is_castling(move):
     """Checks if a move is a castling move."""
     return abs(move.from_square - move.to_square) == 2
 
-def get_best_move(board, depth=3):
-    """Returns the best move using simple Minimax with Alpha-Beta Pruning."""
+def get_best_move(board, depth=None, movetime=None, nodes=None, wtime=None, btime=None,
+                  winc=0, binc=0, movestogo=None, searcher=None, move_history=(), stop_event=None,
+                  info_callback=None, use_book=True, result_cache=None, config=None):
+    """
+    Returns the best move using an iterative-deepening negamax search (see Searcher.search).
+
+    config (an engine_config.EngineConfig, DEFAULT_CONFIG if omitted) sets the
+    evaluation weights, features and skill of this search, and its depth,
+    movetime and nodes are the budget when none is given here.
+
+    Without a budget this searches to depth (the config's if not given). With
+    movetime (ms), a clock (wtime/btime/winc/binc/movestogo, ms) or a node
+    limit, it deepens until the budget runs out and returns the best move of
+    the last iteration that finished; depth then only caps the iterations.
+
+    searcher holds the game's search caches (a shared default if omitted), and
+    move_history the AI's recent moves (UCI) for the anti-repetition penalty.
+    Setting stop_event ends the search early with the best move so far, and
+    info_callback is called with a progress dict after every finished iteration.
+    use_book=False skips the opening book (e.g. to analyse a position).
+    result_cache (a result_cache.ResultCache) answers depth-limited searches
+    of positions searched before, and keeps the results of new searches.
+    """
     if board.is_game_over():
         return None
 
@@ -258,158 +573,119 @@ def get_best_move(board, depth=3):
     if not legal_moves:
         return None
 
-    # Check opening book first (only in first 5 moves)
-    if board.fullmove_number <= 5:
-        current_fen = board.fen()
-        if current_fen in opening_book:
-            book_moves = opening_book[current_fen]
-            for move_uci in book_moves:
-                try:
-                    move = chess.Move.from_uci(move_uci)
-                    if move in legal_moves:
-                        print(f"Using opening book move: {move_uci}")
-                        return move
-                except:
-                    continue
-
-    # Smart move selection with anti-repetition
-    move_scores = []
-    
-    for move in legal_moves:
-        # Make a copy of the board for evaluation
-        board_copy = board.copy()
-        board_copy.push(move)
-        
-        # Evaluate the position after this move
-        move_value = simple_minimax(board_copy, depth - 1, float('-inf'), float('inf'), board.turn == chess.BLACK)
-        
-        # Anti-repetition: penalize moves that repeat recent positions
-        repetition_penalty = 0
-        recent_moves = move_history[-6:] if len(move_history) >= 6 else move_history
-        move_uci = move.uci()
-        
-        # Count how often this move was played recently
-        repetition_count = recent_moves.count(move_uci)
-        if repetition_count > 0:
-            repetition_penalty = repetition_count * 100  # Heavy penalty for repetition
-        
-        # Adjust move value based on repetition
-        if board.turn == chess.WHITE:
-            adjusted_value = move_value - repetition_penalty
-        else:
-            adjusted_value = move_value + repetition_penalty
-            
-        move_scores.append((adjusted_value, move))
-    
-    # Sort moves by score
-    if board.turn == chess.WHITE:
-        move_scores.sort(key=lambda x: x[0], reverse=True)  # Highest score first
-    else:
-        move_scores.sort(key=lambda x: x[0])  # Lowest score first
-    
-    # Select the best non-repetitive move
-    best_move = move_scores[0][1] if move_scores else legal_moves[0]
-    
+    searcher = searcher or default_searcher
+    config = config or DEFAULT_CONFIG
+    if all(limit is None for limit in (depth, movetime, nodes, wtime, btime)):
+        depth, movetime, nodes = config.depth, config.movetime, config.nodes
+
+    # Check opening book first
+    if use_book and config.features["book"]:
+        move = book.choose_move(board, position_key(board))
+        if move is not None:
+            logger.debug("Opening book move: %s", move.uci())
+            searcher.reset_stats()  # No search ran; don't report the last one
+            searcher.stats.update(source="book", pv=[move.uci()])
+            return move
+
+    # The anti-repetition penalty makes the result depend on the recent moves
+    recent_moves = set(move_history[-6:])
+    if result_cache is not None and any(move.uci() in recent_moves for move in legal_moves):
+        result_cache = None
+    # Weakened play picks among several moves; the cache would repeat one of them
+    if not config.features["result_cache"] or config.skill < MAX_SKILL:
+        result_cache = None
+    # Profiles whose search finds something else get their own cache entries
+    key = position_key(board) ^ config.key if result_cache is not None else None
+    if key is not None and depth is not None:
+        cached = result_cache.get(key, depth)
+        if cached is not None:
+            logger.debug("Cached result: %s (depth %d)", cached["move"], cached["depth"])
+            searcher.reset_stats()
+            searcher.stats.update(source="cache", depth=cached["depth"], score=cached["score"], pv=cached["pv"])
+            return chess.Move.from_uci(cached["move"])
+
+    best_move = searcher.search(board, depth=depth, movetime=movetime, nodes=nodes, wtime=wtime, btime=btime,
+                                winc=winc, binc=binc, movestogo=movestogo, move_history=move_history,
+                                stop_event=stop_event, info_callback=info_callback, config=config)
+    if key is not None and best_move is not None and searcher.stats["depth"] > 0:
+        result_cache.put(key, searcher.stats["depth"], best_move.uci(), searcher.stats["score"],
+                         searcher.stats["pv"])
     return best_move
 
-def simple_evaluate(board):
+def simple_evaluate(board, weights=DEFAULT_WEIGHTS):
     """
     Smart chess evaluation with opening principles and strategic factors.
+    weights (see engine_config.DEFAULT_WEIGHTS) scale the terms; a term
+    whose weights are all 0 is skipped.
     """
     if board.is_checkmate():
         return -10000 if board.turn == chess.WHITE else 10000
     if board.is_stalemate() or board.is_insufficient_material():
         return 0
 
-    score = 0
-    
     # Material evaluation
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            piece_value = piece_values.get(piece.piece_type, 0)
-            if piece.color == chess.WHITE:
-                score += piece_value
-            else:
-                score -= piece_value
+    score = eval_terms(board)[0]
 
     # Opening principles (first 15 moves)
     if board.fullmove_number <= 15:
-        score += evaluate_opening_principles(board)
+        score += evaluate_opening_principles(board, weights)
     
     # Strategic factors
-    score += evaluate_piece_activity(board)
-    score += evaluate_king_safety_simple(board)
-    score += evaluate_center_control_simple(board)
+    if weights["mobility"]:
+        score += evaluate_piece_activity(board, weights)
+    if weights["king_in_center"]:
+        score += evaluate_king_safety_simple(board, weights)
+    if weights["center_occupation"]:
+        score += evaluate_center_control_simple(board, weights)
     
     # Anti-repetition: penalize moving the same piece repeatedly
-    score += evaluate_piece_development(board)
+    if weights["undeveloped"]:
+        score += evaluate_piece_development(board, weights)
 
     return score
 
-def evaluate_opening_principles(board):
+def evaluate_opening_principles(board, weights=DEFAULT_WEIGHTS):
     """Evaluate adherence to opening principles."""
     score = 0
     
     # Reward piece development
     developed_pieces = 0
     
-    # Check if knights and bishops are developed
-    for square in [chess.B1, chess.G1]:  # White knights
-        piece = board.piece_at(square)
-        if not piece or piece.piece_type != chess.KNIGHT:
-            developed_pieces += 1
-    
-    for square in [chess.C1, chess.F1]:  # White bishops
-        piece = board.piece_at(square)
-        if not piece or piece.piece_type != chess.BISHOP:
-            developed_pieces += 1
-            
-    for square in [chess.B8, chess.G8]:  # Black knights
-        piece = board.piece_at(square)
-        if not piece or piece.piece_type != chess.KNIGHT:
-            developed_pieces -= 1
+    # Check if knights and bishops are developed (off their starting squares)
+    developed_pieces += 2 - chess.popcount(board.knights & (chess.BB_B1 | chess.BB_G1))
+    developed_pieces += 2 - chess.popcount(board.bishops & (chess.BB_C1 | chess.BB_F1))
+    developed_pieces -= 2 - chess.popcount(board.knights & (chess.BB_B8 | chess.BB_G8))
+    developed_pieces -= 2 - chess.popcount(board.bishops & (chess.BB_C8 | chess.BB_F8))
     
-    for square in [chess.C8, chess.F8]:  # Black bishops
-        piece = board.piece_at(square)
-        if not piece or piece.piece_type != chess.BISHOP:
-            developed_pieces -= 1
-    
-    score += developed_pieces * 30
+    score += developed_pieces * weights["development"]
     
     # Reward castling
     if board.has_castling_rights(chess.WHITE):
         if not board.has_kingside_castling_rights(chess.WHITE) and not board.has_queenside_castling_rights(chess.WHITE):
-            score += 50  # Already castled
+            score += weights["castled"]  # Already castled
     else:
-        score += 20  # Lost castling rights but might have castled
+        score += weights["castling_lost"]  # Lost castling rights but might have castled
         
     if board.has_castling_rights(chess.BLACK):
         if not board.has_kingside_castling_rights(chess.BLACK) and not board.has_queenside_castling_rights(chess.BLACK):
-            score -= 50  # Already castled
+            score -= weights["castled"]  # Already castled
     else:
-        score -= 20  # Lost castling rights but might have castled
-    
-    # Penalize early queen moves
-    white_queen_square = None
-    black_queen_square = None
+        score -= weights["castling_lost"]  # Lost castling rights but might have castled
     
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece and piece.piece_type == chess.QUEEN:
-            if piece.color == chess.WHITE:
-                white_queen_square = square
-            else:
-                black_queen_square = square
+    # Penalize early queen moves (the highest-square queen if there are several)
+    white_queens = board.pieces_mask(chess.QUEEN, chess.WHITE)
+    black_queens = board.pieces_mask(chess.QUEEN, chess.BLACK)
+    white_queen_square = chess.msb(white_queens) if white_queens else None
+    black_queen_square = chess.msb(black_queens) if black_queens else None
     
     if white_queen_square and white_queen_square != chess.D1:
-        score -= 20  # Penalize early queen development
+        score -= weights["early_queen"]  # Penalize early queen development
     if black_queen_square and black_queen_square != chess.D8:
-        score += 20  # Penalize opponent's early queen development
+        score += weights["early_queen"]  # Penalize opponent's early queen development
     
     return score
 
-def evaluate_piece_activity(board):
+def evaluate_piece_activity(board, weights=DEFAULT_WEIGHTS):
     """Evaluate piece activity and mobility."""
     score = 0
     
@@ -418,20 +694,19 @@ def evaluate_piece_activity(board):
     black_mobility = 0
     
     if board.turn == chess.WHITE:
-        white_mobility = len(list(board.legal_moves))
-        # Switch turns to count black mobility
-        board_copy = board.copy()
-        board_copy.push(chess.Move.null()) if hasattr(chess.Move, 'null') else None
-        if hasattr(chess.Move, 'null'):
-            black_mobility = len(list(board_copy.legal_moves))
+        white_mobility = board.legal_moves.count()
+        # Pass the turn with a null move to count black mobility
+        board.push(chess.Move.null())
+        black_mobility = board.legal_moves.count()
+        board.pop()
     else:
-        black_mobility = len(list(board.legal_moves))
+        black_mobility = board.legal_moves.count()
     
-    score += (white_mobility - black_mobility) * 2
+    score += (white_mobility - black_mobility) * weights["mobility"]
     
     return score
 
-def evaluate_king_safety_simple(board):
+def evaluate_king_safety_simple(board, weights=DEFAULT_WEIGHTS):
     """Simple king safety evaluation."""
     score = 0
     
@@ -443,50 +718,28 @@ def evaluate_king_safety_simple(board):
         center_squares = [chess.D4, chess.D5, chess.E4, chess.E5, chess.C4, chess.C5, chess.F4, chess.F5]
         
         if white_king in center_squares:
-            score -= 50
+            score -= weights["king_in_center"]
         if black_king in center_squares:
-            score += 50
+            score += weights["king_in_center"]
     
     return score
 
-def evaluate_center_control_simple(board):
+def evaluate_center_control_simple(board, weights=DEFAULT_WEIGHTS):
     """Simple center control evaluation."""
-    score = 0
-    center_squares = [chess.D4, chess.D5, chess.E4, chess.E5]
-    
-    for square in center_squares:
-        piece = board.piece_at(square)
-        if piece:
-            if piece.color == chess.WHITE:
-                score += 20
-            else:
-                score -= 20
-    
-    return score
+    # Pieces of either color standing on the four center squares
+    white_center = chess.popcount(board.occupied_co[chess.WHITE] & CENTER_MASK)
+    black_center = chess.popcount(board.occupied_co[chess.BLACK] & CENTER_MASK)
+    return (white_center - black_center) * weights["center_occupation"]
 
-def evaluate_piece_development(board):
+def evaluate_piece_development(board, weights=DEFAULT_WEIGHTS):
     """Reward piece development and penalize repetitive moves."""
-    score = 0
-    
-    # Count pieces on starting squares (penalize underdevelopment)
-    starting_squares = {
-        chess.A1: chess.ROOK, chess.H1: chess.ROOK,
-        chess.B1: chess.KNIGHT, chess.G1: chess.KNIGHT,
-        chess.C1: chess.BISHOP, chess.F1: chess.BISHOP,
-        chess.A8: chess.ROOK, chess.H8: chess.ROOK,
-        chess.B8: chess.KNIGHT, chess.G8: chess.KNIGHT,
-        chess.C8: chess.BISHOP, chess.F8: chess.BISHOP,
-    }
-    
-    for square, expected_piece in starting_squares.items():
-        piece = board.piece_at(square)
-        if piece and piece.piece_type == expected_piece:
-            if piece.color == chess.WHITE:
-                score -= 10  # Penalize underdeveloped white pieces
-            else:
-                score += 10  # Reward opponent's underdeveloped pieces
-    
-    return score
+    # Count pieces on starting squares (penalize underdevelopment); a piece counts
+    # for its own color on either side's starting squares
+    undeveloped = ((board.rooks & ROOK_START_MASK) | (board.knights & KNIGHT_START_MASK)
+                   | (board.bishops & BISHOP_START_MASK))
+    white_undeveloped = chess.popcount(undeveloped & board.occupied_co[chess.WHITE])
+    black_undeveloped = chess.popcount(undeveloped & board.occupied_co[chess.BLACK])
+    return (black_undeveloped - white_undeveloped) * weights["undeveloped"]
 
 # Evaluate board state
 def evaluate_board(board):
@@ -498,26 +751,10 @@ def evaluate_board(board):
     if board.is_stalemate() or board.is_insufficient_material():
         return 0
 
-    score = 0
-    
-    # Determine game phase (opening/middlegame vs endgame)
-    total_pieces = sum(1 for square in chess.SQUARES if board.piece_at(square))
-    is_endgame = total_pieces <= 12  # Endgame when 12 or fewer pieces remain
-    
-    # Material and positional evaluation
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            piece_value = piece_values.get(piece.piece_type, 0)
-            
-            # Use different piece-square tables based on game phase
-            if is_endgame and piece.piece_type in endgame_piece_square_tables:
-                position_bonus = endgame_piece_square_tables[piece.piece_type][square]
-            else:
-                position_bonus = piece_square_tables.get(piece.piece_type, [0] * 64)[square] if piece.piece_type in piece_square_tables else 0
-            
-            piece_score = piece_value + position_bonus
-            score += piece_score if piece.color == chess.WHITE else -piece_score
+    # Material plus piece-square bonuses, with the endgame tables once few pieces remain
+    material, midgame_pst, endgame_pst, piece_count = eval_terms(board)
+    is_endgame = piece_count <= ENDGAME_PIECE_COUNT
+    score = material + (endgame_pst if is_endgame else midgame_pst)
 
     # Additional positional factors
     score += evaluate_mobility(board)
@@ -537,187 +774,705 @@ def evaluate_mobility(board):
         return 0
 
 def evaluate_king_safety(board):
-    """Evaluate king safety based on pawn shield and piece attacks."""
+    """Evaluate king safety: own pawns on the three squares in front of each king."""
     score = 0
-    white_king_square = board.king(chess.WHITE)
-    black_king_square = board.king(chess.BLACK)
-    
-    if white_king_square is not None:
-        # Count pawns protecting the king
-        white_king_rank = chess.square_rank(white_king_square)
-        white_king_file = chess.square_file(white_king_square)
-        white_pawn_shield = 0
-        for file_offset in [-1, 0, 1]:
-            if 0 <= white_king_file + file_offset <= 7:
-                pawn_square = chess.square(white_king_file + file_offset, white_king_rank - 1)
-                if board.piece_at(pawn_square) == chess.Piece(chess.PAWN, chess.WHITE):
-                    white_pawn_shield += 1
-        score += white_pawn_shield * 10
-    
-    if black_king_square is not None:
-        # Count pawns protecting the king
-        black_king_rank = chess.square_rank(black_king_square)
-        black_king_file = chess.square_file(black_king_square)
-        black_pawn_shield = 0
-        for file_offset in [-1, 0, 1]:
-            if 0 <= black_king_file + file_offset <= 7:
-                pawn_square = chess.square(black_king_file + file_offset, black_king_rank + 1)
-                if board.piece_at(pawn_square) == chess.Piece(chess.PAWN, chess.BLACK):
-                    black_pawn_shield += 1
-        score -= black_pawn_shield * 10
-    
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        king_square = board.king(color)
+        if king_square is not None:
+            shield = KING_SHIELD_MASKS[color][king_square] & board.pieces_mask(chess.PAWN, color)
+            score += sign * chess.popcount(shield) * KING_SHIELD_BONUS
     return score
 
 def evaluate_pawn_structure(board):
     """Evaluate pawn structure (doubled, isolated, passed pawns)."""
     score = 0
-    
-    # Check for doubled pawns
-    for file in range(8):
-        white_pawns = 0
-        black_pawns = 0
-        for rank in range(8):
-            square = chess.square(file, rank)
-            piece = board.piece_at(square)
-            if piece and piece.piece_type == chess.PAWN:
-                if piece.color == chess.WHITE:
-                    white_pawns += 1
-                else:
-                    black_pawns += 1
-        if white_pawns > 1:
-            score -= (white_pawns - 1) * 20  # Penalty for doubled pawns
-        if black_pawns > 1:
-            score += (black_pawns - 1) * 20  # Penalty for doubled pawns
-    
+    white_pawns = board.pieces_mask(chess.PAWN, chess.WHITE)
+    black_pawns = board.pieces_mask(chess.PAWN, chess.BLACK)
+    for color, sign, pawns, enemy_pawns in ((chess.WHITE, 1, white_pawns, black_pawns),
+                                            (chess.BLACK, -1, black_pawns, white_pawns)):
+        for file in range(8):
+            on_file = chess.popcount(pawns & chess.BB_FILES[file])
+            if on_file > 1:
+                score -= sign * (on_file - 1) * DOUBLED_PAWN_PENALTY
+            if on_file and not pawns & ADJACENT_FILES_MASKS[file]:
+                score -= sign * on_file * ISOLATED_PAWN_PENALTY
+
+        for square in chess.scan_forward(pawns):
+            if not enemy_pawns & PASSED_PAWN_MASKS[color][square]:
+                rank = chess.square_rank(square)
+                score += sign * PASSED_PAWN_BONUS[rank if color == chess.WHITE else 7 - rank]
     return score
 
 def evaluate_center_control(board):
-    """Evaluate control of center squares."""
-    try:
-        center_squares = [chess.D4, chess.D5, chess.E4, chess.E5]
-        score = 0
-        
-        for square in center_squares:
-            # Check if current player controls this square
-            current_attacks = any(move.to_square == square for move in board.legal_moves if board.piece_at(move.from_square) and board.piece_at(move.from_square).color == board.turn)
-            
-            if current_attacks:
-                score += 20 if board.turn == chess.WHITE else -20
-        
-        return score
-    except:
-        return 0
+    """Evaluate control of center squares: those the side to move attacks."""
+    controlled = sum(1 for square in chess.scan_forward(CENTER_MASK)
+                     if board.attackers_mask(board.turn, square))
+    return controlled * 20 if board.turn == chess.WHITE else -controlled * 20
 
-def order_moves(board):
+# Piece values for MVV-LVA in move ordering (in pawns; piece_values is the evaluation's)
+MVV_LVA_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 100}
+
+# Quiet move ordering bonuses; history scores are capped below the check bonus
+QUIET_CHECK_BONUS = 1000
+QUIET_CASTLING_BONUS = 100
+QUIET_CENTER_BONUS = 50
+HISTORY_CAP = 900
+
+def check_squares(board):
     """
-    Orders moves using MVV-LVA (Most Valuable Victim - Least Valuable Attacker).
-    Prioritizes captures, checks, and promotions for better alpha-beta pruning.
+    Squares from which a piece of the side to move would give check, indexed
+    by piece type (direct checks with the board's current occupancy).
     """
-    moves = list(board.legal_moves)
-    scored_moves = []
+    squares = [0] * 7
+    king = board.king(not board.turn)
+    if king is None:
+        return squares
+    occupied = board.occupied
+    diagonal = chess.BB_DIAG_ATTACKS[king][chess.BB_DIAG_MASKS[king] & occupied]
+    straight = (chess.BB_RANK_ATTACKS[king][chess.BB_RANK_MASKS[king] & occupied]
+                | chess.BB_FILE_ATTACKS[king][chess.BB_FILE_MASKS[king] & occupied])
+    squares[chess.PAWN] = chess.BB_PAWN_ATTACKS[not board.turn][king]
+    squares[chess.KNIGHT] = chess.BB_KNIGHT_ATTACKS[king]
+    squares[chess.BISHOP] = diagonal
+    squares[chess.ROOK] = straight
+    squares[chess.QUEEN] = diagonal | straight
+    return squares
 
-    # Piece values for MVV-LVA
-    piece_values = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, 
-                   chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 100}
+def capture_score(board, move):
+    """MVV-LVA score of a capture or promotion."""
+    victim = board.piece_type_at(move.to_square)
+    if victim is None:
+        victim = chess.PAWN if board.is_en_passant(move) else None
+    score = MVV_LVA_VALUES[victim] * 10 if victim else 0
+    if move.promotion:
+        score += MVV_LVA_VALUES[move.promotion] * 10
+    return score - MVV_LVA_VALUES[board.piece_type_at(move.from_square)]
 
-    for move in moves:
-        score = 0
-        
-        # MVV-LVA for captures
-        if board.is_capture(move):
-            captured_piece = board.piece_at(move.to_square)
-            attacking_piece = board.piece_at(move.from_square)
-            if captured_piece and attacking_piece:
-                victim_value = piece_values.get(captured_piece.piece_type, 0)
-                attacker_value = piece_values.get(attacking_piece.piece_type, 0)
-                score += 10000 + victim_value * 10 - attacker_value
-        
-        # Check bonus
-        if board.gives_check(move):
-            score += 1000
-        
-        # Promotion bonus
-        if move.promotion:
-            score += 2000 + piece_values.get(move.promotion, 0) * 100
-        
-        # Center control bonus
-        center_squares = [27, 28, 35, 36]  # d4, e4, d5, e5
-        if move.to_square in center_squares:
-            score += 50
-        
-        # Castling bonus
-        if board.is_castling(move):
-            score += 100
-        
+def _by_score(scored_move):
+    return scored_move[0]
+
+def staged_moves(board, tt_move=None, killers=(), history=None):
+    """
+    Yields the legal moves of board best first, in stages, so that a node
+    that cuts off early never generates or scores most of its moves:
+
+    1. the transposition table move,
+    2. captures and promotions by MVV-LVA,
+    3. the killer moves,
+    4. quiet moves: checks (found from precomputed check squares), castling,
+       moves to the center, then by the history heuristic.
+
+    Each stage is generated pseudo-legally when it is reached, and a move is
+    checked for legality only right before it is yielded, the way
+    chess.Board.generate_legal_moves does. In check the few evasions are
+    generated and ordered at once.
+    """
+    turn = board.turn
+    king = board.king(turn)
+    if king is None or board.is_check():
+        yield from _ordered_evasions(board, tt_move, killers, history)
+        return
+    blockers = board._slider_blockers(king)
+    is_safe = board._is_safe
+
+    if tt_move is not None and board.is_pseudo_legal(tt_move) and is_safe(king, blockers, tt_move):
+        yield tt_move
+
+    captures = [(capture_score(board, move), move) for move in board.generate_pseudo_legal_captures()]
+    empty = ~board.occupied
+    captures += [(capture_score(board, move), move)
+                 for move in board.generate_pseudo_legal_moves(board.pawns, chess.BB_BACKRANKS & empty)]
+    captures.sort(key=_by_score, reverse=True)  # Stable: ties keep the generation order
+    for _, move in captures:
+        if move != tt_move and is_safe(king, blockers, move):
+            yield move
+
+    tried = [tt_move]
+    for killer in killers:
+        if (killer not in tried and killer is not None and not killer.promotion
+                and not board.is_capture(killer) and board.is_pseudo_legal(killer)
+                and is_safe(king, blockers, killer)):
+            # A king move from a sibling position can be king-takes-own-rook
+            # castling here; only the standard encoding is generated below
+            if board.is_castling(killer) and killer not in board.generate_castling_moves():
+                continue
+            tried.append(killer)
+            yield killer
+
+    squares = check_squares(board)
+    piece_type_at = board.piece_type_at
+    ep_square = board.ep_square
+    history_base = turn << 12
+    quiet = []
+    for move in board.generate_pseudo_legal_moves(chess.BB_ALL, empty):
+        from_square, to_square = move.from_square, move.to_square
+        if move.promotion or move in tried:
+            continue
+        piece_type = piece_type_at(from_square)
+        if to_square == ep_square and piece_type == chess.PAWN:
+            continue  # En passant, a capture
+        score = min(history[history_base | from_square << 6 | to_square], HISTORY_CAP) if history is not None else 0
+        if squares[piece_type] & chess.BB_SQUARES[to_square]:
+            score += QUIET_CHECK_BONUS
+        if CENTER_MASK & chess.BB_SQUARES[to_square]:
+            score += QUIET_CENTER_BONUS
+        quiet.append((score, move))
+    for move in board.generate_castling_moves():
+        if move not in tried:
+            quiet.append((QUIET_CASTLING_BONUS, move))
+    quiet.sort(key=_by_score, reverse=True)
+    for _, move in quiet:
+        if is_safe(king, blockers, move):
+            yield move
+
+def _ordered_evasions(board, tt_move, killers, history):
+    """The legal moves of a position in check, in the order of staged_moves."""
+    scored_moves = []
+    for move in board.generate_legal_moves():
+        if move == tt_move:
+            score = INFINITY
+        elif move.promotion or board.is_capture(move):
+            score = 10000 + capture_score(board, move)
+        elif move in killers:
+            score = 5000
+        else:
+            score = min(history[history_index(board.turn, move)], HISTORY_CAP) if history is not None else 0
         scored_moves.append((score, move))
+    scored_moves.sort(key=_by_score, reverse=True)
+    for _, move in scored_moves:
+        yield move
+
+def order_moves(board, tt_move=None, killers=(), history=None):
+    """
+    All legal moves, best first: the transposition table move, captures and
+    promotions by MVV-LVA (Most Valuable Victim - Least Valuable Attacker),
+    killer moves, then quiet moves (see staged_moves).
+    """
+    return list(staged_moves(board, tt_move, killers, history))
+
+def _legal_move_list(board):
+    return list(board.legal_moves)
+
+def _legal_capture_list(board):
+    return list(board.generate_legal_captures())
+
+def _has_legal_move(board):
+    return any(board.generate_legal_moves())
+
+def _timed(function, stats, name):
+    """function, adding the time of every call to stats[name]."""
+    perf_counter = time.perf_counter
+
+    def timed(*args):
+        started = perf_counter()
+        try:
+            return function(*args)
+        finally:
+            stats[name] += perf_counter() - started
+    return timed
+
+def _timed_generator(function, stats, name):
+    """Generator function, adding the time spent producing every item to stats[name]."""
+    perf_counter = time.perf_counter
+
+    def timed(*args):
+        iterator = function(*args)
+        while True:
+            started = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stats[name] += perf_counter() - started
+            yield item
+    return timed
 
-    scored_moves.sort(reverse=True, key=lambda x: x[0])  # Sort high to low
-    return [move for _, move in scored_moves]
+def history_index(color, move):
+    """Index of a quiet move in the history heuristic table."""
+    return (color << 12) | (move.from_square << 6) | move.to_square
 
-def quiescence_search(board, alpha, beta, depth=0):
+def material_balance(board):
+    """White's material minus Black's (kings excluded), counted on the piece bitboards."""
+    if isinstance(board, SearchBoard):
+        return eval_terms(board)[0]  # Both kings are on the board, so theirs cancel out
+    score = 0
+    for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN):
+        count = (chess.popcount(board.pieces_mask(piece_type, chess.WHITE))
+                 - chess.popcount(board.pieces_mask(piece_type, chess.BLACK)))
+        score += piece_values[piece_type] * count
+    return score
+
+def see(board, move):
     """
-    Extends Minimax when in a capture sequence to prevent horizon effect.
+    Static exchange evaluation: material the side to move expects to win
+    (negative: lose) by making capture move, assuming both sides keep
+    recapturing on the target square with their least valuable piece.
     """
-    if depth >= 6:  # Limit quiescence depth
-        return evaluate_board(board)
-        
-    stand_pat = evaluate_board(board)
-    if stand_pat >= beta:
-        return beta
-    alpha = max(alpha, stand_pat)
-
-    # Get all captures and checks
-    moves = []
-    for move in board.legal_moves:
-        if board.is_capture(move) or board.gives_check(move):
-            moves.append(move)
-    
-    # Order moves by MVV-LVA
-    moves = order_moves(board)
-    
-    for move in moves:
-        if board.is_capture(move) or board.gives_check(move):
-            board.push(move)
-            score = -quiescence_search(board, -beta, -alpha, depth + 1)
-            board.pop()
-            if score >= beta:
-                return beta
-            alpha = max(alpha, score)
+    to_square = move.to_square
+    occupied = board.occupied & ~chess.BB_SQUARES[move.from_square]
+    if board.is_en_passant(move):
+        captured_value = piece_values[chess.PAWN]
+        occupied &= ~chess.BB_SQUARES[to_square + (-8 if board.turn == chess.WHITE else 8)]
+    else:
+        captured_type = board.piece_type_at(to_square)
+        captured_value = piece_values[captured_type] if captured_type else 0
 
-    return alpha
+    attacker_value = piece_values[board.piece_type_at(move.from_square)]
+    if move.promotion:
+        captured_value += piece_values[move.promotion] - piece_values[chess.PAWN]
+        attacker_value = piece_values[move.promotion]
 
+    gains = [captured_value]
+    color = not board.turn
+    while True:
+        attackers = board.attackers_mask(color, to_square, occupied) & occupied
+        if not attackers:
+            break
+        for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING):
+            candidates = attackers & board.pieces_mask(piece_type, color)
+            if candidates:
+                break
+        if piece_type == chess.KING and board.attackers_mask(not color, to_square, occupied) & occupied:
+            break  # The king cannot recapture into check
+        # Speculatively recapture the piece that just landed on the square
+        gains.append(attacker_value - gains[-1])
+        attacker_value = piece_values[piece_type]
+        occupied &= ~chess.BB_SQUARES[chess.lsb(candidates)]
+        color = not color
 
-def simple_minimax(board, depth, alpha, beta, maximizing):
+    # Either side may stop recapturing when continuing would lose material
+    for index in range(len(gains) - 1, 0, -1):
+        gains[index - 1] = -max(-gains[index - 1], gains[index])
+    return gains[0]
+
+def weaker_move(root_moves, skill, rng=random):
     """
-    Simple Minimax Algorithm with Alpha-Beta Pruning using board copies.
+    The move a player of the given skill (below MAX_SKILL) plays from the root
+    moves of the last iteration, best first: mostly the best one, but the
+    lower the skill the more often one of the next best instead.
     """
-    if depth == 0 or board.is_game_over():
-        return simple_evaluate(board)
+    weakness = (MAX_SKILL - skill) / MAX_SKILL
+    if len(root_moves) > 1 and rng.random() < weakness / 2:
+        return rng.choice(root_moves[1:2 + int(weakness * 4)])
+    return root_moves[0]
 
-    legal_moves = list(board.legal_moves)
-    
-    if maximizing:
-        max_eval = float('-inf')
-        for move in legal_moves:
-            # Use board copy to avoid modifying original
-            board_copy = board.copy()
-            board_copy.push(move)
-            eval_score = simple_minimax(board_copy, depth - 1, alpha, beta, False)
-            max_eval = max(max_eval, eval_score)
-            alpha = max(alpha, eval_score)
-            if beta <= alpha:
-                break  # Beta cutoff
-        return max_eval
-    else:
-        min_eval = float('inf')
-        for move in legal_moves:
-            # Use board copy to avoid modifying original
-            board_copy = board.copy()
-            board_copy.push(move)
-            eval_score = simple_minimax(board_copy, depth - 1, alpha, beta, True)
-            min_eval = min(min_eval, eval_score)
-            beta = min(beta, eval_score)
-            if beta <= alpha:
-                break  # Alpha cutoff
-        return min_eval
-    
+class Searcher:
+    """
+    Negamax principal variation search with alpha-beta pruning.
+
+    Holds what is worth keeping between the moves of one game (transposition
+    table, history heuristic) and the per-search killer moves, limits and
+    statistics. Scores inside the search are from the side to move's view.
+    """
+
+    def __init__(self, tt_size_mb=16):
+        self.transposition_table = TranspositionTable(tt_size_mb)
+        self.history = array("i", bytes(4 * 2 * 64 * 64))
+        self.killers = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        self.deadline = None
+        self.max_nodes = None
+        self.stop_event = None  # Anything with is_set(); set to stop the search early
+        self.use_tablebase = False  # Probe the WDL tables in the search (set per search)
+        self.config = DEFAULT_CONFIG  # Weights, features and skill of the current search
+        self.quiescence_depth = QUIESCENCE_MAX_DEPTH  # 0 without quiescence (set per search)
+        self.time_phases = SEARCH_PHASE_TIMING  # Fill the *_time stats (costs some speed)
+        self.profile_dir = SEARCH_PROFILE_DIR
+        self.searches = 0
+        # Counters and results of the last search; score is from the mover's view
+        self.stats = {}
+        self.reset_stats()
+        self.bind_phases()
+
+    def clear(self):
+        """Forgets everything learned so far (new game)."""
+        self.transposition_table.clear()
+        self.history = array("i", bytes(4 * 2 * 64 * 64))
+
+    def reset_stats(self):
+        # source: how the move was found (search, book, cache or tablebase)
+        self.stats.update(source="search", nodes=0, qnodes=0, depth=0, score=0, pv=[], time=0.0,
+                          beta_cutoffs=0, researches=0, iteration_nodes=[], ebf=0.0, tb_hits=0,
+                          movegen_time=0.0, eval_time=0.0, ordering_time=0.0)
+
+    def bind_phases(self):
+        """
+        Picks the move generation, evaluation and ordering functions the search
+        calls: timed into movegen_time, eval_time and ordering_time if
+        time_phases is set, the plain ones otherwise. Move generation for
+        ordering counts as ordering. The evaluation uses the config's weights.
+        """
+        evaluate = simple_evaluate
+        if self.config.weights != DEFAULT_WEIGHTS:
+            evaluate = functools.partial(simple_evaluate, weights=self.config.weights)
+        phases = {
+            "_game_over": (chess.Board.is_game_over, "movegen_time"),
+            "_legal_moves": (_legal_move_list, "movegen_time"),
+            "_legal_captures": (_legal_capture_list, "movegen_time"),
+            "_has_legal_move": (_has_legal_move, "movegen_time"),
+            "_evaluate": (evaluate, "eval_time"),
+            "_material": (material_balance, "eval_time"),
+            "_order_moves": (staged_moves, "ordering_time"),
+            "_see": (see, "ordering_time"),
+        }
+        for attribute, (function, name) in phases.items():
+            if self.time_phases:
+                timer = _timed_generator if inspect.isgeneratorfunction(function) else _timed
+                function = timer(function, self.stats, name)
+            setattr(self, attribute, function)
+
+    def report(self):
+        """Statistics of the last search as plain values, for logs, metrics and API responses."""
+        stats = self.stats
+        tt = self.transposition_table
+        probes = tt.hits + tt.misses + tt.collisions
+        total_nodes = stats["nodes"] + stats["qnodes"]
+        report = {
+            "source": stats["source"],
+            "depth": stats["depth"],
+            "score": stats["score"],
+            "pv": list(stats["pv"]),
+            "nodes": stats["nodes"],
+            "qnodes": stats["qnodes"],
+            "time": stats["time"],
+            "nps": int(total_nodes / stats["time"]) if stats["time"] else 0,
+            "ebf": stats["ebf"],
+            "beta_cutoffs": stats["beta_cutoffs"],
+            "researches": stats["researches"],
+            "tt_hits": tt.hits if stats["source"] == "search" else 0,
+            "tt_hit_rate": tt.hits / probes if probes and stats["source"] == "search" else 0.0,
+            "tt_cutoffs": tt.cutoffs if stats["source"] == "search" else 0,
+            "tb_hits": stats["tb_hits"],
+        }
+        if self.time_phases:
+            for name in ("movegen_time", "eval_time", "ordering_time"):
+                report[name] = stats[name]
+        return report
+
+    def new_search(self):
+        """Prepares the caches for a new root position: ages TT entries and history, drops killers."""
+        self.transposition_table.new_search()
+        self.transposition_table.reset_stats()
+        self.killers = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        for index in range(len(self.history)):
+            self.history[index] >>= 1  # Age the history from earlier moves
+        features = self.config.features
+        self.use_tablebase = features["tablebase"] and tablebase.get_tablebase() is not None
+        self.quiescence_depth = QUIESCENCE_MAX_DEPTH if features["quiescence"] else 0
+        self.bind_phases()
+
+    def check_limits(self):
+        """Aborts the running search once the deadline or node limit is reached, or on request."""
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.max_nodes is not None and self.stats["nodes"] + self.stats["qnodes"] >= self.max_nodes:
+            raise SearchTimeout()
+
+    def search(self, board, depth=None, movetime=None, nodes=None, wtime=None, btime=None,
+               winc=0, binc=0, movestogo=None, move_history=(), stop_event=None, info_callback=None,
+               config=None):
+        """
+        Iterative deepening driver. Returns the best move of the last finished
+        iteration; budgets and config work as described in get_best_move. Setting
+        stop_event (e.g. a threading.Event) ends the search at the next node.
+        info_callback(info) gets depth, score, pv, nodes, qnodes, time and
+        the best move so far after every finished iteration.
+        """
+        if not any(board.generate_legal_moves()):
+            return None
+
+        start = time.perf_counter()
+        budget = movetime / 1000 if movetime is not None else None
+        clock_budget = allocate_time(board, wtime, btime, winc, binc, movestogo)
+        if clock_budget is not None:
+            budget = clock_budget if budget is None else min(budget, clock_budget)
+        config = config or DEFAULT_CONFIG
+        if depth is None:
+            depth = (config.depth or DEFAULT_DEPTH) if budget is None and nodes is None else MAX_SEARCH_DEPTH
+
+        # Scores stored under other weights or features would mislead this search
+        if config.key != self.config.key:
+            self.transposition_table.clear()
+        self.config = config
+        self.reset_stats()
+        self.new_search()
+        search_board = SearchBoard.from_board(board)
+
+        # A solved position needs no search: play the tablebase's move
+        root_probe = tablebase.probe_root(search_board) if self.use_tablebase else None
+        if root_probe is not None:
+            move, wdl = root_probe
+            self.stats.update(source="tablebase", score=tablebase.wdl_score(wdl), pv=[move.uci()], tb_hits=1,
+                              time=time.perf_counter() - start)
+            logger.debug("Tablebase move: %s (WDL %d)", move.uci(), wdl)
+            return move
+
+        self.stop_event = stop_event
+        recent_moves = list(move_history[-6:])
+
+        root_moves = list(self._order_moves(search_board))
+        # Played if the search is stopped during the first iteration
+        best_move = root_moves[0]
+        self.searches += 1
+        profiler = None
+        if self.profile_dir and self.searches % SEARCH_PROFILE_EVERY == 0:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            for current_depth in range(1, min(depth, MAX_SEARCH_DEPTH) + 1):
+                nodes_before = self.stats["nodes"]
+                move_scores = self.search_root(search_board, current_depth, root_moves, recent_moves)
+                best_move = move_scores[0][1]
+                # Next iteration searches this iteration's best line first
+                root_moves = [move for _, move in move_scores]
+
+                iteration_nodes = self.stats["iteration_nodes"]
+                iteration_nodes.append(self.stats["nodes"] - nodes_before)
+                if len(iteration_nodes) > 1 and iteration_nodes[-2]:
+                    self.stats["ebf"] = iteration_nodes[-1] / iteration_nodes[-2]
+                self.stats.update(depth=current_depth, score=move_scores[0][0],
+                                  pv=self.principal_variation(search_board, best_move, current_depth))
+                if info_callback is not None:
+                    info_callback({
+                        "depth": current_depth,
+                        "score": self.stats["score"],
+                        "pv": list(self.stats["pv"]),
+                        "nodes": self.stats["nodes"],
+                        "qnodes": self.stats["qnodes"],
+                        "time": time.perf_counter() - start,
+                        "best_move": best_move.uci(),
+                    })
+
+                # The first iteration always completes; the budget applies from here on
+                self.deadline = start + budget if budget is not None else None
+                self.max_nodes = nodes
+                elapsed = time.perf_counter() - start
+                if budget is not None and elapsed >= budget / 2:
+                    break  # The next iteration would not finish in time
+                if nodes is not None and self.stats["nodes"] + self.stats["qnodes"] >= nodes:
+                    break
+        except SearchTimeout:
+            pass  # Keep the result of the last completed iteration
+        finally:
+            self.deadline = None
+            self.max_nodes = None
+            self.stop_event = None
+            if profiler is not None:
+                profiler.disable()
+                self.dump_profile(profiler, board)
+
+        if config.skill < MAX_SKILL:
+            move = weaker_move(root_moves, config.skill)
+            if move != best_move:
+                best_move = move
+                self.stats["pv"] = [move.uci()]
+        self.stats["time"] = time.perf_counter() - start
+        if logger.isEnabledFor(logging.INFO):
+            report = self.report()
+            logger.info("Searched %d nodes + %d qnodes to depth %d in %.2fs (%d nps, EBF %.1f, TT hit rate %.2f%s)",
+                        report["nodes"], report["qnodes"], report["depth"], report["time"], report["nps"],
+                        report["ebf"], report["tt_hit_rate"],
+                        f", TB hits {report['tb_hits']}" if self.use_tablebase else "")
+        return best_move
+
+    def dump_profile(self, profiler, board):
+        """Writes the profile of a search to profile_dir, named after the time, process and position."""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"search-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+                                              f"-{self.searches}-{position_key(board):016x}.prof")
+        profiler.dump_stats(path)
+        logger.info("Search profile written to %s", path)
+
+    def search_root(self, board, depth, root_moves, recent_moves):
+        """
+        Scores the root moves to the given depth with a PVS window, applying
+        the anti-repetition penalty. Returns (score, move) pairs, best first;
+        only the first score is exact, the rest are upper bounds.
+        """
+        move_scores = []
+        alpha = -INFINITY
+
+        for index, move in enumerate(root_moves):
+            # Anti-repetition: penalize moves that were played recently
+            repetition_penalty = recent_moves.count(move.uci()) * 100
+            score = self.search_root_move(board, move, depth, alpha, repetition_penalty,
+                                          full_window=index == 0)
+            alpha = max(alpha, score)
+            move_scores.append((score, move))
+
+        move_scores.sort(key=lambda x: x[0], reverse=True)  # Stable: ties keep the previous order
+        return move_scores
+
+    def search_root_move(self, board, move, depth, alpha, repetition_penalty=0, full_window=False):
+        """
+        Scores one root move, minus its repetition penalty. Unless full_window
+        is set, the score is only exact when it beats alpha (an upper bound otherwise).
+        """
+        board.push(move)
+        if full_window:
+            score = -self.negamax(board, depth - 1, -INFINITY, INFINITY, 1)
+        else:
+            # Only a score above alpha after the penalty is interesting
+            target = alpha + repetition_penalty
+            score = -self.negamax(board, depth - 1, -target - 1, -target, 1)
+            if score > target:
+                self.stats["researches"] += 1
+                score = -self.negamax(board, depth - 1, -INFINITY, -target, 1)
+        board.pop()
+        return score - repetition_penalty
+
+    def negamax(self, board, depth, alpha, beta, ply):
+        """Principal variation search; returns the score for the side to move."""
+        self.stats["nodes"] += 1
+        self.check_limits()
+        if self._game_over(board):
+            if board.is_checkmate():
+                return -MATE_SCORE + ply
+            return 0  # Stalemate, insufficient material, 75-move rule or fivefold repetition
+        if depth <= 0:
+            return self.quiescence(board, alpha, beta, ply)
+
+        tt = self.transposition_table
+        key = position_key(board)
+        if self.use_tablebase:
+            wdl = tablebase.probe_wdl(board, key)
+            if wdl is not None:
+                self.stats["tb_hits"] += 1
+                return tablebase.wdl_score(wdl, ply)
+        alpha_orig = alpha
+        tt_move = None
+        entry = tt.probe(key)
+        if entry:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            tt_score = score_from_tt(tt_score, ply)
+            if tt_depth >= depth and (tt_bound == TT_EXACT
+                                      or (tt_bound == TT_LOWER and tt_score >= beta)
+                                      or (tt_bound == TT_UPPER and tt_score <= alpha)):
+                tt.cutoffs += 1
+                return tt_score
+
+        killers = self.killers[ply]
+        best_score = -INFINITY
+        best_move = None
+        for index, move in enumerate(self._order_moves(board, tt_move, killers, self.history)):
+            board.push(move)
+            if index == 0:
+                score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Null window: prove the move is no better than the best so far
+                score = -self.negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    self.stats["researches"] += 1
+                    score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.stats["beta_cutoffs"] += 1
+                if not move.promotion and not board.is_capture(move):
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    self.history[history_index(board.turn, move)] += depth * depth
+                break
+
+        if best_score <= alpha_orig:
+            bound = TT_UPPER
+        elif best_score >= beta:
+            bound = TT_LOWER
+        else:
+            bound = TT_EXACT
+        tt.store(key, depth, score_to_tt(best_score, ply), bound, best_move)
+        return best_score
+
+    def quiescence(self, board, alpha, beta, ply, qdepth=0, positional=0):
+        """
+        Searches captures (all evasions when in check) until the position is
+        quiet, so leaves are not scored in the middle of an exchange.
+
+        The full evaluation runs once, at the first quiescence node; deeper
+        nodes add its positional part (White's view) to a bitboard material count.
+        """
+        self.stats["qnodes"] += 1
+        self.check_limits()
+
+        in_check = board.is_check()
+        if in_check:
+            evasions = self._legal_moves(board)
+            if not evasions:
+                return -MATE_SCORE + ply
+        elif qdepth and not self._has_legal_move(board):
+            return 0  # Stalemate (negamax already ruled it out at qdepth 0)
+
+        material = self._material(board)
+        if qdepth == 0:
+            positional = self._evaluate(board) - material
+        stand_pat = material + positional
+        if board.turn == chess.BLACK:
+            stand_pat = -stand_pat
+        if qdepth >= self.quiescence_depth:
+            return stand_pat
+
+        if in_check:
+            # No standing pat in check: every evasion must be searched
+            best_score = -INFINITY
+            moves = evasions
+        else:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            best_score = stand_pat
+            moves = []
+            for move in self._legal_captures(board):
+                if board.is_en_passant(move):
+                    victim_value = piece_values[chess.PAWN]
+                else:
+                    victim_value = piece_values[board.piece_type_at(move.to_square)]
+                if move.promotion:
+                    victim_value += piece_values[move.promotion] - piece_values[chess.PAWN]
+                if stand_pat + victim_value + DELTA_MARGIN < alpha:
+                    continue  # Delta pruning
+                if self._see(board, move) < 0:
+                    continue  # Losing exchange
+                moves.append((victim_value * 10 - piece_values[board.piece_type_at(move.from_square)], move))
+            moves.sort(key=lambda x: x[0], reverse=True)  # MVV-LVA
+            moves = [move for _, move in moves]
+
+        for move in moves:
+            board.push(move)
+            score = -self.quiescence(board, -beta, -alpha, ply + 1, qdepth + 1, positional)
+            board.pop()
+            if score > best_score:
+                best_score = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        return best_score
+
+    def principal_variation(self, board, first_move, max_length):
+        """Follows best moves stored in the transposition table after first_move."""
+        pv = [first_move]
+        board.push(first_move)
+        try:
+            while len(pv) < max_length:
+                move = self.transposition_table.get_move(position_key(board))
+                if move is None or not board.is_legal(move):
+                    break
+                pv.append(move)
+                board.push(move)
+        finally:
+            for _ in pv:
+                board.pop()
+        return [move.uci() for move in pv]
+
+
+# Search state for callers that don't keep their own Searcher
+default_searcher = Searcher()
+transposition_table = default_searcher.transposition_table
+search_stats = default_searcher.stats
@@ -0,0 +1,184 @@
+"""
+Engine profiles: search budget, evaluation weights, features and skill.
+
+An EngineConfig describes one way of playing: how deep or long to search,
+the weights of the evaluation terms the search uses (simple_evaluate), which
+features are on and a skill level. get_best_move takes one per search, so
+games on the same server can play at different strengths; the server picks
+the profile per request (profile=...) or per game (set_color/new_game).
+
+Material and piece-square values are not weights here: the search keeps
+them incrementally in precomputed tables (see SearchBoard). A weight of 0
+switches its term off entirely, which also saves its cost; the mobility
+term in particular is the most expensive part of the evaluation.
+
+The built-in PROFILES can be changed or extended without a redeploy by a
+JSON file at ENGINE_PROFILES_PATH, e.g.
+
+    {"casual": {"depth": 2, "skill": 10}, "tuned": {"weights": {"mobility": 3}}}
+
+which is read again whenever it changes. A file that can't be read or
+holds invalid profiles is logged and ignored: the profiles loaded before
+it stay in use. ENGINE_PROFILE names the profile used when none is asked
+for (default "default").
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEPTH = 3
+
+# Skill levels run from 0 to MAX_SKILL (full strength)
+MAX_SKILL = 20
+
+# Weights of the simple_evaluate terms (centipawns)
+DEFAULT_WEIGHTS = {
+    "development": 30,  # Per minor piece off its starting square (opening)
+    "castled": 50,  # Castled, or castling rights given up on both sides (opening)
+    "castling_lost": 20,  # All castling rights gone (opening)
+    "early_queen": 20,  # Queen off its starting square (opening)
+    "mobility": 2,  # Per legal move more than the opponent
+    "king_in_center": 50,  # King on the central squares in the first 20 moves
+    "center_occupation": 20,  # Per piece on d4, e4, d5, e5
+    "undeveloped": 10,  # Per rook, knight or bishop still on a starting square
+}
+
+# Switches for parts of the engine
+DEFAULT_FEATURES = {
+    "book": True,  # Play opening book moves
+    "tablebase": True,  # Probe Syzygy tables (when SYZYGY_PATH has them)
+    "quiescence": True,  # Resolve captures at the leaves instead of evaluating them as they stand
+    "result_cache": True,  # Answer from and store into the search result cache
+}
+
+# Features that change what a search finds (and so the result cache key)
+SEARCH_FEATURES = ("tablebase", "quiescence")
+
+BUDGET_FIELDS = ("depth", "movetime", "nodes")
+
+
+class EngineConfig:
+    """One engine profile. Unknown weight or feature names raise ValueError."""
+
+    def __init__(self, name="custom", depth=DEFAULT_DEPTH, movetime=None, nodes=None, weights=None,
+                 features=None, skill=MAX_SKILL):
+        for kind, given, known in (("weight", weights, DEFAULT_WEIGHTS), ("feature", features, DEFAULT_FEATURES)):
+            unknown = set(given or ()) - set(known)
+            if unknown:
+                raise ValueError(f"Unknown {kind}(s): {', '.join(sorted(unknown))}")
+        if not 0 <= skill <= MAX_SKILL:
+            raise ValueError(f"Skill must be between 0 and {MAX_SKILL}")
+        self.name = name
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.features = dict(DEFAULT_FEATURES, **(features or {}))
+        self.skill = skill
+        self.key = self._cache_key()
+
+    def budget(self):
+        """The profile's search limits, as get_best_move keyword arguments."""
+        return {name: getattr(self, name) for name in BUDGET_FIELDS if getattr(self, name) is not None}
+
+    def replace(self, **changes):
+        """A copy with some fields changed (weights and features are merged)."""
+        fields = self.to_dict()
+        for name in ("weights", "features"):
+            fields[name] = dict(fields[name], **changes.pop(name, {}))
+        fields.update(changes)
+        return EngineConfig(**fields)
+
+    def to_dict(self):
+        return {"name": self.name, "depth": self.depth, "movetime": self.movetime, "nodes": self.nodes,
+                "weights": dict(self.weights), "features": dict(self.features), "skill": self.skill}
+
+    def _cache_key(self):
+        """
+        64-bit value XORed into position keys for the result cache: a hash of
+        the effective weights and the features that change what the search
+        finds, so profiles that search alike share their results and any
+        change of a weight (defaults included) gets new entries.
+        """
+        searched = {"weights": self.weights, "features": {name: self.features[name] for name in SEARCH_FEATURES}}
+        digest = hashlib.sha1(json.dumps(searched, sort_keys=True).encode()).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def __eq__(self, other):
+        return isinstance(other, EngineConfig) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"EngineConfig({self.name!r}, depth={self.depth}, movetime={self.movetime}, skill={self.skill})"
+
+
+# Built-in profiles by name, as EngineConfig keyword arguments
+PROFILES = {
+    # One ply, no quiescence and frequent slips: instant replies for beginners
+    "beginner": {"depth": 1, "skill": 2, "weights": {"mobility": 0},
+                 "features": {"quiescence": False}},
+    # Shallow search without the costly mobility term
+    "casual": {"depth": 2, "skill": 10, "weights": {"mobility": 0}},
+    "default": {},
+    # Deepens for up to three seconds
+    "strong": {"depth": None, "movetime": 3000},
+}
+
+DEFAULT_PROFILE = os.environ.get("ENGINE_PROFILE", "default")
+
+_profiles = None
+_profiles_mtime = None
+_profiles_lock = threading.Lock()
+
+
+def _load_profiles():
+    """Built-in profiles merged with the ENGINE_PROFILES_PATH file, re-read when it changes."""
+    global _profiles, _profiles_mtime
+    path = os.environ.get("ENGINE_PROFILES_PATH")
+    try:
+        mtime = os.stat(path).st_mtime if path else None
+    except OSError:
+        mtime = None
+    with _profiles_lock:
+        if _profiles is None or mtime != _profiles_mtime:
+            if _profiles is None:
+                _profiles = _build_profiles({})
+            try:
+                custom = {}
+                if mtime is not None:
+                    with open(path) as f:
+                        custom = json.load(f)
+                _profiles = _build_profiles(custom)
+            except (OSError, TypeError, ValueError) as error:  # json.JSONDecodeError is a ValueError
+                logger.warning("Ignoring engine profiles in %s: %s", path, error)
+            _profiles_mtime = mtime
+        return _profiles
+
+
+def _build_profiles(custom):
+    """EngineConfigs of the built-in profiles merged with custom ({name: fields})."""
+    if not isinstance(custom, dict):
+        raise TypeError("profiles must be a JSON object")
+    fields = {name: dict(profile) for name, profile in PROFILES.items()}
+    for name, profile in custom.items():
+        fields[name] = dict(fields.get(name, {}), **profile)
+    return {name: EngineConfig(name=name, **profile) for name, profile in fields.items()}
+
+
+def get_profile(name=None):
+    """The named profile (DEFAULT_PROFILE if None). Raises KeyError for unknown names."""
+    profiles = _load_profiles()
+    name = name or DEFAULT_PROFILE
+    if name not in profiles:
+        raise KeyError(name)
+    return profiles[name]
+
+
+def profile_names():
+    return sorted(_load_profiles())
+
+
+DEFAULT_CONFIG = EngineConfig(name="default")
@@ -0,0 +1,152 @@
+"""
+Background jobs for AI moves.
+
+POST /ai_move starts a Job and returns its id at once; the search runs on a
+job thread and publishes its progress (one event per finished iteration)
+followed by a final "done" or "failed" event. Clients poll GET /jobs/<id> or
+follow the events as a Server-Sent Events stream.
+
+Jobs live in the process that accepted them, so polling has to reach the
+same worker; the move itself is saved to the game, which every worker sees.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class JobNotFound(KeyError):
+    """No job with this id (never created, or already expired)."""
+
+
+class JobLimitReached(Exception):
+    """Too many jobs are running; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many running jobs, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    """A background task with an append-only list of events."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"  # queued, running, done, failed
+        self.events = []  # {"id": n, "event": type, "data": ...}, ids start at 1
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._condition = threading.Condition()
+
+    def publish(self, event, data):
+        """Appends an event and wakes up anyone waiting for it."""
+        with self._condition:
+            if self.finished is not None:
+                return  # Late progress after the final event
+            self.events.append({"id": len(self.events) + 1, "event": event, "data": data})
+            self._condition.notify_all()
+
+    def finish(self, status, result=None, error=None):
+        with self._condition:
+            if self.finished is not None:
+                return
+            self.status = status
+            self.result = result
+            self.error = error
+            data = result if status == "done" else {"error": error}
+            self.events.append({"id": len(self.events) + 1, "event": status, "data": data})
+            self.finished = time.time()
+            self._condition.notify_all()
+
+    def cancel(self):
+        """Asks the job to stop; a search then finishes with its best move so far."""
+        self.cancel_event.set()
+
+    def wait_events(self, after, timeout):
+        """
+        Returns the events after the first `after` ones, waiting up to timeout
+        seconds for new ones (empty list if none arrived).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > after or self.finished is not None,
+                                     timeout)
+            return self.events[after:]
+
+    def snapshot(self):
+        """Status, latest progress and result, for polling clients."""
+        with self._condition:
+            progress = [event["data"] for event in self.events if event["event"] == "progress"]
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "progress": progress[-1] if progress else None,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """Runs jobs on daemon threads, at most max_active at a time; finished jobs expire after ttl seconds."""
+
+    def __init__(self, max_active=8, ttl=600):
+        self.max_active = max_active
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, target):
+        """
+        Starts target(job) on a new thread and returns the job. Whatever
+        target returns becomes the result; an exception fails the job.
+        Raises JobLimitReached when max_active jobs are already running.
+        """
+        job = Job()
+        with self._lock:
+            self._expire()
+            if self._active >= self.max_active:
+                raise JobLimitReached(retry_after=1)
+            self._active += 1
+            self._jobs[job.id] = job
+        threading.Thread(target=self._run, args=(job, target), name=f"job-{job.id[:8]}",
+                         daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    def active(self):
+        with self._lock:
+            return self._active
+
+    def _run(self, job, target):
+        job.status = "running"
+        try:
+            job.finish("done", result=target(job))
+        except Exception as error:
+            job.finish("failed", error=str(error) or type(error).__name__)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _expire(self):
+        # Caller holds self._lock
+        expired_before = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and job.finished < expired_before]:
+            del self._jobs[job_id]
+
+
+def create_job_manager():
+    """Builds the job manager from JOB_MAX_ACTIVE (default 8) and JOB_TTL (seconds, default 600)."""
+    return JobManager(max_active=int(os.environ.get("JOB_MAX_ACTIVE", 8)),
+                      ttl=float(os.environ.get("JOB_TTL", 600)))
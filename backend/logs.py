@@ -0,0 +1,60 @@
+"""
+Logging setup for the server and its worker processes.
+
+Modules log through logging.getLogger(__name__); configure_logging() sends
+the records to stderr at LOG_LEVEL (default INFO) and rate-limits them: each
+message template may be logged LOG_RATE_LIMIT times per second (default 5,
+bursts up to LOG_RATE_BURST, default 20), and the next record that gets
+through says how many were dropped. Under load this keeps the per-search
+lines from costing more than the searches.
+"""
+import logging
+import os
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per (logger, message template); warnings and errors always pass."""
+
+    def __init__(self, rate=5.0, burst=20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # (logger, template) -> [tokens, last refill, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((record.name, record.msg))
+            if bucket is None:
+                bucket = self._buckets[(record.name, record.msg)] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} similar messages dropped)"
+        return True
+
+
+def configure_logging():
+    """Sets up the root logger from LOG_LEVEL, LOG_RATE_LIMIT and LOG_RATE_BURST (once per process)."""
+    root = logging.getLogger()
+    if any(getattr(handler, "rate_limited", False) for handler in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RateLimitFilter(rate=float(os.environ.get("LOG_RATE_LIMIT", 5)),
+                                      burst=int(os.environ.get("LOG_RATE_BURST", 20))))
+    handler.rate_limited = True
+    root.addHandler(handler)
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
@@ -0,0 +1,117 @@
+"""
+Search metrics in the Prometheus text format.
+
+SearchMetrics adds up the reports (Searcher.report()) of the AI moves this
+process served: totals of nodes, time and the other counters by how the move
+was found (search, book, cache, tablebase, ponder), and histograms of search
+time and depth. The server renders them at GET /metrics together with its
+gauges. Every gunicorn worker keeps its own metrics, so each scrape sees the
+worker that answered it; label the target per worker or scrape them all.
+"""
+import threading
+
+# Histogram bucket bounds: seconds per search and depth reached
+TIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DEPTH_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 24)
+
+# Report fields added up per source: (metric name, help text)
+COUNTERS = {
+    "nodes": ("chess_search_nodes_total", "Nodes searched (without quiescence)"),
+    "qnodes": ("chess_search_qnodes_total", "Quiescence nodes searched"),
+    "beta_cutoffs": ("chess_search_beta_cutoffs_total", "Beta cutoffs in the search"),
+    "researches": ("chess_search_researches_total", "PVS re-searches after failed null windows"),
+    "tt_hits": ("chess_search_tt_hits_total", "Transposition table hits"),
+    "tt_cutoffs": ("chess_search_tt_cutoffs_total", "Transposition table cutoffs"),
+    "tb_hits": ("chess_search_tb_hits_total", "Tablebase hits in the search"),
+    "time": ("chess_search_seconds_total", "Time spent searching"),
+    "movegen_time": ("chess_search_movegen_seconds_total", "Time in move generation (SEARCH_PHASE_TIMING=1)"),
+    "eval_time": ("chess_search_eval_seconds_total", "Time in evaluation (SEARCH_PHASE_TIMING=1)"),
+    "ordering_time": ("chess_search_ordering_seconds_total", "Time in move ordering (SEARCH_PHASE_TIMING=1)"),
+}
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def metric_lines(name, kind, help_text, samples):
+    """Lines of one metric; samples are (labels dict or None, value) pairs."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ""
+        if labels:
+            label_text = "{" + ",".join(f'{key}="{labels[key]}"' for key in labels) + "}"
+        lines.append(f"{name}{label_text} {format_value(value)}")
+    return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, help_text):
+        lines = metric_lines(name, "histogram", help_text, [])
+        cumulative = 0
+        for bound, count in zip(list(self.bounds) + ["+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"{name}_sum {format_value(self.sum)}", f"{name}_count {self.count}"]
+        return lines
+
+
+class SearchMetrics:
+    """Totals and histograms of the AI moves served by this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.moves = {}  # Source -> count
+        self.totals = {}  # Source -> {report field: total}
+        self.search_time = Histogram(TIME_BUCKETS)
+        self.search_depth = Histogram(DEPTH_BUCKETS)
+        self.last = {}  # The last search's report
+
+    def record(self, report):
+        """Adds one move's report (see Searcher.report); only real searches enter the histograms."""
+        source = report.get("source", "search")
+        with self._lock:
+            self.moves[source] = self.moves.get(source, 0) + 1
+            totals = self.totals.setdefault(source, dict.fromkeys(COUNTERS, 0))
+            for field in COUNTERS:
+                totals[field] += report.get(field, 0)
+            if source == "search":
+                self.search_time.observe(report.get("time", 0.0))
+                self.search_depth.observe(report.get("depth", 0))
+                self.last = report
+
+    def lines(self):
+        with self._lock:
+            lines = metric_lines("chess_ai_moves_total", "counter", "AI moves served, by how they were found",
+                                 [({"source": source}, count) for source, count in sorted(self.moves.items())])
+            for field, (name, help_text) in COUNTERS.items():
+                lines += metric_lines(name, "counter", help_text,
+                                      [({"source": source}, totals[field])
+                                       for source, totals in sorted(self.totals.items())])
+            lines += self.search_time.lines("chess_search_duration_seconds", "Time per search")
+            lines += self.search_depth.lines("chess_search_depth", "Depth reached per search")
+            if self.last:
+                lines += metric_lines("chess_search_last_nps", "gauge", "Nodes per second of the last search",
+                                      [(None, self.last.get("nps", 0))])
+                lines += metric_lines("chess_search_last_ebf", "gauge",
+                                      "Effective branching factor of the last search",
+                                      [(None, self.last.get("ebf", 0.0))])
+        return lines
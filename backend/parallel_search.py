@@ -0,0 +1,196 @@
+"""
+Root-split parallel search.
+
+ParallelSearcher is a Searcher whose root move loop runs on several worker
+processes. Each iteration first searches the expected best move (the first
+root move) in this process with a full window; the remaining root moves are
+then handed out one at a time to the workers, which search them with a null
+window around the best score found so far. That score (alpha) lives in
+shared memory, so a worker that finds a better move immediately tightens
+the window of every move started after it.
+
+Each worker keeps its own transposition table and history between moves and
+iterations. With workers=1 no processes are started and the search is
+exactly the serial Searcher, which makes that mode deterministic; with more
+workers the order in which moves finish, and therefore node counts (though
+not the quality of the result), varies from run to run.
+"""
+import ctypes
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+
+from chess_ai import INFINITY, SearchBoard, Searcher, SearchTimeout
+
+
+# ------------------------- WORKER PROCESS -------------------------
+
+# Set in each worker process by _init_worker
+_alpha = None
+_stop = None
+_searcher = None
+_search_id = None
+
+
+class _SharedFlag:
+    """Looks like a threading.Event to the search; backed by shared memory."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def is_set(self):
+        return self.value.value
+
+
+def _init_worker(alpha, stop, tt_size_mb):
+    global _alpha, _stop, _searcher
+    _alpha = alpha
+    _stop = stop
+    _searcher = Searcher(tt_size_mb=tt_size_mb)
+    _searcher.stop_event = _SharedFlag(stop)
+
+
+def search_root_move(search_id, fen, moves, move_uci, depth, repetition_penalty, config):
+    """
+    Scores one root move against the shared alpha with the search's engine
+    config. Runs in a worker process. Returns the score (None if the search
+    was stopped), its PV and node counts.
+    """
+    global _search_id
+    if search_id != _search_id:
+        # First move of a new root search in this worker
+        _search_id = search_id
+        if config.key != _searcher.config.key:
+            _searcher.transposition_table.clear()
+        _searcher.config = config
+        _searcher.new_search()
+
+    board = SearchBoard(fen)
+    for uci in moves:
+        board.push(chess.Move.from_uci(uci))
+    move = chess.Move.from_uci(move_uci)
+
+    _searcher.reset_stats()
+    try:
+        score = _searcher.search_root_move(board, move, depth, _alpha.value, repetition_penalty)
+    except SearchTimeout:
+        score = None
+        pv = []
+    else:
+        with _alpha.get_lock():
+            if score > _alpha.value:
+                _alpha.value = score
+        pv = _searcher.principal_variation(board, move, depth)
+
+    stats = _searcher.stats
+    return {
+        "score": score,
+        "pv": pv,
+        "nodes": stats["nodes"],
+        "qnodes": stats["qnodes"],
+        "beta_cutoffs": stats["beta_cutoffs"],
+        "researches": stats["researches"],
+        "tb_hits": stats["tb_hits"],
+        "movegen_time": stats["movegen_time"],
+        "eval_time": stats["eval_time"],
+        "ordering_time": stats["ordering_time"],
+    }
+
+
+# ------------------------- SEARCHER -------------------------
+
+class ParallelSearcher(Searcher):
+    """
+    Searcher that splits the root moves across worker processes.
+
+    The worker processes are started on the first search and kept until
+    close(). Budgets, stop_event and info_callback work as for Searcher.
+    """
+
+    def __init__(self, workers=2, tt_size_mb=16):
+        super().__init__(tt_size_mb)
+        self.workers = workers
+        self.tt_size_mb = tt_size_mb
+        self._pool = None
+        self._context = multiprocessing.get_context("spawn")
+        self._alpha = None
+        self._stop = None
+        self._search_id = 0
+        self._root_pvs = {}  # PVs of root moves scored by the workers
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._alpha = self._context.Value(ctypes.c_int, -INFINITY)
+            self._stop = self._context.Value(ctypes.c_bool, False)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=self._context, initializer=_init_worker,
+                initargs=(self._alpha, self._stop, self.tt_size_mb))
+            # A process exiting joins its children first, so stop the workers before
+            # that (e.g. when this searcher lives in a search_pool worker). Runs
+            # ahead of the multiprocessing queue finalizers (priority 10).
+            multiprocessing.util.Finalize(self, self.close, exitpriority=20)
+        return self._pool
+
+    def close(self):
+        """Stops the worker processes (they are restarted by the next search)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def search_root(self, board, depth, root_moves, recent_moves):
+        self._root_pvs = {}
+        if self.workers <= 1 or len(root_moves) == 1:
+            return super().search_root(board, depth, root_moves, recent_moves)
+
+        pool = self._get_pool()
+        first = root_moves[0]
+        alpha = self.search_root_move(board, first, depth, -INFINITY,
+                                      recent_moves.count(first.uci()) * 100, full_window=True)
+        move_scores = [(alpha, first)]
+
+        self._search_id += 1
+        self._alpha.value = alpha
+        self._stop.value = False
+        fen = board.root().fen()
+        moves = [move.uci() for move in board.move_stack]
+        futures = {}
+        for move in root_moves[1:]:
+            future = pool.submit(search_root_move, self._search_id, fen, moves, move.uci(), depth,
+                                 recent_moves.count(move.uci()) * 100, self.config)
+            futures[future] = move
+
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.01, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    for name in ("nodes", "qnodes", "beta_cutoffs", "researches", "tb_hits",
+                                 "movegen_time", "eval_time", "ordering_time"):
+                        self.stats[name] += result[name]
+                    if result["score"] is None:
+                        raise SearchTimeout()
+                    move = futures[future]
+                    move_scores.append((result["score"], move))
+                    self._root_pvs[move] = result["pv"]
+                self.check_limits()
+        except BaseException:
+            # Stop the workers before the next search reuses the shared values
+            self._stop.value = True
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            raise
+
+        # Best first; ties keep the previous iteration's order, as in the serial search
+        order = {move: index for index, move in enumerate(root_moves)}
+        move_scores.sort(key=lambda x: (-x[0], order[x[1]]))
+        return move_scores
+
+    def principal_variation(self, board, first_move, max_length):
+        pv = self._root_pvs.get(first_move)
+        if pv:
+            return pv
+        return super().principal_variation(board, first_move, max_length)
@@ -0,0 +1,242 @@
+"""
+Pondering: searching on the player's time.
+
+After the AI moves, a session's Ponderer searches the positions after the
+player's likely replies (the reply from the AI's principal variation first,
+then the best-ordered other moves) in the background, each for at most
+PONDER_MOVETIME_MS. Once the player has moved, only the search of the
+position they chose carries on, and the next AI search takes it over:
+
+- with a depth budget the pondered move is played if its search got at
+  least that deep;
+- with a time budget the ponder search keeps running until it has used the
+  requested movetime (counted from when it started) and its move is played;
+- otherwise the AI searches as usual, which without a search pool starts
+  from the transposition table the ponder search has just filled.
+
+Pondered results only count for searches with the engine profile they were
+pondered with.
+
+New games and expired sessions stop the pondering too.
+
+Without a search pool the ponder searches run one after another on a thread
+with the game's own Searcher; with one they run as pool jobs, started only
+on workers that are idle. A ponder job can hold its worker for up to
+PONDER_MOVETIME_MS, so before a real search goes to the pool the server
+calls make_room, which stops ponder jobs of this process (oldest first)
+until a worker is free for it; pondering never delays a move.
+
+Off unless PONDER=1; PONDER_REPLIES (default 1) sets how many replies.
+"""
+import os
+import threading
+import time
+from concurrent.futures import wait
+
+import chess
+
+import chess_ai
+from search_pool import PoolSaturated
+
+PONDER_ENABLED = os.environ.get("PONDER", "0") == "1"
+PONDER_MOVETIME_MS = int(os.environ.get("PONDER_MOVETIME_MS", 5000))
+PONDER_REPLIES = int(os.environ.get("PONDER_REPLIES", 1))
+
+# Seconds a ponder search may fall short of the requested movetime and still count
+PONDER_TIME_SLACK_S = 0.05
+
+# Counters for this process
+stats = {"started": 0, "hits": 0, "misses": 0, "preempted": 0}
+
+# Ponder searches running as pool jobs in this process, oldest first
+_pool_searches = []
+_pool_lock = threading.Lock()
+
+
+def likely_replies(board, pv, count):
+    """The player's count most likely replies: the PV's reply, then by move ordering."""
+    replies = []
+    if len(pv) > 1:
+        reply = chess.Move.from_uci(pv[1])
+        if board.is_legal(reply):
+            replies.append(reply)
+    for move in chess_ai.order_moves(board):
+        if len(replies) >= count:
+            break
+        if move not in replies:
+            replies.append(move)
+    return replies[:count]
+
+
+class PonderSearch:
+    """The search of one position the player may reach."""
+
+    def __init__(self, board):
+        self.board = board
+        self.stop_event = threading.Event()
+        self.job = None  # SearchJob when pondering in the pool
+        self.started = None
+        self.finished = None
+        self.result = None  # {"move", "depth", "score", "pv"} once it returned
+
+    def stop(self):
+        self.stop_event.set()
+        if self.job is not None:
+            self.job.cancel()
+
+    def searched_for(self):
+        """Seconds it has searched so far."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class Ponderer:
+    """Background searches of one game's likely next positions."""
+
+    def __init__(self, session, executor=None, movetime_ms=PONDER_MOVETIME_MS, replies=PONDER_REPLIES):
+        self.session = session
+        self.executor = executor
+        self.movetime_ms = movetime_ms
+        self.replies = replies
+        self._searches = {}  # Position key -> PonderSearch
+        self._thread = None
+        self.config = None  # Engine config of the current ponder searches
+
+    def start(self, pv, config=None):
+        """
+        Starts pondering the session's position (the player to move) given the
+        AI's PV, searching with config (an engine_config.EngineConfig).
+        """
+        self.stop()
+        self.config = config
+        board = self.session.board
+        if board.is_game_over():
+            return
+        for reply in likely_replies(board, pv, self.replies):
+            child = board.copy()
+            child.push(reply)
+            if not child.is_game_over():
+                self._searches[chess_ai.position_key(child)] = PonderSearch(child)
+        if not self._searches:
+            return
+        stats["started"] += 1
+        move_history = list(self.session.move_history)
+
+        if self.executor is None:
+            self._thread = threading.Thread(target=self._run, args=(list(self._searches.values()), move_history),
+                                            name=f"ponder-{self.session.game_id[:8]}", daemon=True)
+            self._thread.start()
+            return
+
+        for key, search in list(self._searches.items()):
+            if self.executor.metrics()["in_flight"] >= self.executor.workers:
+                del self._searches[key]  # Only idle workers ponder
+                continue
+            try:
+                search.job = self.executor.submit(search.board.root().fen(),
+                                                  [move.uci() for move in search.board.move_stack],
+                                                  move_history, {"movetime": self.movetime_ms, "config": config})
+            except PoolSaturated:
+                del self._searches[key]
+                continue
+            search.started = time.time()
+            search.job.future.add_done_callback(lambda future, search=search: self._job_done(search, future))
+            with _pool_lock:
+                _pool_searches.append(search)
+
+    def _run(self, searches, move_history):
+        # Ponder thread: one position after the other with the game's searcher
+        searcher = self.session.searcher
+        for search in searches:
+            if search.stop_event.is_set():
+                continue
+            search.started = time.time()
+            move = chess_ai.get_best_move(search.board, movetime=self.movetime_ms, searcher=searcher,
+                                          move_history=move_history, stop_event=search.stop_event,
+                                          config=self.config)
+            search.finished = time.time()
+            if move is not None:
+                search.result = {"move": move.uci(), "depth": searcher.stats["depth"],
+                                 "score": searcher.stats["score"], "pv": list(searcher.stats["pv"])}
+
+    @staticmethod
+    def _job_done(search, future):
+        with _pool_lock:
+            if search in _pool_searches:
+                _pool_searches.remove(search)
+        search.finished = time.time()
+        if not future.cancelled() and future.exception() is None:
+            search.result = future.result()
+
+    def keep(self, board):
+        """The player has moved to board: stops pondering every other position."""
+        key = chess_ai.position_key(board)
+        for other in [other for other in self._searches if other != key]:
+            self._searches.pop(other).stop()
+
+    def take(self, board, budget):
+        """
+        Ends pondering. Returns the pondered result for board if it satisfies
+        budget (see the module docstring), else None.
+        """
+        self.keep(board)
+        search = self._searches.pop(chess_ai.position_key(board), None)
+        if search is not None and "depth" not in budget and search.started is not None:
+            # Let it search on for the rest of the requested time
+            remaining = budget["movetime"] / 1000 - search.searched_for()
+            if remaining > 0:
+                if search.job is not None:
+                    wait([search.job.future], timeout=remaining)
+                elif self._thread is not None:
+                    self._thread.join(remaining)
+        if search is not None:
+            search.stop()
+            if search.job is not None:
+                wait([search.job.future])
+        self.stop()
+
+        result = search.result if search is not None else None
+        if result is None or result["move"] is None or budget.get("config") != self.config:
+            hit = False
+        elif "depth" in budget:
+            hit = result["depth"] >= budget["depth"]
+        else:
+            hit = search.searched_for() >= budget["movetime"] / 1000 - PONDER_TIME_SLACK_S
+        stats["hits" if hit else "misses"] += 1
+        return result if hit else None
+
+    def stop(self):
+        """Stops every ponder search (their results are dropped)."""
+        for search in self._searches.values():
+            search.stop()
+        self._searches.clear()
+        if self._thread is not None:
+            # Every search of the thread is stopped, so this returns right away
+            self._thread.join()
+            self._thread = None
+
+
+def make_room(executor):
+    """
+    Stops ponder jobs, oldest first, until one of the executor's workers is
+    free for a real search. Returns how many were stopped.
+    """
+    with _pool_lock:
+        running = [search for search in _pool_searches if not search.stop_event.is_set()]
+        stopping = len(_pool_searches) - len(running)  # Stopped, their workers about to be free
+    needed = executor.metrics()["in_flight"] - stopping - executor.workers + 1
+    stopped = running[:max(0, needed)]
+    for search in stopped:
+        search.stop()
+    stats["preempted"] += len(stopped)
+    return len(stopped)
+
+
+def get_ponderer(session, executor=None):
+    """The session's Ponderer, created on first use; None unless PONDER=1."""
+    if not PONDER_ENABLED:
+        return None
+    if session.ponderer is None:
+        session.ponderer = Ponderer(session, executor)
+    return session.ponderer
@@ -0,0 +1,192 @@
+"""
+Search result cache shared across games and workers.
+
+Stores the outcome of get_best_move (move, score, PV and the depth it was
+searched to) by Zobrist key, so a position that another game or another
+worker has already searched costs a lookup instead of a search. A result
+answers any request for the same or a smaller depth.
+
+There are two tiers: an in-process LRU, and optionally a SQLite file
+(RESULT_CACHE_PATH) shared by every worker process, trimmed to
+RESULT_CACHE_MAX_MB by dropping the least recently used rows. Entries are
+tagged with engine_version(), a hash of the engine sources (chess_ai.py,
+engine_config.py with the default evaluation weights and profiles, book.py
+and tablebase.py) and of the book and tablebase settings, so changing any
+of them invalidates the cache. Within a version, get_best_move keys results
+by the profile's effective weights and search features as well (see
+EngineConfig.key), so profiles loaded from ENGINE_PROFILES_PATH get their
+own entries.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import book
+import chess_ai
+import engine_config
+import tablebase
+
+# Check the database size every this many stores
+TRIM_INTERVAL = 100
+
+_cache = None
+_created = False
+
+
+# Modules whose source decides what a search finds
+ENGINE_MODULES = (chess_ai, engine_config, book, tablebase)
+
+# Settings that change the search results (tablebases) or the engine's moves (book)
+ENGINE_SETTINGS = ("SYZYGY_PATH", "CHESS_BOOK_PATH")
+
+
+def engine_version():
+    """Short hash of the engine sources and settings: changes whenever the engine or its weights do."""
+    digest = hashlib.sha1()
+    for module in ENGINE_MODULES:
+        with open(module.__file__, "rb") as source:
+            digest.update(source.read())
+    for name in ENGINE_SETTINGS:
+        digest.update(f"{name}={os.environ.get(name, '')}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def _signed(key):
+    """Zobrist keys are unsigned 64-bit; SQLite integers are signed."""
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class ResultCache:
+    """LRU of search results by (Zobrist key, engine version), optionally backed by SQLite."""
+
+    def __init__(self, max_entries=10000, path=None, max_bytes=64 << 20, version=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version or engine_version()
+        self._lru = OrderedDict()  # key -> (depth, move, score, pv)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stores = 0
+        self.counters = {"hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+        if path:
+            with self._connect() as db:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS results (
+                        key INTEGER NOT NULL,
+                        version TEXT NOT NULL,
+                        depth INTEGER NOT NULL,
+                        move TEXT NOT NULL,
+                        score INTEGER NOT NULL,
+                        pv TEXT NOT NULL,
+                        used REAL NOT NULL,
+                        PRIMARY KEY (key, version)
+                    )""")
+                db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+                # Results of other engine versions can never be used again
+                db.execute("DELETE FROM results WHERE version != ?", (self.version,))
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, key, depth):
+        """The result for key searched to at least depth as a dict, or None."""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and entry[0] >= depth:
+                self._lru.move_to_end(key)
+                self.counters["hits"] += 1
+                return self._result(entry)
+        if self.path:
+            with self._connect() as db:
+                row = db.execute("SELECT depth, move, score, pv FROM results WHERE key = ? AND version = ?",
+                                 (_signed(key), self.version)).fetchone()
+                if row is not None and row[0] >= depth:
+                    db.execute("UPDATE results SET used = ? WHERE key = ? AND version = ?",
+                               (time.time(), _signed(key), self.version))
+                    entry = (row[0], row[1], row[2], row[3])
+                    with self._lock:
+                        self._remember(key, entry)
+                        self.counters["db_hits"] += 1
+                    return self._result(entry)
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key, depth, move, score, pv):
+        """Stores a result unless a deeper one is already known."""
+        entry = (depth, move, score, " ".join(pv))
+        with self._lock:
+            known = self._lru.get(key)
+            if known is not None and known[0] > depth:
+                return
+            self._remember(key, entry)
+            self.counters["stores"] += 1
+            self._stores += 1
+            trim = self._stores % TRIM_INTERVAL == 0
+        if self.path:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key, version) DO UPDATE SET depth = excluded.depth, move = excluded.move, "
+                    "score = excluded.score, pv = excluded.pv, used = excluded.used "
+                    "WHERE excluded.depth >= results.depth",
+                    (_signed(key), self.version, *entry, time.time()))
+                if trim:
+                    self._trim(db)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._lru))
+
+    def _remember(self, key, entry):
+        # Caller holds self._lock
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _trim(self, db):
+        """Drops the least recently used tenth of the rows while the file is too big."""
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        pages = db.execute("PRAGMA page_count").fetchone()[0] - db.execute("PRAGMA freelist_count").fetchone()[0]
+        if pages * page_size <= self.max_bytes:
+            return
+        rows = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        db.execute("DELETE FROM results WHERE rowid IN "
+                   "(SELECT rowid FROM results ORDER BY used LIMIT ?)", (max(1, rows // 10),))
+
+    @staticmethod
+    def _result(entry):
+        depth, move, score, pv = entry
+        return {"depth": depth, "move": move, "score": score, "pv": pv.split()}
+
+
+def create_result_cache():
+    """
+    Builds the cache from RESULT_CACHE_SIZE (LRU entries, default 10000; 0
+    turns caching off), RESULT_CACHE_PATH (SQLite file shared by the workers;
+    unset for the LRU only) and RESULT_CACHE_MAX_MB (default 64).
+    """
+    max_entries = int(os.environ.get("RESULT_CACHE_SIZE", 10000))
+    if max_entries <= 0:
+        return None
+    return ResultCache(max_entries=max_entries, path=os.environ.get("RESULT_CACHE_PATH") or None,
+                       max_bytes=int(float(os.environ.get("RESULT_CACHE_MAX_MB", 64)) * (1 << 20)))
+
+
+def get_result_cache():
+    """This process's cache (see create_result_cache), created on first use; None when off."""
+    global _cache, _created
+    if not _created:
+        _created = True
+        _cache = create_result_cache()
+    return _cache
@@ -0,0 +1,357 @@
+"""
+Runs AI searches in a pool of worker processes.
+
+The search is pure Python and holds the GIL, so running it on a Flask request
+thread stalls every other route served by the same worker. SearchExecutor
+hands searches to a ProcessPoolExecutor instead. Callers send the game as a
+FEN plus the moves played since (so repetitions are still seen) and get the
+result back, plus per-iteration progress if they ask for it. The executor
+bounds how many jobs may be queued, gives each job a timeout after which its
+search is told to stop, and keeps queue and wait time metrics.
+"""
+import ctypes
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from queue import Empty, SimpleQueue
+
+import chess
+
+
+# Longest wait for the last progress reports of a finished job
+PROGRESS_DRAIN_TIMEOUT = 1.0
+
+
+class PoolSaturated(Exception):
+    """Every worker is busy and the queue is full; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Search pool saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SearchJobTimeout(Exception):
+    """The job did not finish within its timeout (its search has been told to stop)."""
+
+
+# ------------------------- WORKER PROCESS -------------------------
+
+# Set in each worker process by _init_worker
+_cancel_flags = None
+_progress_queue = None
+_searcher = None
+
+
+class _CancelFlag:
+    """
+    Looks like a threading.Event to the search; backed by shared memory that
+    holds, per slot, the token of the job to stop.
+    """
+
+    def __init__(self, flags, slot, token):
+        self.flags = flags
+        self.slot = slot
+        self.token = token
+
+    def is_set(self):
+        return self.flags[self.slot] == self.token
+
+
+def _init_worker(cancel_flags, progress_queue, threads=1):
+    global _cancel_flags, _progress_queue, _searcher
+    import chess_ai
+    import logs
+    logs.configure_logging()
+    from parallel_search import ParallelSearcher
+    _cancel_flags = cancel_flags
+    _progress_queue = progress_queue
+    # One set of search caches per worker process, reused across jobs
+    _searcher = ParallelSearcher(workers=threads) if threads > 1 else chess_ai.Searcher()
+
+
+def run_search(slot, token, fen, moves, move_history, budget, report_progress=False):
+    """
+    Searches the position after playing moves from fen. Runs in a worker
+    process; progress goes back through the shared queue tagged with token.
+    """
+    import chess_ai
+    from result_cache import get_result_cache
+    started = time.time()
+    board = chess.Board(fen)
+    for uci in moves:
+        board.push(chess.Move.from_uci(uci))
+
+    info_callback = None
+    if report_progress:
+        def info_callback(info):
+            _progress_queue.put((token, info))
+
+    try:
+        best_move = chess_ai.get_best_move(board, searcher=_searcher, move_history=move_history,
+                                           stop_event=_CancelFlag(_cancel_flags, slot, token),
+                                           info_callback=info_callback,
+                                           result_cache=get_result_cache(), **budget)
+    finally:
+        if report_progress:
+            # Tells the router this job's progress is complete; queued after its last report
+            _progress_queue.put((token, None))
+    stats = _searcher.stats
+    return {
+        "move": best_move.uci() if best_move else None,
+        "depth": stats["depth"],
+        "score": stats["score"],
+        "pv": list(stats["pv"]),
+        "nodes": stats["nodes"],
+        "qnodes": stats["qnodes"],
+        "tb_hits": stats["tb_hits"],
+        "stats": _searcher.report(),
+        "started": started,
+        "finished": time.time(),
+    }
+
+
+# ------------------------- EXECUTOR -------------------------
+
+class SearchExecutor:
+    """
+    Process pool for searches with a bounded queue.
+
+    At most workers + max_queue jobs are in flight; submitting more raises
+    PoolSaturated so the server can answer 503 with Retry-After instead of
+    piling up requests. The pool itself is started on first use, so it is
+    created in each gunicorn worker after the fork. With threads > 1 each
+    search is itself split across that many processes (see parallel_search).
+    """
+
+    def __init__(self, workers=2, max_queue=4, threads=1):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.threads = threads
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+        # Shared with the workers; created with the pool
+        self._cancel_flags = None
+        self._progress_queue = None
+        self._free_slots = SimpleQueue()
+        for slot in range(workers + max_queue):
+            self._free_slots.put(slot)
+        self._progress_callbacks = {}  # job token -> (on_progress, set once all progress is in)
+        self._next_token = 0
+        self._metrics_lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0,
+                          "cancelled": 0, "failed": 0, "tb_hits": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                if self._cancel_flags is None:
+                    slots = self.workers + self.max_queue
+                    self._cancel_flags = self._context.Array(ctypes.c_longlong, slots, lock=False)
+                    self._progress_queue = self._context.Queue()
+                    threading.Thread(target=self._route_progress, name="search-progress",
+                                     daemon=True).start()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=self._context, initializer=_init_worker,
+                    initargs=(self._cancel_flags, self._progress_queue, self.threads))
+            return self._pool
+
+    def _route_progress(self):
+        # Hands progress reports from the workers to their jobs
+        while True:
+            token, info = self._progress_queue.get()
+            with self._metrics_lock:
+                entry = self._progress_callbacks.get(token)
+                if info is None:
+                    self._progress_callbacks.pop(token, None)
+            if entry is None:
+                continue
+            on_progress, progress_done = entry
+            if info is None:
+                progress_done.set()
+            else:
+                on_progress(info)
+
+    def submit(self, fen, moves=(), move_history=(), budget=None, on_progress=None):
+        """
+        Queues a search and returns a SearchJob. Raises PoolSaturated when
+        the queue is full. on_progress(info) is called (on a helper thread)
+        after every finished iteration of the search.
+        """
+        try:
+            slot = self._free_slots.get_nowait()
+        except Empty:
+            with self._metrics_lock:
+                self._counters["rejected"] += 1
+            raise PoolSaturated(self.retry_after())
+
+        submitted = time.time()
+        progress_done = threading.Event()
+        with self._metrics_lock:
+            self._next_token += 1
+            token = self._next_token
+            if on_progress is not None:
+                self._progress_callbacks[token] = (on_progress, progress_done)
+            else:
+                progress_done.set()
+        args = (run_search, slot, token, fen, list(moves), list(move_history), dict(budget or {}),
+                on_progress is not None)
+        try:
+            try:
+                pool = self._get_pool()
+                self._cancel_flags[slot] = 0
+                future = pool.submit(*args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool once
+                self.shutdown()
+                future = self._get_pool().submit(*args)
+        except Exception:
+            with self._metrics_lock:
+                self._progress_callbacks.pop(token, None)
+            self._free_slots.put(slot)
+            raise
+        job = SearchJob(self, slot, token, future, submitted, progress_done)
+        with self._metrics_lock:
+            self._in_flight += 1
+            self._counters["submitted"] += 1
+        future.add_done_callback(job._finished)
+        return job
+
+    def search(self, board, move_history=(), budget=None, timeout=None, on_progress=None,
+               stop_event=None):
+        """
+        Searches board in the pool and waits for the result dict (see
+        run_search). Setting stop_event stops the search early.
+        """
+        moves = [move.uci() for move in board.move_stack]
+        job = self.submit(board.root().fen(), moves, move_history, budget, on_progress)
+        if stop_event is None:
+            return job.result(timeout)
+
+        deadline = time.time() + timeout if timeout is not None else None
+        while not job.done() and not stop_event.is_set():
+            if deadline is not None and time.time() >= deadline:
+                break
+            wait([job.future], timeout=0.1)
+        if stop_event.is_set():
+            job.cancel()  # A running search still returns its best move so far
+        remaining = max(0.0, deadline - time.time()) if deadline is not None else None
+        return job.result(remaining)
+
+    def retry_after(self):
+        """Rough seconds until a slot frees up: average run time times queued jobs per worker."""
+        with self._metrics_lock:
+            completed = self._counters["completed"]
+            average_run = self._run_total / completed if completed else 1.0
+            queued_per_worker = self._in_flight / max(1, self.workers)
+        return max(1, int(average_run * queued_per_worker + 0.999))
+
+    def metrics(self):
+        with self._metrics_lock:
+            completed = self._counters["completed"]
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "threads": self.threads,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                **self._counters,
+                "wait_time_avg": self._wait_total / completed if completed else 0.0,
+                "wait_time_max": self._wait_max,
+                "run_time_avg": self._run_total / completed if completed else 0.0,
+            }
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _record(self, job, result=None, outcome="completed"):
+        with self._metrics_lock:
+            if outcome != "completed":
+                # The worker may never send the end of its progress
+                self._progress_callbacks.pop(job.token, None)
+                job.progress_done.set()
+            self._in_flight -= 1
+            self._counters[outcome] += 1
+            if result is not None:
+                wait = max(0.0, result["started"] - job.submitted)
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._run_total += result["finished"] - result["started"]
+                self._counters["tb_hits"] += result["tb_hits"]
+        self._free_slots.put(job.slot)
+
+
+class SearchJob:
+    """A queued or running search."""
+
+    def __init__(self, executor, slot, token, future, submitted, progress_done):
+        self.executor = executor
+        self.slot = slot
+        self.token = token
+        self.future = future
+        self.submitted = submitted
+        self.progress_done = progress_done  # Set once every progress report was handed on
+
+    def cancel(self):
+        """
+        Drops the job if it is still queued, otherwise stops its search at the
+        next node. Does nothing once it is done: its slot may have gone to
+        another job, which only stops for a flag with its own token.
+        """
+        if self.future.done():
+            return
+        if not self.future.cancel():
+            self.executor._cancel_flags[self.slot] = self.token
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """
+        Waits for the result; on timeout the job is cancelled and SearchJobTimeout
+        raised. Progress callbacks have all run by the time it returns.
+        """
+        try:
+            result = self.future.result(timeout)
+            # Progress travels on its own queue and may still be on the way
+            self.progress_done.wait(PROGRESS_DRAIN_TIMEOUT)
+            return result
+        except FutureTimeoutError:
+            self.cancel()
+            with self.executor._metrics_lock:
+                self.executor._counters["timeouts"] += 1
+            raise SearchJobTimeout()
+
+    def _finished(self, future):
+        # Runs once the future is done, however that happened; frees the slot
+        if future.cancelled():
+            self.executor._record(self, outcome="cancelled")
+        elif future.exception() is not None:
+            self.executor._record(self, outcome="failed")
+        else:
+            self.executor._record(self, future.result())
+
+
+def create_search_executor():
+    """
+    Builds the executor from the environment, or returns None when
+    SEARCH_WORKERS is 0 (search on the request thread).
+    SEARCH_WORKERS defaults to 2, SEARCH_QUEUE (extra queued jobs) to 4 and
+    SEARCH_THREADS (processes per search) to 1.
+    """
+    workers = int(os.environ.get("SEARCH_WORKERS", 2))
+    if workers <= 0:
+        return None
+    return SearchExecutor(workers=workers, max_queue=int(os.environ.get("SEARCH_QUEUE", 4)),
+                          threads=int(os.environ.get("SEARCH_THREADS", 1)))
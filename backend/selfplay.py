@@ -0,0 +1,353 @@
+"""
+Self-play matches between two engine versions.
+
+Plays engine A against engine B (each a backend directory, e.g. one checked
+out from an older commit, with its own search budget and profile) from
+every position of an opening suite, once with each color, in a pool of
+worker processes:
+
+    git worktree add /tmp/old <old-commit>
+    python selfplay.py --engine-b /tmp/old/backend --tc movetime=200 --games 200 --pgn match.pgn
+    python selfplay.py --tc-a nodes=20000 --tc-b nodes=10000 --sprt 0,10
+    python selfplay.py --profile-a casual --profile-b default --games 40
+
+Each engine is imported from its own directory together with the backend
+modules it imports (book, tablebase, engine_config...), so an old engine
+plays with its own evaluation and settings. get_best_move only gets the
+arguments its version accepts: engines from before the searcher, history
+or book switches lose those, and --profile needs engine_config. The budget
+given with --tc must be one the engine knows; with a profile and no --tc
+the profile's own budget is used.
+
+Games are written as PGN as soon as they finish (to stdout, or --pgn) and
+the running score, Elo difference (A minus B, with its 95% error margin)
+and, with --sprt, the sequential probability ratio test are reported after
+each game. The SPRT tests elo0 against elo1 (A's Elo advantage) with the
+trinomial approximation used by common testing frameworks and stops the
+match once the log-likelihood ratio crosses either bound. Games run fully
+offline and without the opening book (the suite provides the variety);
+games longer than --max-plies are adjudicated drawn.
+"""
+import argparse
+import contextlib
+import importlib
+import inspect
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.pgn
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OPENINGS = os.path.join(BASE_DIR, "openings.epd")
+DEFAULT_BUDGET = "movetime=100"
+
+# (chess_ai, engine_config or None) loaded in this (worker) process, by backend directory
+_engines = {}
+
+
+def backend_dir(path):
+    """The backend directory of path, which may also name the chess_ai.py in it."""
+    path = os.path.abspath(path)
+    return os.path.dirname(path) if os.path.isfile(path) else path
+
+
+def _import_from(directory, name):
+    """Imports module name from directory; None if it has no such module."""
+    if not os.path.exists(os.path.join(directory, name + ".py")):
+        return None
+    return importlib.import_module(name)
+
+
+def load_engine(path):
+    """
+    Imports chess_ai (and engine_config, if it has one) from the backend
+    directory path, once per process. The backend modules they import come
+    from the same directory and are then dropped from sys.modules, so the
+    next directory loaded gets its own copies.
+    """
+    directory = backend_dir(path)
+    if directory not in _engines:
+        if not os.path.exists(os.path.join(directory, "chess_ai.py")):
+            raise ValueError(f"No chess_ai.py in {directory}")
+        before = set(sys.modules)
+        sys.path.insert(0, directory)
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                _engines[directory] = (_import_from(directory, "chess_ai"), _import_from(directory, "engine_config"))
+        finally:
+            sys.path.remove(directory)
+            for name in set(sys.modules) - before:
+                module_file = getattr(sys.modules[name], "__file__", None)
+                if module_file and os.path.dirname(os.path.abspath(module_file)) == directory:
+                    del sys.modules[name]
+    return _engines[directory]
+
+
+def engine_arguments(path, budget, profile):
+    """
+    get_best_move keyword arguments for one move of the engine at path: the
+    budget, plus a searcher, move history, book switch and profile for the
+    versions that take them. Raises ValueError for a budget or profile the
+    engine doesn't support.
+    """
+    engine, engine_config = load_engine(path)
+    accepted = inspect.signature(engine.get_best_move).parameters
+    unknown = set(budget) - set(accepted)
+    if unknown:
+        raise ValueError(f"{backend_dir(path)}: get_best_move takes no {', '.join(sorted(unknown))}")
+    arguments = dict(budget)
+    if profile:
+        if engine_config is None or "config" not in accepted:
+            raise ValueError(f"{backend_dir(path)}: engine has no profiles")
+        arguments["config"] = engine_config.get_profile(profile)
+    # A fresh searcher per game, as for a new game on the server
+    optional = {"searcher": engine.Searcher() if hasattr(engine, "Searcher") else None,
+                "move_history": [], "use_book": False}
+    arguments.update((name, value) for name, value in optional.items() if name in accepted and value is not None)
+    return arguments
+
+
+def parse_budget(text):
+    """ "movetime=100,depth=6" -> {"movetime": 100, "depth": 6} """
+    budget = {}
+    for item in text.split(","):
+        if item.strip():
+            name, value = item.split("=")
+            budget[name.strip()] = int(value)
+    return budget
+
+
+def load_openings(path):
+    """(id, FEN) for every position of an EPD file."""
+    openings = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                board, ops = chess.Board.from_epd(line)
+                openings.append((str(ops.get("id", line_number)), board.fen()))
+    return openings
+
+
+def play_game(game_number, opening_id, fen, white, black, max_plies):
+    """
+    Plays one game in a worker. white and black are (name, backend
+    directory, budget, profile). Returns the game as a dict with its moves
+    (UCI) and result.
+    """
+    board = chess.Board(fen)
+    players = {}
+    for color, (name, path, budget, profile) in ((chess.WHITE, white), (chess.BLACK, black)):
+        players[color] = (load_engine(path)[0], engine_arguments(path, budget, profile))
+
+    termination = "normal"
+    started = time.perf_counter()
+    while not board.is_game_over(claim_draw=True):
+        if len(board.move_stack) >= max_plies:
+            termination = "adjudication"
+            break
+        engine, arguments = players[board.turn]
+        # Older engines print while they search; stdout may be the PGN output
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            move = engine.get_best_move(board.copy(), **arguments)
+        if move is None:
+            break
+        board.push(move)
+        if "move_history" in arguments:
+            arguments["move_history"].append(move.uci())
+            del arguments["move_history"][:-10]
+
+    result = board.result(claim_draw=True) if termination == "normal" else "1/2-1/2"
+    return {
+        "game": game_number,
+        "opening": opening_id,
+        "fen": fen,
+        "white": white[0],
+        "black": black[0],
+        "moves": [move.uci() for move in board.move_stack],
+        "result": result,
+        "termination": termination,
+        "time": time.perf_counter() - started,
+    }
+
+
+def game_pgn(game, event):
+    board = chess.Board(game["fen"])
+    pgn = chess.pgn.Game()
+    pgn.setup(board)
+    pgn.headers.update(Event=event, Site="selfplay", Date=time.strftime("%Y.%m.%d"), Round=str(game["game"]),
+                       White=game["white"], Black=game["black"], Result=game["result"],
+                       Opening=game["opening"], Termination=game["termination"])
+    node = pgn
+    for uci in game["moves"]:
+        node = node.add_variation(chess.Move.from_uci(uci))
+    return str(pgn)
+
+
+# ------------------------- STATISTICS -------------------------
+
+def score_of(game, name):
+    """Points of the player called name in a finished game."""
+    if game["result"] == "1/2-1/2":
+        return 0.5
+    white_won = game["result"] == "1-0"
+    return 1.0 if white_won == (game["white"] == name) else 0.0
+
+
+def elo_difference(score):
+    """Elo difference matching an expected score (0 < score < 1)."""
+    return -400 * math.log10(1 / score - 1) + 0.0  # No -0.0
+
+
+def elo_estimate(wins, draws, losses):
+    """(Elo difference, 95% margin) from a win/draw/loss count; None if not yet defined."""
+    games = wins + draws + losses
+    if not games:
+        return None
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+        return None
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin_score = 1.96 * math.sqrt(variance / games)
+    low = elo_difference(max(1e-6, score - margin_score))
+    high = elo_difference(min(1 - 1e-6, score + margin_score))
+    return elo_difference(score), (high - low) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of elo1 over elo0 (trinomial, normal approximation)."""
+    games = wins + draws + losses
+    if not games or not wins + losses:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    """(lower, upper) LLR bounds: below accepts elo0, above accepts elo1."""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# ------------------------- MATCH -------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play match between two engine versions")
+    parser.add_argument("--engine-a", default=BASE_DIR, help="backend directory of engine A")
+    parser.add_argument("--engine-b", default=BASE_DIR, help="backend directory of engine B")
+    parser.add_argument("--name-a", default="A")
+    parser.add_argument("--name-b", default="B")
+    parser.add_argument("--tc", help=f"search budget per move, e.g. movetime=100 (default {DEFAULT_BUDGET},"
+                                     " or the profile's)")
+    parser.add_argument("--tc-a", help="budget of engine A (default --tc)")
+    parser.add_argument("--tc-b", help="budget of engine B (default --tc)")
+    parser.add_argument("--profile", help="engine profile of both engines")
+    parser.add_argument("--profile-a", help="engine profile of engine A (default --profile)")
+    parser.add_argument("--profile-b", help="engine profile of engine B (default --profile)")
+    parser.add_argument("--openings", default=DEFAULT_OPENINGS, help="EPD opening suite")
+    parser.add_argument("--games", type=int, help="games to play (default: each opening with both colors)")
+    parser.add_argument("--max-plies", type=int, default=200, help="adjudicate a draw after this many plies")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pgn", help="append the games to this file (default: stdout)")
+    parser.add_argument("--sprt", help="elo0,elo1: stop once the SPRT accepts either")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # Engines log through logging; only warnings are worth seeing here. No
+    # result cache, so every move is searched.
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["RESULT_CACHE_SIZE"] = "0"
+    os.environ.setdefault("RENDER", "1")
+
+    players = []
+    for name, path, tc, profile in ((args.name_a, args.engine_a, args.tc_a, args.profile_a),
+                                    (args.name_b, args.engine_b, args.tc_b, args.profile_b)):
+        profile = profile or args.profile
+        budget = parse_budget(tc or args.tc or ("" if profile else DEFAULT_BUDGET))
+        try:
+            engine_arguments(path, budget, profile)  # Fail here rather than in every worker
+        except KeyError as e:
+            parser.error(f"engine {name}: unknown profile {e}")
+        except ValueError as e:
+            parser.error(f"engine {name}: {e}")
+        players.append((name, backend_dir(path), budget, profile))
+    player_a, player_b = players
+    openings = load_openings(args.openings)
+    total_games = args.games or 2 * len(openings)
+    sprt = [float(elo) for elo in args.sprt.split(",")] if args.sprt else None
+    bounds = sprt_bounds(args.alpha, args.beta) if sprt else None
+
+    def game_args(number):
+        # Openings in order; each one twice in a row with colors swapped
+        opening_id, fen = openings[(number // 2) % len(openings)]
+        white, black = (player_a, player_b) if number % 2 == 0 else (player_b, player_a)
+        return number + 1, opening_id, fen, white, black, args.max_plies
+
+    output = open(args.pgn, "a") if args.pgn else sys.stdout
+    event = f"{args.name_a} vs {args.name_b}"
+    wins = draws = losses = 0
+    stopped = None
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        next_game = 0
+        pending = set()
+        while pending or (next_game < total_games and stopped is None):
+            while stopped is None and next_game < total_games and len(pending) < args.workers * 2:
+                pending.add(pool.submit(play_game, *game_args(next_game)))
+                next_game += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                game = future.result()
+                print(game_pgn(game, event) + "\n", file=output, flush=True)
+                points = score_of(game, args.name_a)
+                wins += points == 1.0
+                draws += points == 0.5
+                losses += points == 0.0
+                played = wins + draws + losses
+
+                line = (f"game {game['game']} ({game['opening']}, {game['white']} white): {game['result']}"
+                        f" {game['termination']}, {len(game['moves'])} plies | {args.name_a} +{wins}={draws}-{losses}"
+                        f" ({(wins + draws / 2) / played:.1%})")
+                estimate = elo_estimate(wins, draws, losses)
+                if estimate:
+                    line += f", Elo {estimate[0]:+.1f} +/- {estimate[1]:.1f}"
+                if sprt:
+                    llr = sprt_llr(wins, draws, losses, *sprt)
+                    line += f", LLR {llr:.2f} [{bounds[0]:.2f}, {bounds[1]:.2f}]"
+                    if stopped is None and llr <= bounds[0]:
+                        stopped = f"H0 accepted (elo <= {sprt[0]:g})"
+                    elif stopped is None and llr >= bounds[1]:
+                        stopped = f"H1 accepted (elo >= {sprt[1]:g})"
+                print(line, file=sys.stderr, flush=True)
+            if stopped is not None:
+                for future in pending:
+                    future.cancel()
+                pending = {future for future in pending if not future.cancelled()}
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if output is not sys.stdout:
+            output.close()
+
+    played = wins + draws + losses
+    print(f"\n{args.name_a} vs {args.name_b}: {played} games, +{wins}={draws}-{losses}"
+          f" in {time.perf_counter() - started:.0f}s", file=sys.stderr)
+    estimate = elo_estimate(wins, draws, losses)
+    if estimate:
+        print(f"Elo difference: {estimate[0]:+.1f} +/- {estimate[1]:.1f}", file=sys.stderr)
+    if sprt:
+        print(f"SPRT({sprt[0]:g}, {sprt[1]:g}): {stopped or 'no decision yet'}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
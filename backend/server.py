@@ -1,14 +1,271 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
+import atexit
 import chess
+import io
 import os
+import json
+import logging
+import time
+import analysis
 import chess_ai  # Import AI logic
+import logs
+import tablebase
+from channels import ChannelLimitReached, create_channel_manager
+from engine_config import get_profile, profile_names
+from jobs import JobLimitReached, JobNotFound, create_job_manager
+from metrics import SearchMetrics, metric_lines
+from ponder import get_ponderer, make_room, stats as ponder_stats
+from result_cache import get_result_cache
+from search_pool import PoolSaturated, SearchJobTimeout, create_search_executor
+from sessions import SessionConflict, SessionNotFound, create_session_store
 get_best_move = chess_ai.get_best_move
 is_castling = chess_ai.is_castling
 
+logs.configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__, static_folder="static")
 CORS(app)
 
+# Games by id (SESSION_BACKEND=sqlite shares them between gunicorn workers)
+sessions = create_session_store()
+
+# Worker processes for AI searches (None: search on the request thread)
+search_executor = create_search_executor()
+if search_executor is not None:
+    atexit.register(search_executor.shutdown)
+
+# Worker processes for POST /analyze (started on first use)
+analysis_executor = analysis.create_analysis_executor()
+atexit.register(analysis_executor.shutdown)
+
+# Background AI move jobs (POST /ai_move); they live in this worker process
+jobs = create_job_manager()
+
+# Game event streams (GET /games/<id>/events) held by this worker
+channels = create_channel_manager()
+
+# Statistics of the AI moves served by this worker (GET /metrics)
+move_metrics = SearchMetrics()
+
+# Seconds between keep-alive comments on an idle job or game event stream
+JOB_STREAM_HEARTBEAT_S = 15
+
+# How long a client waits before reconnecting a dropped game stream (SSE "retry")
+CHANNEL_RETRY_MS = 2000
+
+# Seconds between checks of an idle game stream for moves made through another worker
+CHANNEL_SYNC_S = 1
+
+# Extra time a pooled search gets beyond its movetime before the request gives up
+SEARCH_JOB_GRACE_S = 5
+
+# Hard cap on a single AI search so requests finish well inside gunicorn's --timeout
+MAX_MOVETIME_MS = int(os.environ.get("AI_MOVE_MAX_MOVETIME_MS", 60000))
+
+# Query parameters accepted by /ai_move to bound the search (UCI "go" style, times in ms)
+SEARCH_BUDGET_PARAMS = ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc", "movestogo")
+
+
+def parse_search_budget(args):
+    """
+    Reads the search budget and engine profile ("profile") from query
+    parameters. Raises ValueError if one is invalid. search_budget turns the
+    result into get_best_move arguments.
+    """
+    budget = {}
+    for name in SEARCH_BUDGET_PARAMS:
+        value = args.get(name)
+        if value is None:
+            continue
+        budget[name] = int(value)
+        if budget[name] < 0 or (name in ("depth", "movestogo") and budget[name] == 0):
+            raise ValueError(f"Invalid {name}: {value}")
+
+    profile = args.get("profile")
+    if profile:
+        parse_profile(profile)
+        budget["profile"] = profile
+    return budget
+
+def parse_profile(name):
+    """The named engine profile; raises ValueError if there is none."""
+    try:
+        return get_profile(name)
+    except KeyError:
+        raise ValueError(f"Unknown profile: {name}") from None
+
+def search_budget(budget, session=None):
+    """
+    The get_best_move arguments for a parsed budget: the engine config of its
+    profile (else the session's, else the default one), whose depth, movetime
+    and nodes apply when the request set no limit, and the movetime capped.
+    """
+    budget = dict(budget)
+    profile = budget.pop("profile", None)
+    if profile:
+        config = parse_profile(profile)
+    else:
+        config = session.config if session is not None else get_profile()
+    if not any(name in budget for name in ("depth", "movetime", "nodes", "wtime", "btime")):
+        budget.update(config.budget())
+    budget["movetime"] = min(budget.get("movetime", MAX_MOVETIME_MS), MAX_MOVETIME_MS)
+    budget["config"] = config
+    return budget
+
+def request_game_id():
+    """The game id from the JSON body or the query string."""
+    data = request.get_json(silent=True) or {}
+    return data.get("game_id") or request.args.get("game_id")
+
+
+def checkout_game(write=True):
+    """Locks and returns the request's game (see SessionStore.checkout)."""
+    game_id = request_game_id()
+    if not game_id:
+        raise SessionNotFound(game_id)
+    return sessions.checkout(game_id, write=write)
+
+
+def position_version(board):
+    """Version of the game's position: the number of moves played."""
+    return len(board.move_stack)
+
+
+def position_hash(board):
+    """Zobrist hash of the position, as 16 hex digits."""
+    return format(chess_ai.position_key(board), "016x")
+
+
+def board_state(board):
+    """
+    Full game state, sent by /get_board and whenever a client has to resync:
+    the position, whose turn it is and the last move with its flags, so a
+    client that missed the move's own event can still announce it.
+    """
+    state = {
+        "fen": board.fen(),
+        "version": position_version(board),
+        "hash": position_hash(board),
+        "turn": "white" if board.turn == chess.WHITE else "black",
+        "checkmate": board.is_checkmate(),
+        "check": board.is_check(),
+        "last_move": None,
+    }
+    if board.move_stack:
+        previous = board.copy(stack=1)
+        move = previous.pop()
+        state.update(last_move=move.uci(), capture=previous.is_capture(move),
+                     castling=previous.is_castling(move), promotion=move.promotion is not None)
+    return state
+
+
+def move_response(board, fields, delta):
+    """
+    Response to a move: the move's fields plus the new version and hash, and
+    the FEN unless the client follows the game by deltas.
+    """
+    fields.update(version=position_version(board), hash=position_hash(board))
+    if not delta:
+        fields["fen"] = board.fen()
+    return fields
+
+
+def out_of_sync(data, board):
+    """
+    Clients following the game by deltas send the version (and optionally the
+    hash) of the position they are in. Returns a 409 with the full state if
+    that is not the current position, None if it is (or nothing was sent).
+    """
+    if "version" not in data:
+        return None
+    try:
+        in_sync = int(data["version"]) == position_version(board)
+    except (TypeError, ValueError):
+        in_sync = False
+    if in_sync and data.get("hash") is not None:
+        in_sync = data["hash"] == position_hash(board)
+    if in_sync:
+        return None
+    return jsonify({"error": "Out of sync, resync with this state", "resync": board_state(board)}), 409
+
+
+@app.errorhandler(SessionNotFound)
+def unknown_game(error):
+    return jsonify({"error": "Unknown or expired game_id"}), 404
+
+
+@app.errorhandler(SessionConflict)
+def game_conflict(error):
+    return jsonify({"error": "Game was changed by another request, fetch the board again"}), 409
+
+
+@app.errorhandler(PoolSaturated)
+def search_pool_saturated(error):
+    response = jsonify({"error": "Server busy, try again later", "retry_after": error.retry_after})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
+@app.errorhandler(SearchJobTimeout)
+def search_timed_out(error):
+    return jsonify({"error": "AI search timed out"}), 504
+
+
+@app.errorhandler(JobLimitReached)
+def too_many_jobs(error):
+    response = jsonify({"error": "Too many AI moves in progress, try again later",
+                        "retry_after": error.retry_after})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
+@app.errorhandler(JobNotFound)
+def unknown_job(error):
+    return jsonify({"error": "Unknown or expired job_id"}), 404
+
+
+@app.errorhandler(ChannelLimitReached)
+def too_many_streams(error):
+    response = jsonify({"error": "Too many open games on this server, try again later",
+                        "retry_after": error.retry_after})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
+def find_ai_move(session, budget, on_progress=None, stop_event=None):
+    """
+    Searches the session's position, in the process pool when there is one,
+    unless pondering already did. Returns the move (None if there is none)
+    and the search's report (see Searcher.report), which is also added to
+    the metrics. on_progress(info) gets the progress of every finished
+    iteration, and setting stop_event ends the search early with its best
+    move so far.
+    """
+    ponderer = get_ponderer(session, search_executor)
+    result = ponderer.take(session.board, budget) if ponderer is not None else None
+    if result is not None:
+        logger.debug("Ponder hit: %s (depth %d)", result["move"], result["depth"])
+        move = chess.Move.from_uci(result["move"])
+        report = {**result.get("stats", {}), "source": "ponder", "depth": result["depth"],
+                  "score": result["score"], "pv": result["pv"]}
+    elif search_executor is None:
+        move = session.best_move(info_callback=on_progress, stop_event=stop_event, **budget)
+        report = session.searcher.report()
+    else:
+        if ponderer is not None:
+            make_room(search_executor)  # Other games' pondering must not hold up this search
+        timeout = budget["movetime"] / 1000 + SEARCH_JOB_GRACE_S
+        result = search_executor.search(session.board, session.move_history, budget, timeout,
+                                        on_progress=on_progress, stop_event=stop_event)
+        move = chess.Move.from_uci(result["move"]) if result["move"] else None
+        report = result["stats"]
+    if move is not None:
+        move_metrics.record(report)
+    return move, report
+
+
 @app.route("/")
 def home():
     return "Chess AI Backend is Running!"
@@ -16,78 +273,156 @@ def home():
 
 @app.route("/set_color", methods=["POST"])
 def set_color():
-    """Sets the player color and resets the board."""
+    """
+    Sets the player color and starts a new game (reusing game_id if one is
+    given). An optional "profile" sets the game's engine profile.
+    """
     data = request.json
     color = data.get("color")
 
     if color not in ["white", "black"]:
         return jsonify({"error": "Invalid color"}), 400
+    profile = data.get("profile")
+    try:
+        if profile:
+            parse_profile(profile)
+    except ValueError:
+        return jsonify({"error": "Unknown profile"}), 400
 
-    # Use the AI module's function to set color and reset board
-    chess_ai.set_player_color(color)
-    
-    return jsonify({"fen": chess_ai.get_board_fen()})
+    game_id = data.get("game_id")
+    try:
+        if not game_id:
+            raise SessionNotFound(game_id)
+        sessions.get(game_id)
+    except SessionNotFound:
+        game_id = sessions.create().game_id
+
+    with sessions.checkout(game_id) as session:
+        if profile:
+            session.profile = profile
+        session.reset(chess.WHITE if color == "white" else chess.BLACK)
+        play_opening_move(session)
+        state = board_state(session.board)
+        channels.get(game_id).publish("state", state)
+        return jsonify({**state, "game_id": game_id, "profile": session.config.name})
 
 
 # ------------------------- GAME ROUTES -------------------------
 
 @app.route("/new_game", methods=["POST"])
 def new_game():
-    """Resets the chess game."""
-    chess_ai.board = chess.Board()
-    chess_ai.transposition_table.clear()
-    return jsonify({"message": "Game restarted", "fen": chess_ai.board.fen()})
+    """
+    Resets the chess game, or creates one if no game_id is given. An optional
+    "profile" changes the game's engine profile.
+    """
+    profile = (request.get_json(silent=True) or {}).get("profile")
+    try:
+        if profile:
+            parse_profile(profile)
+    except ValueError:
+        return jsonify({"error": "Unknown profile"}), 400
+    game_id = request_game_id() or sessions.create().game_id
+    with sessions.checkout(game_id) as session:
+        if profile:
+            session.profile = profile
+        session.reset(session.player_color)
+        play_opening_move(session)
+        state = board_state(session.board)
+        channels.get(game_id).publish("state", state)
+        return jsonify({"message": "Game restarted", **state, "game_id": game_id,
+                        "profile": session.config.name})
+
+
+def play_opening_move(session):
+    """After a reset: the AI opens the game if the player chose Black (same path as /ai_move)."""
+    if session.board.turn != session.player_color:
+        play_ai_move(session, {})
+
+
+@app.route("/profiles", methods=["GET"])
+def list_profiles():
+    """The engine profiles games and moves can pick, and the default one."""
+    return jsonify({"default": get_profile().name,
+                    "profiles": {name: get_profile(name).to_dict() for name in profile_names()}})
 
 @app.route("/get_board", methods=["GET"])
 def get_board():
-    """Returns the current board state (FEN) and checkmate status."""
-    return jsonify({
-        "fen": chess_ai.get_board_fen(),
-        "checkmate": chess_ai.board.is_checkmate()
-    })
+    """
+    Returns the current board state (FEN, version, hash) and checkmate status.
+    The ETag changes with the position, so polls with If-None-Match get an
+    empty 304 until a move is played.
+    """
+    with checkout_game(write=False) as session:
+        board = session.board
+        etag = f"{position_version(board)}-{board.halfmove_clock}-{position_hash(board)}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify(board_state(board))
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
 
 @app.route("/player_move", methods=["POST"])
 def player_move():
+    """
+    Plays the player's move. Sending the position's "version" (and "hash")
+    switches to deltas: the response carries the move, its flags and the new
+    version and hash instead of the FEN, or a 409 with the full state to
+    resync from if the client was not in the current position.
+    """
     data = request.get_json()
     move_uci = data.get("move")
+    with checkout_game() as session:
+        return (out_of_sync(data, session.board)
+                or jsonify_status(make_player_move(session, move_uci, "version" in data)))
 
-    # Check if this is a promotion move without actually making it
-    if len(move_uci) == 4:  # Basic move without promotion
+
+def keep_pondering(session):
+    """After the player's move: stops pondering the positions they did not go to."""
+    if session.ponderer is not None:
+        session.ponderer.keep(session.board)
+
+
+def jsonify_status(fields_and_status):
+    fields, status = fields_and_status
+    return jsonify(fields), status
+
+
+def make_player_move(session, move_uci, delta=False):
+    """Plays the player's move; returns the response fields and the HTTP status."""
+    board = session.board
+    try:
         move = chess.Move.from_uci(move_uci)
-        if (chess_ai.board.piece_at(move.from_square) and 
-            chess_ai.board.piece_at(move.from_square).piece_type == chess.PAWN and
-            ((move.to_square >= 56 and chess_ai.board.turn == chess.WHITE) or 
-             (move.to_square <= 7 and chess_ai.board.turn == chess.BLACK))):
+    except (TypeError, ValueError):
+        return {"error": "Illegal move"}, 400
+
+    # Check if this is a promotion move without actually making it
+    if move.promotion is None:
+        piece = board.piece_at(move.from_square)
+        if (piece and piece.piece_type == chess.PAWN and piece.color == board.turn
+                and chess.square_rank(move.to_square) in (0, 7)):
             # This is a promotion move, return promotion flag
-            return jsonify({
-                "fen": chess_ai.board.fen(),
-                "promotion": True,
-                "move": move_uci
-            })
-    
+            return move_response(board, {"promotion": True, "move": move_uci}, delta), 200
+
     # For non-promotion moves, proceed normally
-    if move_uci not in [m.uci() for m in chess_ai.board.legal_moves]:
-        return jsonify({"error": "Illegal move"}), 400
+    if not board.is_legal(move):
+        return {"error": "Illegal move"}, 400
 
-    move = chess.Move.from_uci(move_uci)
-    
     #Check if move is a capture or castling
-    is_capture = chess_ai.board.is_capture(move)
-    is_castle = is_castling(chess.Move.from_uci(move_uci))
-    chess_ai.board.push(move)  #Push move to board
-
-    is_checkmate = chess_ai.board.is_checkmate()
-    is_check = chess_ai.board.is_check()
+    is_capture = board.is_capture(move)
+    is_castle = is_castling(move)
+    session.push(move)  #Push move to board
+    keep_pondering(session)
 
-    return jsonify({
-        "fen": chess_ai.board.fen(),
-        "checkmate": is_checkmate,
-        "check": is_check,
-        "capture": is_capture,  
+    return move_response(board, {
+        "checkmate": board.is_checkmate(),
+        "check": board.is_check(),
+        "capture": is_capture,
         "castling": is_castle,
-        "promotion": False,
-        "last_move": move_uci
-    })
+        "promotion": move.promotion is not None,
+        "last_move": move.uci()
+    }, delta), 200
 
 
 @app.route("/promote", methods=["POST"])
@@ -96,69 +431,400 @@ def promote():
     data = request.get_json()
     move_uci = data.get("move")
     promotion_piece = data.get("promotion", "q")
+    with checkout_game() as session:
+        return (out_of_sync(data, session.board)
+                or promote_pawn(session, move_uci, promotion_piece, "version" in data))
+
+
+def promote_pawn(session, move_uci, promotion_piece, delta=False):
+    board = session.board
     
     # Create the full move with promotion
-    full_move_uci = move_uci + promotion_piece
-    
-    if full_move_uci not in [m.uci() for m in chess_ai.board.legal_moves]:
+    try:
+        move = chess.Move.from_uci(move_uci + promotion_piece)
+    except (TypeError, ValueError):
         return jsonify({"error": "Illegal promotion move"}), 400
-    
-    move = chess.Move.from_uci(full_move_uci)
-    chess_ai.board.push(move)
-    
-    is_checkmate = chess_ai.board.is_checkmate()
-    is_check = chess_ai.board.is_check()
-    
-    return jsonify({
-        "fen": chess_ai.board.fen(),
-        "checkmate": is_checkmate,
-        "check": is_check,
+    if move.promotion is None or not board.is_legal(move):
+        return jsonify({"error": "Illegal promotion move"}), 400
+
+    session.push(move)
+    keep_pondering(session)
+
+    return jsonify(move_response(board, {
+        "checkmate": board.is_checkmate(),
+        "check": board.is_check(),
         "promotion": True,
-        "promoted_piece": promotion_piece
-    })
+        "promoted_piece": promotion_piece,
+        "last_move": move.uci()
+    }, delta))
 
 @app.route("/ai_move", methods=["GET"])
 def ai_move():
-    """Handles AI move using Minimax from chess_ai.py."""
-    if chess_ai.board.is_game_over():
-        return jsonify({
+    """
+    Handles AI move using Minimax from chess_ai.py.
+
+    Optional query parameters bound the search: depth, movetime, nodes and the
+    clock (wtime, btime, winc, binc, movestogo), all times in milliseconds.
+    profile picks the engine profile (see GET /profiles) for this move only;
+    without it the game's profile plays, with its own limits if none are given.
+    With version (and hash) the response is a delta, as for /player_move.
+    stats=1 adds the search's statistics (nodes, nps, TT hits, ...) as "stats".
+    """
+    try:
+        budget = parse_search_budget(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid search budget"}), 400
+
+    with checkout_game() as session:
+        return (out_of_sync(request.args, session.board)
+                or jsonify(play_ai_move(session, budget, delta="version" in request.args,
+                                        stats=wants_stats(request.args))))
+
+
+@app.route("/ai_move", methods=["POST"])
+def start_ai_move():
+    """
+    Starts the AI move as a background job and returns 202 with its job_id
+    right away. The budget is read from the JSON body or the query string
+    (same parameters as GET /ai_move). Follow the job with GET /jobs/<id>
+    or the event stream at GET /jobs/<id>/events.
+    """
+    data = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+    try:
+        budget = parse_search_budget(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid search budget"}), 400
+
+    game_id = request_game_id()
+    if not game_id:
+        raise SessionNotFound(game_id)
+    # 404 or 409 now rather than a failed job later
+    resync = out_of_sync(data, sessions.get(game_id).board)
+    if resync:
+        return resync
+    delta = "version" in data
+    stats = wants_stats(data)
+
+    def run(job):
+        # Holds the game for the whole search, so moves sent meanwhile wait for it
+        with sessions.checkout(game_id) as session:
+            return play_ai_move(session, budget,
+                                on_progress=lambda info: job.publish("progress", info),
+                                stop_event=job.cancel_event, delta=delta, stats=stats)
+
+    job = jobs.submit(run)
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "events": f"/jobs/{job.id}/events",
+    }), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Status of an AI move job, its latest progress and (once done) the move."""
+    return jsonify(jobs.get(job_id).snapshot())
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Stops the job's search early; it still plays its best move so far."""
+    job = jobs.get(job_id)
+    job.cancel()
+    return jsonify(job.snapshot())
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job: one "progress" event per finished
+    search iteration, then a final "done" (same fields as GET /ai_move) or
+    "failed" event, after which the stream ends. Reconnecting clients resume
+    after Last-Event-ID (or the `after` query parameter).
+    """
+    job = jobs.get(job_id)
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        return jsonify({"error": "Invalid event id"}), 400
+
+    def stream():
+        seen = after
+        while True:
+            events = job.wait_events(seen, JOB_STREAM_HEARTBEAT_S)
+            if not events:
+                if job.finished is not None:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+            seen = events[-1]["id"]
+            if job.finished is not None and seen >= len(job.events):
+                return
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ------------------------- GAME CHANNEL -------------------------
+
+def sse_event(event, data, event_id=None):
+    """One Server-Sent Event."""
+    message = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{message}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/games/<game_id>/events", methods=["GET"])
+def game_events(game_id):
+    """
+    Server-Sent Events stream of a game (see channels.py):
+
+    - "ack": the player's move was played (same fields as /player_move)
+    - "progress": the engine finished a search iteration
+    - "ai_move": the AI's reply (same fields as GET /ai_move)
+    - "error": the AI reply failed or could not start
+    - "state": the full game state (see board_state), sent when the client
+      connects without the current hash, missed events that are gone, or
+      the game moved on through another worker (channels are per process)
+
+    Reconnecting clients pass Last-Event-ID (sent by EventSource itself) or
+    the hash of the position they show. With delta=1 events carry no FEN.
+    """
+    with sessions.checkout(game_id, write=False) as session:
+        state = board_state(session.board)
+    try:
+        last_event_id = request.headers.get("Last-Event-ID") or request.args.get("after")
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid event id"}), 400
+    client_hash = request.args.get("hash")
+    delta = request.args.get("delta") == "1"
+    channel = channels.open(game_id)
+
+    def stream():
+        yield f"retry: {CHANNEL_RETRY_MS}\n\n"
+        seen = channel.last_id if last_event_id is None else last_event_id
+        sent_hash = client_hash
+        if last_event_id is None and client_hash != state["hash"]:
+            yield sse_event("state", state, seen)
+            sent_hash = state["hash"]
+        last_write = time.time()
+        while True:
+            events = channel.wait_events(seen, CHANNEL_SYNC_S)
+            if events:
+                for event in events:
+                    data = event["data"]
+                    if delta and "fen" in data:
+                        data = {name: value for name, value in data.items() if name != "fen"}
+                    yield sse_event(event["event"], data, event["id"])
+                    sent_hash = data.get("hash", sent_hash)
+                seen = events[-1]["id"]
+                last_write = time.time()
+                continue
+            # Missed events, or a quiet spell: make sure the client still shows the game
+            seen = channel.last_id
+            try:
+                current = board_state(sessions.get(game_id).board)
+            except SessionNotFound:
+                return  # The game expired
+            if events is None or current["hash"] != sent_hash:
+                yield sse_event("state", current, seen)
+                sent_hash = current["hash"]
+                last_write = time.time()
+            elif time.time() - last_write >= JOB_STREAM_HEARTBEAT_S:
+                yield ": keep-alive\n\n"
+                last_write = time.time()
+
+    response = Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(lambda: channels.release(channel))
+    return response
+
+
+@app.route("/games/<game_id>/move", methods=["POST"])
+def game_move(game_id):
+    """
+    Plays the player's move (full UCI, with the promotion piece) on a game
+    followed through /games/<id>/events, then starts the AI's reply, whose
+    progress and move arrive on the stream. Without "move" only the AI
+    moves. The body may carry version/hash (409 with the full state if
+    stale) and the search budget of /ai_move. Returns the ack (202), or the
+    promotion prompt of /player_move (200) when the piece is missing.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        budget = parse_search_budget(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid search budget"}), 400
+    channel = channels.get(game_id)
+    stats = wants_stats(data)
+
+    with sessions.checkout(game_id) as session:
+        resync = out_of_sync(data, session.board)
+        if resync:
+            return resync
+        ack = None
+        if data.get("move"):
+            ack, status = make_player_move(session, data["move"])
+            if status != 200 or "last_move" not in ack:
+                return jsonify(ack), status  # Illegal, or the promotion piece is missing
+            channel.publish("ack", ack)
+        if session.board.is_game_over() or session.board.turn == session.player_color:
+            return jsonify({"ack": ack, "job_id": None}), 202
+
+    def run(job):
+        try:
+            with sessions.checkout(game_id) as session:
+                if session.board.turn == session.player_color:
+                    return None  # Someone else already played the AI's move
+                result = play_ai_move(session, budget,
+                                      on_progress=lambda info: channel.publish("progress", info),
+                                      stop_event=job.cancel_event, stats=stats)
+        except Exception as error:
+            channel.publish("error", {"error": str(error) or type(error).__name__})
+            raise
+        channel.publish("ai_move", result)
+        return result
+
+    try:
+        job = jobs.submit(run)
+    except JobLimitReached as error:
+        channel.publish("error", {"error": "Server busy, send the move again without \"move\"",
+                                  "retry_after": error.retry_after})
+        return jsonify({"ack": ack, "job_id": None, "retry_after": error.retry_after}), 202
+    return jsonify({"ack": ack, "job_id": job.id}), 202
+
+
+def wants_stats(data):
+    """Whether the request asked for the search statistics ("stats": 1 or true)."""
+    return str(data.get("stats", "")).lower() in ("1", "true")
+
+
+def play_ai_move(session, budget, on_progress=None, stop_event=None, delta=False, stats=False):
+    """
+    Searches and plays the AI's move with a budget from parse_search_budget;
+    returns the response fields (without the FEN if delta, with the search's
+    report under "stats" if stats).
+    """
+    budget = search_budget(budget, session)
+    board = session.board
+    if board.is_game_over():
+        return move_response(board, {
             "status": "game over", 
-            "message": chess_ai.board.result(),
-            "fen": chess_ai.board.fen()
-        })
+            "message": board.result()
+        }, delta)
 
     # Get AI move
-    best_move = chess_ai.get_best_move(chess_ai.board)
+    best_move, report = find_ai_move(session, budget, on_progress, stop_event)
     
     if not best_move:
-        return jsonify({
+        return move_response(board, {
             "status": "no move", 
-            "message": "No legal moves available",
-            "fen": chess_ai.board.fen()
-        })
+            "message": "No legal moves available"
+        }, delta)
     
     # Check move properties before making it
-    is_capture = chess_ai.board.is_capture(best_move)
+    is_capture = board.is_capture(best_move)
     is_castle = chess_ai.is_castling(best_move)
     is_promotion = best_move.promotion is not None
     
     # Make the AI move
-    chess_ai.board.push(best_move)
+    session.push(best_move, by_ai=True)
+
+    # Think about the player's reply while they do
+    ponderer = get_ponderer(session, search_executor)
+    if ponderer is not None:
+        ponderer.start(report["pv"], budget["config"])
     
     # Check game state after AI move
-    is_checkmate = chess_ai.board.is_checkmate()
-    is_check = chess_ai.board.is_check()
+    is_checkmate = board.is_checkmate()
+    is_check = board.is_check()
     
-    return jsonify({
+    fields = {
         "status": "success",
         "move": best_move.uci(),
-        "fen": chess_ai.board.fen(),
         "checkmate": is_checkmate,
         "check": is_check,
         "capture": is_capture,
         "castling": is_castle,
         "promotion": is_promotion
-    })
+    }
+    if stats:
+        fields["stats"] = report
+    return move_response(board, fields, delta)
+
+@app.route("/analyze", methods=["POST"])
+def analyze_positions():
+    """
+    Analyses the positions in the request body (FEN or EPD lines, or PGN
+    games) and streams one JSON line per position, in input order, then a
+    summary line with positions/sec (see analysis.py for the fields).
+
+    Query parameters: format (auto, fen, epd, pgn), mode (search or eval)
+    and the search budget of GET /ai_move, applied to every position.
+    """
+    try:
+        budget = search_budget(parse_search_budget(request.args))
+    except ValueError:
+        return jsonify({"error": "Invalid search budget"}), 400
+    input_format = request.args.get("format", "auto")
+    mode = request.args.get("mode", "search")
+    if input_format not in analysis.INPUT_FORMATS or mode not in analysis.ANALYSIS_MODES:
+        return jsonify({"error": "Invalid format or mode"}), 400
+
+    # Read lazily, so the body is never held in memory as a whole
+    positions = analysis.read_positions(io.TextIOWrapper(request.stream, encoding="utf-8"),
+                                        input_format)
+
+    def generate():
+        started = time.perf_counter()
+        count = 0
+        for result in analysis.analyze(positions, analysis_executor, budget, mode=mode):
+            count += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps(analysis.summary(count, started)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/search_metrics", methods=["GET"])
+def search_metrics():
+    """Queue depth, wait times and job counts of the search process pool, and ponder hits."""
+    if search_executor is None:
+        return jsonify({"workers": 0, "ponder": ponder_stats})
+    return jsonify({**search_executor.metrics(), "ponder": ponder_stats})
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    This worker's metrics in the Prometheus text format: AI move and search
+    statistics (see metrics.py), the search pool, caches, pondering, open
+    games and streams.
+    """
+    lines = move_metrics.lines()
+    gauges = {
+        "chess_sessions": ("Games held by this worker", len(sessions)),
+        "chess_game_streams": ("Open game event streams", channels.connections()),
+    }
+    counters = {f"chess_ponder_{name}_total": (f"Ponder {name}", value) for name, value in ponder_stats.items()}
+    counters.update({f"chess_tablebase_{name}_total": (f"Tablebase {name.replace('_', ' ')}", value)
+                     for name, value in tablebase.stats.items()})
+    if search_executor is not None:
+        pool = search_executor.metrics()
+        for name in ("workers", "in_flight", "queue_depth", "wait_time_avg", "run_time_avg"):
+            gauges[f"chess_search_pool_{name}"] = (f"Search pool {name.replace('_', ' ')}", pool[name])
+        for name in ("submitted", "completed", "rejected", "timeouts", "cancelled", "failed"):
+            counters[f"chess_search_pool_{name}_total"] = (f"Search pool jobs {name}", pool[name])
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        cache = result_cache.stats()
+        gauges["chess_result_cache_entries"] = ("Results in the in-process cache", cache.pop("entries"))
+        for name, value in cache.items():
+            counters[f"chess_result_cache_{name}_total"] = (f"Result cache {name.replace('_', ' ')}", value)
+    for kind, metrics in (("gauge", gauges), ("counter", counters)):
+        for name, (help_text, value) in metrics.items():
+            lines += metric_lines(name, kind, help_text, [(None, value)])
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
 
 # ------------------------- STATIC FILES -------------------------
 
@@ -0,0 +1,321 @@
+"""
+Per-game sessions for the web server.
+
+Each game lives in a GameSession (board, player color, engine profile, AI
+move history and the game's search caches) keyed by a game id. Sessions are
+kept in a session store that bounds how many games are held and for how long:
+
+- MemorySessionStore keeps everything in this process (one worker).
+- SQLiteSessionStore persists the game state in a SQLite file so every
+  gunicorn worker sees the same games; search caches stay per process.
+
+Pick one with SESSION_BACKEND=memory|sqlite (see create_session_store).
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import chess
+import chess_ai
+import sounds
+from engine_config import get_profile
+from result_cache import get_result_cache
+
+# Transposition table per game; kept small since a worker holds many games
+SESSION_TT_MB = float(os.environ.get("SESSION_TT_MB", 2))
+
+# AI moves remembered for the anti-repetition penalty
+MOVE_HISTORY_LENGTH = 20
+
+
+class SessionNotFound(KeyError):
+    """No game with this id (never created, or expired)."""
+
+
+class SessionConflict(Exception):
+    """Another worker changed the game while this request was working on it."""
+
+
+class GameSession:
+    """One game: the board, who plays which side, and the engine caches for it."""
+
+    def __init__(self, game_id, player_color=chess.WHITE, profile=None):
+        self.game_id = game_id
+        self.player_color = player_color
+        self.profile = profile  # Engine profile name (None: the server's default)
+        self.board = chess.Board()
+        self.move_history = []  # Recent AI moves (UCI) for anti-repetition
+        self.version = 0  # Bumped by the store on every save
+        self.last_access = time.time()
+        self.lock = threading.RLock()
+        self._searcher = None
+        self.ponderer = None  # ponder.Ponderer, when pondering is on
+
+    @property
+    def searcher(self):
+        """Search caches (transposition table, history) for this game, created on first use."""
+        if self._searcher is None:
+            self._searcher = chess_ai.Searcher(tt_size_mb=SESSION_TT_MB)
+        return self._searcher
+
+    @property
+    def config(self):
+        """The game's engine profile; the default one if its profile no longer exists."""
+        try:
+            return get_profile(self.profile)
+        except KeyError:
+            return get_profile()
+
+    def reset(self, player_color):
+        """
+        Starts a new game. If the player chose Black the AI is to move; the
+        caller plays its first move like any other AI move.
+        """
+        self.close()
+        self.player_color = player_color
+        self.board = chess.Board()
+        self.move_history.clear()
+        if self._searcher is not None:
+            self._searcher.clear()
+
+    def close(self):
+        """Stops the game's background work (pondering)."""
+        if self.ponderer is not None:
+            self.ponderer.stop()
+
+    def best_move(self, **budget):
+        """
+        Searches the current position; budget is passed on to
+        chess_ai.get_best_move, with the game's profile unless it has a config.
+        """
+        budget.setdefault("config", self.config)
+        return chess_ai.get_best_move(self.board, searcher=self.searcher, move_history=self.move_history,
+                                      result_cache=get_result_cache(), **budget)
+
+    def push(self, move, by_ai=False):
+        """
+        Plays move on the board, tracking AI moves for anti-repetition. AI
+        moves also play their sound when the server runs locally (see sounds).
+        """
+        if by_ai:
+            sounds.play_move_sound(self.board, move)
+        self.board.push(move)
+        if by_ai:
+            self.move_history.append(move.uci())
+            # Keep only recent moves
+            del self.move_history[:-MOVE_HISTORY_LENGTH]
+
+    def to_record(self):
+        """Game state as plain values, for stores that persist sessions."""
+        return {
+            "player_color": "white" if self.player_color == chess.WHITE else "black",
+            "profile": self.profile or "",
+            "start_fen": self.board.root().fen(),
+            "moves": " ".join(move.uci() for move in self.board.move_stack),
+            "move_history": " ".join(self.move_history),
+        }
+
+    def load_record(self, record):
+        """Replaces the game state with a record from to_record (caches are kept)."""
+        self.player_color = chess.WHITE if record["player_color"] == "white" else chess.BLACK
+        self.profile = record.get("profile") or None
+        self.board = chess.Board(record["start_fen"])
+        for uci in record["moves"].split():
+            self.board.push(chess.Move.from_uci(uci))
+        self.move_history = record["move_history"].split()
+
+
+class MemorySessionStore:
+    """
+    Sessions held in this process, bounded by count (least recently used
+    games are dropped first) and by idle time.
+    """
+
+    def __init__(self, max_sessions=200, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, player_color=chess.WHITE):
+        """Creates an empty game and returns its session (not yet reset)."""
+        session = GameSession(uuid.uuid4().hex, player_color)
+        with self._lock:
+            self._sessions[session.game_id] = session
+            self._evict()
+        return session
+
+    def get(self, game_id):
+        """Returns the live session for game_id or raises SessionNotFound."""
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(game_id)
+            if session is None:
+                raise SessionNotFound(game_id)
+            self._sessions.move_to_end(game_id)
+            session.last_access = time.time()
+            return session
+
+    def delete(self, game_id):
+        with self._lock:
+            session = self._sessions.pop(game_id, None)
+        if session is not None:
+            session.close()
+
+    @contextmanager
+    def checkout(self, game_id, write=True):
+        """Holds the game's lock while the caller works on it."""
+        session = self.get(game_id)
+        with session.lock:
+            yield session
+
+    def save(self, session):
+        """Nothing to persist for in-process sessions."""
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self):
+        # Caller holds self._lock
+        expired_before = time.time() - self.ttl
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and oldest.last_access >= expired_before:
+                break
+            self._sessions.popitem(last=False)[1].close()
+
+
+class SQLiteSessionStore(MemorySessionStore):
+    """
+    Sessions persisted in a SQLite database shared by all workers.
+
+    The in-process LRU still holds live GameSession objects (and their warm
+    search caches); the database row is the source of truth for the game
+    itself. A checkout reloads the board when another worker has saved a
+    newer version, and saving is optimistic: if the row changed meanwhile
+    the save fails with SessionConflict instead of overwriting that move.
+    """
+
+    def __init__(self, path, max_sessions=200, ttl=3600, max_rows=100000):
+        super().__init__(max_sessions, ttl)
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS games (
+                    game_id TEXT PRIMARY KEY,
+                    player_color TEXT NOT NULL,
+                    profile TEXT NOT NULL DEFAULT '',
+                    start_fen TEXT NOT NULL,
+                    moves TEXT NOT NULL,
+                    move_history TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated REAL NOT NULL
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS games_updated ON games (updated)")
+            # Databases from before engine profiles
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(games)")}
+            if "profile" not in columns:
+                db.execute("ALTER TABLE games ADD COLUMN profile TEXT NOT NULL DEFAULT ''")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def create(self, player_color=chess.WHITE):
+        session = super().create(player_color)
+        record = session.to_record()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO games (game_id, player_color, profile, start_fen, moves, move_history, version, "
+                "updated) VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (session.game_id, record["player_color"], record["profile"], record["start_fen"],
+                 record["moves"], record["move_history"], time.time()))
+            self._evict_rows(db)
+        return session
+
+    def get(self, game_id):
+        row = self._connect().execute(
+            "SELECT * FROM games WHERE game_id = ? AND updated >= ?",
+            (game_id, time.time() - self.ttl)).fetchone()
+        if row is None:
+            super().delete(game_id)
+            raise SessionNotFound(game_id)
+
+        with self._lock:
+            session = self._sessions.get(game_id)
+            if session is None:
+                # First request for this game in this worker
+                session = GameSession(game_id)
+                session.version = -1
+                self._sessions[game_id] = session
+                self._evict()
+            self._sessions.move_to_end(game_id)
+            session.last_access = time.time()
+
+        with session.lock:
+            if session.version != row["version"]:
+                session.load_record(dict(row))
+                session.version = row["version"]
+        return session
+
+    def delete(self, game_id):
+        super().delete(game_id)
+        with self._connect() as db:
+            db.execute("DELETE FROM games WHERE game_id = ?", (game_id,))
+
+    @contextmanager
+    def checkout(self, game_id, write=True):
+        """Holds the game's lock and saves it afterwards when write is set."""
+        session = self.get(game_id)
+        with session.lock:
+            yield session
+            if write:
+                self.save(session)
+
+    def save(self, session):
+        record = session.to_record()
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE games SET player_color = ?, profile = ?, start_fen = ?, moves = ?, move_history = ?, "
+                "version = version + 1, updated = ? WHERE game_id = ? AND version = ?",
+                (record["player_color"], record["profile"], record["start_fen"], record["moves"],
+                 record["move_history"], time.time(), session.game_id, session.version))
+        if updated.rowcount == 0:
+            session.version = -1  # Reload on the next checkout
+            raise SessionConflict(session.game_id)
+        session.version += 1
+
+    def _evict_rows(self, db):
+        db.execute("DELETE FROM games WHERE updated < ?", (time.time() - self.ttl,))
+        db.execute(
+            "DELETE FROM games WHERE game_id IN "
+            "(SELECT game_id FROM games ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,))
+
+
+def create_session_store():
+    """
+    Builds the session store from the environment:
+    SESSION_BACKEND (memory or sqlite), SESSION_DB_PATH, SESSION_MAX and SESSION_TTL (seconds).
+    """
+    backend = os.environ.get("SESSION_BACKEND", "memory")
+    max_sessions = int(os.environ.get("SESSION_MAX", 200))
+    ttl = float(os.environ.get("SESSION_TTL", 3600))
+    if backend == "sqlite":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.db")
+        path = os.environ.get("SESSION_DB_PATH", default_path)
+        return SQLiteSessionStore(path, max_sessions=max_sessions, ttl=ttl)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return MemorySessionStore(max_sessions=max_sessions, ttl=ttl)
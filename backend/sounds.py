@@ -0,0 +1,68 @@
+"""
+Move sounds for local play.
+
+pygame is imported and the WAV files in static/sounds are loaded on the
+first sound played, so importing the engine (and the web server) never
+pulls in SDL. Game sessions play the sound of every AI move. Sound is off
+when RENDER is set (headless server) or MOVE_SOUNDS=0, and turns itself
+off if pygame or an audio device is missing.
+"""
+import logging
+import os
+
+import chess
+
+from chess_ai import is_castling
+
+logger = logging.getLogger(__name__)
+
+SOUND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "sounds")
+SOUND_NAMES = ("move", "capture", "check", "checkmate", "castle")
+
+# Disable sound if running on Render (headless server) or when switched off
+USE_SOUND = "RENDER" not in os.environ and os.environ.get("MOVE_SOUNDS") != "0"
+
+_sounds = None
+
+
+def load_sounds():
+    """Loads the sound effects on first use; returns them by name, or None without sound."""
+    global USE_SOUND, _sounds
+    if _sounds is None and USE_SOUND:
+        try:
+            os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+            import pygame
+            pygame.mixer.init()
+            _sounds = {name: pygame.mixer.Sound(os.path.join(SOUND_DIR, f"{name}.wav"))
+                       for name in SOUND_NAMES}
+        except Exception as error:  # No pygame, no audio device, ...
+            logger.warning("Sound disabled: %s", error)
+            USE_SOUND = False
+    return _sounds
+
+
+def play_move_sound(board, move):
+    """Plays the sound for move, which is about to be made on board."""
+    sounds = load_sounds()
+    if sounds is None:
+        return  # No sound on Render
+
+    # Handle both string (UCI) and move object inputs
+    if isinstance(move, str):
+        move_obj = chess.Move.from_uci(move)
+    else:
+        move_obj = move
+
+    target_square = move_obj.to_square
+    is_capture = board.piece_at(target_square) is not None
+
+    if board.is_checkmate():
+        sounds["checkmate"].play()
+    elif board.is_check():
+        sounds["check"].play()
+    elif is_capture:
+        sounds["capture"].play()
+    elif is_castling(move_obj):
+        sounds["castle"].play()
+    else:
+        sounds["move"].play()
@@ -0,0 +1,140 @@
+"""
+Syzygy endgame tablebase probing.
+
+Set SYZYGY_PATH to one or more directories of .rtbw/.rtbz files (separated
+by os.pathsep) to enable it. The tables are opened once per process, on the
+first probe, and WDL results are cached by Zobrist key. Without
+SYZYGY_PATH, or for positions the tables don't cover, every probe returns
+None and the search carries on as before.
+
+probe_root() picks the DTZ-optimal move at the root; probe_wdl() scores
+positions inside the search.
+"""
+import logging
+import os
+
+import chess
+import chess.polyglot
+import chess.syzygy
+
+logger = logging.getLogger(__name__)
+
+# Scores for tablebase wins: below every mate score the search can find,
+# above any evaluation
+TB_WIN_SCORE = 9000
+
+PROBE_CACHE_SIZE = 100000
+
+_tablebase = None
+_opened = False
+_max_pieces = 0
+_wdl_cache = {}  # Zobrist key -> WDL from the side to move's view
+
+# Probe counters for this process
+stats = {"wdl_probes": 0, "wdl_hits": 0, "cache_hits": 0, "root_hits": 0}
+
+
+def get_tablebase():
+    """The process's tablebase, opened on first use; None when none is configured."""
+    global _tablebase, _opened, _max_pieces
+    if not _opened:
+        _opened = True
+        paths = [path for path in os.environ.get("SYZYGY_PATH", "").split(os.pathsep) if path]
+        if paths:
+            tablebase = chess.syzygy.Tablebase()
+            for path in paths:
+                tablebase.add_directory(path)
+            if tablebase.wdl:
+                # Table names look like "KRPvKR"
+                _max_pieces = max(len(name) - 1 for name in tablebase.wdl)
+                _tablebase = tablebase
+                logger.info("Syzygy tablebases: %d WDL and %d DTZ tables, up to %d pieces",
+                            len(tablebase.wdl), len(tablebase.dtz), _max_pieces)
+            else:
+                tablebase.close()
+                logger.warning("No Syzygy tables found in %s", os.environ["SYZYGY_PATH"])
+    return _tablebase
+
+
+def can_probe(board):
+    """Whether board is small enough for the tables (which know no castling)."""
+    return (get_tablebase() is not None and not board.castling_rights
+            and chess.popcount(board.occupied) <= _max_pieces)
+
+
+def wdl_score(wdl, ply=0):
+    """Search score for a WDL result; cursed wins and blessed losses count as draws."""
+    if wdl == 2:
+        return TB_WIN_SCORE - ply
+    if wdl == -2:
+        return -TB_WIN_SCORE + ply
+    return 0
+
+
+def probe_wdl(board, key=None):
+    """
+    WDL (-2 to 2) of board for the side to move, or None when it can't be
+    probed. key is board's Zobrist hash, if the caller already has it.
+    """
+    if not can_probe(board):
+        return None
+    if key is None:
+        key = chess.polyglot.zobrist_hash(board)
+    wdl = _wdl_cache.get(key)
+    if wdl is not None:
+        stats["cache_hits"] += 1
+        return wdl
+    stats["wdl_probes"] += 1
+    try:
+        wdl = _tablebase.probe_wdl(board)
+    except (KeyError, chess.syzygy.MissingTableError):
+        return None
+    stats["wdl_hits"] += 1
+    if len(_wdl_cache) >= PROBE_CACHE_SIZE:
+        _wdl_cache.clear()
+    _wdl_cache[key] = wdl
+    return wdl
+
+
+def probe_root(board):
+    """
+    DTZ-optimal move for board as (move, wdl), or None when the position
+    can't be probed. Wins take the fastest way to the next zeroing move, losses
+    put it off as long as possible.
+    """
+    if not can_probe(board) or board.is_game_over():
+        return None
+    best = None
+    try:
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    return move, 2
+                # Child values are from the opponent's view
+                wdl = -_tablebase.probe_wdl(board)
+                dtz = abs(_tablebase.probe_dtz(board))
+                zeroing = board.halfmove_clock == 0
+            finally:
+                board.pop()
+            if wdl > 0:
+                rank = (wdl, zeroing, -dtz)
+            elif wdl < 0:
+                rank = (wdl, not zeroing, dtz)
+            else:
+                rank = (0, False, 0)
+            if best is None or rank > best[0]:
+                best = (rank, move, wdl)
+    except (KeyError, chess.syzygy.MissingTableError):
+        return None
+    stats["root_hits"] += 1
+    return best[1], best[2]
+
+
+def close():
+    global _tablebase, _opened
+    if _tablebase is not None:
+        _tablebase.close()
+    _tablebase = None
+    _opened = False
+    _wdl_cache.clear()
@@ -0,0 +1,196 @@
+"""
+Tactical test harness.
+
+Runs an EPD suite of tactics (tactics.epd, the first Win At Chess positions,
+by default; any suite with "bm"/"am" operations works) against
+get_best_move under a fixed budget, with the positions spread over a
+process pool:
+
+    python tactics.py wac.epd --movetime 1000 --workers 4
+    python tactics.py --nodes 20000 --json tactics.json
+
+A position is solved when the final move is one of its best moves ("bm")
+and none of its avoid moves ("am"). For solved positions the time and node
+count to solution are those of the first finished iteration from which the
+search kept choosing a solving move. The summary gives the solved count and
+the solved positions per CPU second of search, the number to watch when a
+change trades search speed for pruning (or the other way round).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import chess
+
+from result_cache import engine_version
+from search_pool import PoolSaturated, SearchExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SUITE = os.path.join(BASE_DIR, "tactics.epd")
+
+# Extra time a search gets beyond its movetime before it is given up on
+TACTICS_GRACE_S = 5
+
+
+def load_suite(path):
+    """Returns (id, board, best moves, avoid moves) for every position with a bm or am operation."""
+    suite = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            board, ops = chess.Board.from_epd(line)
+            if "bm" not in ops and "am" not in ops:
+                continue
+            suite.append((str(ops.get("id", line_number)), board, ops.get("bm", []), ops.get("am", [])))
+    return suite
+
+
+def is_solution(move_uci, best_moves, avoid_moves):
+    if move_uci is None:
+        return False
+    move = chess.Move.from_uci(move_uci)
+    return (not best_moves or move in best_moves) and move not in avoid_moves
+
+
+def score_result(position_id, board, best_moves, avoid_moves, found, progress):
+    """Result dict of one position from its search result and progress reports."""
+    solved = is_solution(found["move"], best_moves, avoid_moves)
+    result = {
+        "id": position_id,
+        "fen": board.fen(),
+        "bm": [board.san(move) for move in best_moves],
+        "am": [board.san(move) for move in avoid_moves],
+        "move": board.san(chess.Move.from_uci(found["move"])) if found["move"] else None,
+        "solved": solved,
+        "depth": found["depth"],
+        "nodes": found["nodes"] + found["qnodes"],
+        "time": found["finished"] - found["started"],
+        "time_to_solution": None,
+        "nodes_to_solution": None,
+        "depth_to_solution": None,
+    }
+    if solved:
+        # First iteration of the final run of solving iterations
+        for info in reversed(progress):
+            if not is_solution(info["best_move"], best_moves, avoid_moves):
+                break
+            result.update(time_to_solution=info["time"], nodes_to_solution=info["nodes"] + info["qnodes"],
+                          depth_to_solution=info["depth"])
+        if result["time_to_solution"] is None:  # Solved without a finished iteration reported
+            result.update(time_to_solution=result["time"], nodes_to_solution=result["nodes"],
+                          depth_to_solution=result["depth"])
+    return result
+
+
+def run_suite(suite, executor, budget):
+    """Yields a result dict per position, in suite order, keeping the pool busy."""
+    budget = dict(budget, use_book=False)
+    timeout = budget["movetime"] / 1000 + TACTICS_GRACE_S if budget.get("movetime") else None
+    window = executor.workers + executor.max_queue
+    pending = deque()  # (position, job, progress), oldest first
+
+    def finish(entry):
+        (position_id, board, best_moves, avoid_moves), job, progress = entry
+        try:
+            found = job.result(timeout)
+        except Exception as error:
+            return {"id": position_id, "fen": board.fen(), "solved": False,
+                    "error": str(error) or type(error).__name__}
+        return score_result(position_id, board, best_moves, avoid_moves, found, progress)
+
+    for position in suite:
+        progress = []
+        while True:
+            if len(pending) >= window:
+                yield finish(pending.popleft())
+            try:
+                job = executor.submit(position[1].fen(), (), (), budget, on_progress=progress.append)
+                break
+            except PoolSaturated:
+                if pending:
+                    yield finish(pending.popleft())
+                else:
+                    time.sleep(0.1)
+        pending.append((position, job, progress))
+        while pending and pending[0][1].done():
+            yield finish(pending.popleft())
+
+    while pending:
+        yield finish(pending.popleft())
+
+
+def summarize(results, elapsed):
+    solved = [result for result in results if result["solved"]]
+    search_time = sum(result.get("time", 0.0) for result in results)
+    return {
+        "positions": len(results),
+        "solved": len(solved),
+        "errors": sum(1 for result in results if "error" in result),
+        "nodes": sum(result.get("nodes", 0) for result in results),
+        "search_time": search_time,
+        "wall_time": elapsed,
+        "solved_per_cpu_second": len(solved) / search_time if search_time > 0 else 0.0,
+        "mean_time_to_solution": (sum(result["time_to_solution"] for result in solved) / len(solved)
+                                  if solved else None),
+        "mean_nodes_to_solution": (sum(result["nodes_to_solution"] for result in solved) / len(solved)
+                                   if solved else None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an EPD tactics suite (bm/am) against the engine")
+    parser.add_argument("suite", nargs="?", default=DEFAULT_SUITE, help="EPD file")
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--movetime", type=int, help="milliseconds per position")
+    parser.add_argument("--nodes", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", help="write the results and summary to this file")
+    args = parser.parse_args()
+
+    budget = {name: getattr(args, name) for name in ("depth", "movetime", "nodes")
+              if getattr(args, name) is not None}
+    if not budget:
+        budget["movetime"] = 1000
+
+    # Every position must be searched, not answered from earlier runs; the
+    # workers' per-search log lines would only clutter the table
+    os.environ["RESULT_CACHE_SIZE"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    suite = load_suite(args.suite)
+    executor = SearchExecutor(workers=args.workers, max_queue=args.workers)
+    print(f"{len(suite)} positions, budget {budget}, {args.workers} workers", file=sys.stderr)
+    print(f"{'id':<14}{'move':>8}{'best':>14}{'depth':>6}{'nodes':>10}{'time s':>8}{'to solve s':>11}")
+    started = time.perf_counter()
+    results = []
+    try:
+        for result in run_suite(suite, executor, budget):
+            results.append(result)
+            if "error" in result:
+                print(f"{result['id']:<14}  error: {result['error']}")
+                continue
+            expected = " ".join(result["bm"]) or "not " + " ".join(result["am"])
+            to_solve = f"{result['time_to_solution']:.2f}" if result["solved"] else "-"
+            print(f"{result['id']:<14}{result['move'] or '-':>8}{expected:>14}{result['depth']:>6}"
+                  f"{result['nodes']:>10}{result['time']:>8.2f}{to_solve:>11}", flush=True)
+    finally:
+        executor.shutdown()
+
+    summary = summarize(results, time.perf_counter() - started)
+    print(f"\nsolved {summary['solved']}/{summary['positions']}, {summary['nodes']} nodes, "
+          f"{summary['search_time']:.1f}s of search ({summary['solved_per_cpu_second']:.2f} solved/CPU s), "
+          f"{summary['wall_time']:.1f}s wall")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"budget": budget, "suite": os.path.basename(args.suite),
+                       "engine_version": engine_version(), "summary": summary, "results": results},
+                      output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Headless, as on Render: no sound device in test runs
+os.environ.setdefault("RENDER", "1")
+
+
+@pytest.fixture(scope="session")
+def server():
+    """The Flask app module, searching on the request thread with in-memory games and no result cache."""
+    os.environ.setdefault("SEARCH_WORKERS", "0")
+    os.environ.setdefault("SESSION_BACKEND", "memory")
+    os.environ.setdefault("RESULT_CACHE_SIZE", "0")
+    import server
+    return server
@@ -0,0 +1,37 @@
+import chess
+import pytest
+
+import analysis
+import batch_eval
+import chess_ai
+from bench_alloc import DEFAULT_POSITIONS, load_positions
+
+pytest.importorskip("numpy")
+
+EXTRA_FENS = [
+    "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1",  # Stalemate
+    "6rk/5Npp/8/8/8/8/8/6K1 b - - 0 1",  # Smothered mate
+    "8/8/4k3/8/8/3K4/8/8 w - - 0 1",  # Insufficient material
+    "8/5k2/8/3P4/8/8/5K2/8 w - - 0 1",  # Endgame tables, passed pawn
+    "r3k2r/pp3ppp/2n5/3pP3/3P4/2P5/P4PPP/R3K2R b KQkq - 0 1",
+]
+
+
+def test_batch_matches_evaluate_board():
+    boards = [board for _, board in load_positions(DEFAULT_POSITIONS)]
+    boards += [chess.Board(fen) for fen in EXTRA_FENS]
+    scores = batch_eval.evaluate_batch(boards)
+    assert scores.tolist() == [chess_ai.evaluate_board(board) for board in boards]
+
+
+def test_eval_mode_uses_batches_in_order(monkeypatch):
+    monkeypatch.setattr(analysis, "EVAL_BATCH_SIZE", 2)
+    fens = EXTRA_FENS[3:] + ["not a fen"] + [chess.STARTING_FEN]
+    positions = [(index, chess.Board(fen) if fen != "not a fen" else None) for index, fen in enumerate(fens)]
+    results = list(analysis.analyze(positions, None, mode="eval"))
+    assert [result["id"] for result in results] == list(range(len(fens)))
+    assert results[2]["error"] == "Invalid position"
+    for result, (_, board) in zip(results, positions):
+        if board is not None:
+            expected = chess_ai.evaluate_board(board)
+            assert result["score"] == (expected if board.turn == chess.WHITE else -expected)
@@ -0,0 +1,109 @@
+import random
+
+import chess
+import chess.polyglot
+import pytest
+
+import build_book
+from book import OpeningBook, _from_polyglot
+
+GAMES = """
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O Nf6 1-0
+
+[Result "0-1"]
+
+1. e4 c5 0-1
+
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O d6 1-0
+
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+
+[Result "0-1"]
+
+1. c4 e5 0-1
+"""
+
+ITALIAN = "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"
+
+
+@pytest.fixture
+def pgn_path(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text(GAMES)
+    return str(path)
+
+
+@pytest.fixture
+def book_path(tmp_path, pgn_path):
+    positions, games = build_book.count_moves([pgn_path], max_ply=8)
+    assert games == 5
+    path = tmp_path / "book.bin"
+    build_book.write_book(str(path), build_book.book_entries(positions, min_games=1))
+    return str(path)
+
+
+def test_book_weights_by_result(book_path):
+    book = OpeningBook(book_path)
+    weights = {move.uci(): weight for move, weight in book.moves(chess.Board())}
+    # e4: two wins and a loss; d4: a draw; c4 only lost but stays, with the least weight
+    assert weights == {"e2e4": 4, "d2d4": 1, "c2c4": 1}
+    book.close()
+
+
+def test_book_castling_and_transpositions(book_path):
+    book = OpeningBook(book_path)
+    board = chess.Board(ITALIAN)
+    assert [move.uci() for move, _ in book.moves(board)] == ["e1g1"]
+    # Same position, other move clocks
+    board = chess.Board(ITALIAN.replace(" 4 4", " 0 12"))
+    assert book.choose_move(board) == chess.Move.from_uci("e1g1")
+    board.push_uci("e1g1")
+    weights = {move.uci(): weight for move, weight in book.moves(board)}
+    assert weights == {"g8f6": 1, "d7d6": 1}  # Black lost both
+    board.push_uci("d7d6")
+    assert book.moves(board) == []
+    assert book.choose_move(board) is None
+    book.close()
+
+
+def test_min_games_drops_rare_moves(pgn_path):
+    positions, _ = build_book.count_moves([pgn_path], max_ply=8)
+    entries = build_book.book_entries(positions, min_games=2)
+    moves = {build_book.encode_move(chess.Board(), chess.Move.from_uci(uci)): uci
+             for uci in ("e2e4", "d2d4", "c2c4")}
+    start = chess.polyglot.zobrist_hash(chess.Board())
+    assert [moves[move] for key, move, _ in entries if key == start] == ["e2e4"]
+    assert entries == sorted(entries, key=lambda entry: (entry[0], -entry[2], entry[1]))
+
+
+def test_weights_are_scaled_to_16_bits():
+    positions = {1: {10: [100000, 200000], 11: [1, 100000]}}
+    assert build_book.book_entries(positions, min_games=1) == [(1, 10, 0xFFFF), (1, 11, 0xFFFF // 2)]
+
+
+def test_promotion_encoding_round_trip():
+    board = chess.Board("8/4P1k1/8/8/8/8/8/4K3 w - - 0 1")
+    for uci in ("e7e8q", "e7e8n"):
+        move = chess.Move.from_uci(uci)
+        assert _from_polyglot(board, build_book.encode_move(board, move)) == move
+
+
+def test_builtin_moves_when_out_of_polyglot_book(book_path):
+    board = chess.Board()
+    board.push_uci("g1f3")
+    builtin = {board.fen(): ["d7d5", "g8f6"], chess.Board().fen(): ["g2g3"]}
+    book = OpeningBook(book_path, builtin=builtin, rng=random.Random(1))
+    # Listed best first
+    assert [(move.uci(), weight) for move, weight in book.moves(board)] == [("d7d5", 2), ("g8f6", 1)]
+    # The Polyglot book wins where it has moves
+    assert chess.Move.from_uci("g2g3") not in dict(book.moves(chess.Board()))
+    book.close()
+
+    book = OpeningBook(builtin=builtin, rng=random.Random(1))
+    assert book.choose_move(chess.Board()) == chess.Move.from_uci("g2g3")
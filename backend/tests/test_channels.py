@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from channels import ChannelLimitReached, ChannelManager, GameChannel
+
+
+def test_channel_events_after_an_id():
+    channel = GameChannel("game")
+    assert channel.wait_events(0, timeout=0) == []
+    channel.publish("ack", {"move": "e2e4"})
+    channel.publish("ai_move", {"move": "e7e5"})
+    assert [event["id"] for event in channel.wait_events(0, timeout=0)] == [1, 2]
+    assert channel.wait_events(1, timeout=0) == [{"id": 2, "event": "ai_move", "data": {"move": "e7e5"}}]
+    assert channel.wait_events(2, timeout=0) == []
+
+
+def test_channel_asks_for_a_resync_once_events_are_dropped():
+    channel = GameChannel("game", buffer=2)
+    for number in range(3):
+        channel.publish("progress", {"depth": number + 1})
+    assert channel.wait_events(0, timeout=0) is None
+    assert [event["id"] for event in channel.wait_events(1, timeout=0)] == [2, 3]
+
+
+def test_channel_limit_release_and_expiry():
+    manager = ChannelManager(max_connections=1, ttl=0)
+    channel = manager.open("a")
+    with pytest.raises(ChannelLimitReached):
+        manager.open("b")
+    assert manager.get("a") is channel  # Open streams keep their channel
+
+    manager.release(channel)
+    assert manager.connections() == 0
+    other = manager.open("b")
+    assert manager.get("a") is not channel  # Expired without streams
+    assert manager.get("b") is other
+
+
+def read_events(chunks, until):
+    """Reads a game stream up to and including the first `until` event; returns (id, event, data) triples."""
+    events = []
+    for chunk in chunks:
+        fields = dict(line.split(": ", 1) for line in chunk.decode().splitlines()
+                      if line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+            if fields["event"] == until:
+                return events
+    raise AssertionError(f"stream ended before {until}: {events}")
+
+
+def test_game_stream_carries_the_turn(server):
+    client = server.app.test_client()
+    game_id = client.post("/set_color", json={"color": "white"}).get_json()["game_id"]
+    connections = server.channels.connections()
+
+    stream = client.get(f"/games/{game_id}/events", buffered=False)
+    chunks = stream.iter_encoded()
+    assert next(chunks).startswith(b"retry: ")
+    [(_, event, state)] = read_events(chunks, "state")
+    assert state["turn"] == "white"
+    assert server.channels.connections() == connections + 1
+
+    response = client.post(f"/games/{game_id}/move", json={"move": "a2a3", "depth": 1})
+    assert response.status_code == 202
+    assert response.get_json()["ack"]["last_move"] == "a2a3"
+    events = read_events(chunks, "ai_move")
+    assert [event for _, event, _ in events] == ["ack", "progress", "ai_move"]
+    ai_move = events[-1][2]
+    assert ai_move["status"] == "success"
+    stream.close()
+    assert server.channels.connections() == connections
+
+    # Reconnecting after the ack replays the rest of the turn
+    stream = client.get(f"/games/{game_id}/events", buffered=False, headers={"Last-Event-ID": str(events[0][0])})
+    chunks = stream.iter_encoded()
+    next(chunks)
+    assert read_events(chunks, "ai_move") == events[1:]
+    stream.close()
+
+    board = client.get("/get_board", query_string={"game_id": game_id}).get_json()
+    assert board["fen"] == ai_move["fen"]
+
+
+def test_game_move_errors(server):
+    client = server.app.test_client()
+    game_id = client.post("/set_color", json={"color": "white"}).get_json()["game_id"]
+    assert client.post(f"/games/{game_id}/move", json={"move": "a2a5"}).status_code == 400
+    assert client.post(f"/games/{game_id}/move", json={"move": "a2a3", "depth": 0}).status_code == 400
+    assert client.post("/games/missing/move", json={"move": "a2a3"}).status_code == 404
+    assert client.get("/games/missing/events").status_code == 404
+    # Not the AI's turn: nothing to start
+    assert client.post(f"/games/{game_id}/move", json={}).get_json() == {"ack": None, "job_id": None}
@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+import engine_config
+from engine_config import EngineConfig
+
+
+@pytest.fixture
+def profiles_file(tmp_path, monkeypatch):
+    path = tmp_path / "profiles.json"
+    monkeypatch.setenv("ENGINE_PROFILES_PATH", str(path))
+    monkeypatch.setattr(engine_config, "_profiles", None)
+    return path
+
+
+def write_profiles(path, profiles, mtime):
+    path.write_text(json.dumps(profiles))
+    os.utime(path, (mtime, mtime))
+
+
+def test_unknown_names_are_rejected():
+    with pytest.raises(ValueError):
+        EngineConfig(weights={"nonsense": 1})
+    with pytest.raises(ValueError):
+        EngineConfig(features={"nonsense": True})
+
+
+def test_profiles_file_is_reloaded_when_it_changes(profiles_file):
+    write_profiles(profiles_file, {"tuned": {"weights": {"mobility": 3}}, "casual": {"depth": 4}}, 1000)
+    assert engine_config.get_profile("tuned").weights["mobility"] == 3
+    casual = engine_config.get_profile("casual")
+    assert (casual.depth, casual.skill) == (4, 10)  # Merged with the built-in profile
+
+    write_profiles(profiles_file, {"tuned": {"weights": {"mobility": 5}}}, 2000)
+    assert engine_config.get_profile("tuned").weights["mobility"] == 5
+    assert engine_config.get_profile("casual").depth == 2
+
+    profiles_file.unlink()
+    with pytest.raises(KeyError):
+        engine_config.get_profile("tuned")
+
+
+@pytest.mark.parametrize("content", ['{"tuned": {"weights": {"mobility": 3}', '["tuned"]',
+                                     '{"tuned": {"weights": {"nonsense": 1}}}', '{"tuned": {"depth": 2, "bad": 1}}',
+                                     '{"tuned": 3}'])
+def test_bad_profiles_file_keeps_the_last_good_profiles(profiles_file, content):
+    write_profiles(profiles_file, {"tuned": {"weights": {"mobility": 3}}}, 1000)
+    assert engine_config.get_profile("tuned").weights["mobility"] == 3
+
+    profiles_file.write_text(content)
+    os.utime(profiles_file, (2000, 2000))
+    assert engine_config.get_profile("tuned").weights["mobility"] == 3
+    assert engine_config.get_profile().name == "default"
+
+
+def test_bad_profiles_file_at_startup_gives_the_built_in_profiles(profiles_file):
+    profiles_file.write_text("{")
+    assert engine_config.profile_names() == sorted(engine_config.PROFILES)
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+
+import pytest
+
+from jobs import JobLimitReached, JobManager, JobNotFound
+
+
+def parse_sse(body):
+    """The (id, event, data) of each event in a Server-Sent Events body; comments are skipped."""
+    events = []
+    for message in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def wait_finished(job):
+    while job.finished is None:
+        job.wait_events(len(job.events), timeout=5)
+
+
+def test_job_result_and_events():
+    manager = JobManager()
+
+    def target(job):
+        job.publish("progress", {"depth": 1})
+        job.publish("progress", {"depth": 2})
+        return {"move": "e2e4"}
+
+    job = manager.submit(target)
+    wait_finished(job)
+    events = job.wait_events(0, timeout=0)
+    assert [event["event"] for event in events] == ["progress", "progress", "done"]
+    assert [event["id"] for event in events] == [1, 2, 3]
+    assert job.wait_events(2, timeout=0) == events[2:]
+    snapshot = job.snapshot()
+    assert snapshot["status"] == "done"
+    assert snapshot["progress"] == {"depth": 2}
+    assert snapshot["result"] == {"move": "e2e4"}
+    assert manager.get(job.id) is job
+
+    job.publish("progress", {"depth": 3})  # Late progress is dropped
+    assert len(job.events) == 3
+
+
+def test_failed_job():
+    manager = JobManager()
+
+    def target(job):
+        raise ValueError("bad position")
+
+    job = manager.submit(target)
+    wait_finished(job)
+    assert job.status == "failed"
+    assert job.events[-1] == {"id": 1, "event": "failed", "data": {"error": "bad position"}}
+
+
+def test_job_limit_and_expiry():
+    manager = JobManager(max_active=1, ttl=0)
+    release = threading.Event()
+    running = manager.submit(lambda job: release.wait(5))
+    with pytest.raises(JobLimitReached):
+        manager.submit(lambda job: None)
+
+    release.set()
+    while manager.active():
+        time.sleep(0.01)
+    manager.submit(lambda job: None)
+    with pytest.raises(JobNotFound):
+        manager.get(running.id)  # Finished more than ttl ago
+
+
+@pytest.fixture
+def game(server):
+    """A new game with the player as white, after 1. a3."""
+    client = server.app.test_client()
+    game_id = client.post("/set_color", json={"color": "white"}).get_json()["game_id"]
+    assert client.post("/player_move", json={"game_id": game_id, "move": "a2a3"}).status_code == 200
+    return client, game_id
+
+
+def test_ai_move_job_streams_progress_then_the_move(game):
+    client, game_id = game
+    response = client.post("/ai_move", json={"game_id": game_id, "depth": 2})
+    assert response.status_code == 202
+    started = response.get_json()
+    assert started["events"] == f"/jobs/{started['job_id']}/events"
+
+    # The stream ends after the final event
+    events = parse_sse(client.get(started["events"]).get_data(as_text=True))
+    assert [event_id for event_id, _, _ in events] == list(range(1, len(events) + 1))
+    assert [event for _, event, _ in events] == ["progress"] * (len(events) - 1) + ["done"]
+    assert [data["depth"] for _, _, data in events[:-1]] == [1, 2]
+    done = events[-1][2]
+    assert done["status"] == "success"
+
+    snapshot = client.get(f"/jobs/{started['job_id']}").get_json()
+    assert snapshot["status"] == "done"
+    assert snapshot["result"] == done
+    board = client.get("/get_board", query_string={"game_id": game_id}).get_json()
+    assert board["fen"] == done["fen"]
+
+    # Reconnecting resumes after the last event seen
+    resumed = client.get(started["events"], headers={"Last-Event-ID": "1"})
+    assert parse_sse(resumed.get_data(as_text=True)) == events[1:]
+    resumed = client.get(started["events"], query_string={"after": len(events)})
+    assert parse_sse(resumed.get_data(as_text=True)) == []
+
+
+def test_ai_move_job_errors(game, server):
+    client, game_id = game
+    assert client.post("/ai_move", json={"game_id": game_id, "depth": 0}).status_code == 400
+    assert client.post("/ai_move", json={"game_id": "missing", "depth": 1}).status_code == 404
+    assert client.get("/jobs/missing").status_code == 404
+    job_id = client.post("/ai_move", json={"game_id": game_id, "depth": 1}).get_json()["job_id"]
+    assert client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "x"}).status_code == 400
+    wait_finished(server.jobs.get(job_id))
+
+
+def test_cancelled_ai_move_job_still_plays(game):
+    client, game_id = game
+    job_id = client.post("/ai_move", json={"game_id": game_id, "movetime": 60000}).get_json()["job_id"]
+    assert client.delete(f"/jobs/{job_id}").status_code == 200
+    events = parse_sse(client.get(f"/jobs/{job_id}/events").get_data(as_text=True))
+    assert events[-1][1] == "done"
+    assert events[-1][2]["status"] == "success"
@@ -0,0 +1,88 @@
+import time
+
+import chess
+import pytest
+
+import chess_ai
+import ponder
+from engine_config import EngineConfig
+from ponder import Ponderer, likely_replies
+from sessions import GameSession
+
+# Out of book, the player (White) to move
+MIDDLEGAME = "r2q1rk1/pp2bppp/2n1bn2/3p4/3P4/2NBBN2/PP3PPP/R2Q1RK1 w - - 0 1"
+
+# The AI's PV: its own move, then the player's expected reply
+AI_PV = ["c6b4", "a2a3"]
+
+
+def after(board, uci):
+    child = board.copy()
+    child.push_uci(uci)
+    return child
+
+
+@pytest.fixture
+def session():
+    session = GameSession("ponder-test")
+    session.board = chess.Board(MIDDLEGAME)
+    return session
+
+
+def test_likely_replies_start_with_the_pv_reply():
+    board = chess.Board(MIDDLEGAME)
+    ordered = list(chess_ai.order_moves(board))
+    replies = likely_replies(board, AI_PV, 3)
+    assert replies[0] == chess.Move.from_uci("a2a3")
+    assert replies[1:] == [move for move in ordered if move.uci() != "a2a3"][:2]
+    # An illegal or missing reply falls back to move ordering
+    assert likely_replies(board, ["c6b4", "a2a5"], 2) == ordered[:2]
+    assert likely_replies(board, ["c6b4"], 1) == ordered[:1]
+
+
+def test_take_returns_the_pondered_search_for_the_players_move(session):
+    ponderer = Ponderer(session, movetime_ms=200, replies=2)
+    ponderer.start(AI_PV)
+    time.sleep(0.5)  # The pondered reply's search has used its movetime
+    hits = ponder.stats["hits"]
+    board = after(session.board, "a2a3")
+    result = ponderer.take(board, {"depth": 1})
+    assert result is not None
+    assert result["depth"] >= 1
+    assert board.is_legal(chess.Move.from_uci(result["move"]))
+    assert ponder.stats["hits"] == hits + 1
+
+
+def test_take_misses_deeper_budgets_other_moves_and_other_profiles(session):
+    ponderer = Ponderer(session, movetime_ms=60000, replies=1)
+    ponderer.start(AI_PV)
+    started = time.time()
+    assert ponderer.take(after(session.board, "a2a3"), {"depth": 50}) is None
+    assert time.time() - started < 5  # The ponder search stops at once
+
+    ponderer.start(AI_PV)
+    assert ponderer.take(after(session.board, "h2h3"), {"depth": 1}) is None  # Not pondered
+
+    ponderer = Ponderer(session, movetime_ms=200, replies=1)
+    ponderer.start(AI_PV, EngineConfig(name="pondered"))
+    time.sleep(0.3)
+    other = EngineConfig(name="other", features={"quiescence": False})
+    assert ponderer.take(after(session.board, "a2a3"), {"depth": 1, "config": other}) is None
+
+
+def test_keep_stops_the_other_replies(session):
+    ponderer = Ponderer(session, movetime_ms=60000, replies=3)
+    ponderer.start(AI_PV)
+    assert len(ponderer._searches) == 3
+    kept = after(session.board, "a2a3")
+    ponderer.keep(kept)
+    assert list(ponderer._searches) == [chess_ai.position_key(kept)]
+    ponderer.stop()
+    assert not ponderer._searches
+
+
+def test_no_pondering_after_game_over(session):
+    session.board = chess.Board("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1")
+    ponderer = Ponderer(session, movetime_ms=200)
+    ponderer.start([])
+    assert not ponderer._searches
@@ -0,0 +1,36 @@
+import chess
+import pytest
+
+import chess_ai
+from chess_ai import see
+
+
+@pytest.mark.parametrize("fen, uci, expected", [
+    ("4k3/8/8/3r4/8/8/8/3RK3 w - - 0 1", "d1d5", 500),  # Undefended rook
+    ("4k3/8/4p3/3r4/8/8/8/3QK3 w - - 0 1", "d1d5", -400),  # Queen for a pawn-defended rook
+    ("4k3/8/4p3/3q4/4P3/8/8/4K3 w - - 0 1", "e4d5", 800),  # Pawn takes the queen and is taken back
+    ("3rk3/8/8/3r4/8/8/3R4/3RK3 w - - 0 1", "d2d5", 500),  # The rook behind backs up the exchange
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),  # En passant
+    ("4k3/2p5/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 0),  # En passant, recaptured
+    ("8/8/8/8/8/8/4r3/4K2k w - - 0 1", "e1e2", 500),  # The king takes an undefended rook
+    ("8/8/8/8/8/3k4/4r3/4R2K w - - 0 1", "e1e2", 0),  # The black king takes back
+    ("8/8/8/7B/8/3k4/4r3/4R2K w - - 0 1", "e1e2", 500),  # Not into the bishop's check
+])
+def test_see(fen, uci, expected):
+    board = chess.Board(fen)
+    move = chess.Move.from_uci(uci)
+    assert board.is_legal(move)
+    assert see(board, move) == expected
+
+
+def test_quiescence_avoids_a_losing_capture_at_the_horizon():
+    # Qxd5 wins a pawn as it stands, but exd5 takes the queen back
+    board = chess.Board("4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1")
+    searcher = chess_ai.Searcher()
+    move = chess_ai.get_best_move(board, depth=1, searcher=searcher, use_book=False)
+    assert move.uci() != "d1d5"
+    assert searcher.stats["qnodes"] > 0
+
+    blind = chess_ai.DEFAULT_CONFIG.replace(features={"quiescence": False})
+    searcher = chess_ai.Searcher()
+    assert chess_ai.get_best_move(board, depth=1, searcher=searcher, use_book=False, config=blind).uci() == "d1d5"
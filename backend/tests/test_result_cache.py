@@ -0,0 +1,58 @@
+import chess
+
+import chess_ai
+import engine_config
+import result_cache
+from engine_config import EngineConfig
+from result_cache import ResultCache
+
+
+def test_results_answer_the_same_or_smaller_depth():
+    cache = ResultCache(version="test")
+    cache.put(123, 4, "e2e4", 30, ["e2e4", "e7e5"])
+    assert cache.get(123, 3) == {"depth": 4, "move": "e2e4", "score": 30, "pv": ["e2e4", "e7e5"]}
+    assert cache.get(123, 5) is None
+    cache.put(123, 2, "d2d4", 10, ["d2d4"])  # Shallower results don't replace deeper ones
+    assert cache.get(123, 4)["move"] == "e2e4"
+
+
+def test_other_versions_are_dropped_from_the_database(tmp_path):
+    path = str(tmp_path / "results.db")
+    ResultCache(path=path, version="old").put(123, 4, "e2e4", 30, ["e2e4"])
+    assert ResultCache(path=path, version="old").get(123, 4)["move"] == "e2e4"
+    assert ResultCache(path=path, version="new").get(123, 4) is None
+
+
+def search(cache, config):
+    return chess_ai.get_best_move(chess.Board(), depth=1, searcher=chess_ai.Searcher(), use_book=False,
+                                  result_cache=cache, config=config)
+
+
+def test_weights_change_the_cache_key(monkeypatch):
+    default = EngineConfig()
+    assert default.key != 0
+    assert EngineConfig(name="other", skill=5).key == default.key  # Only what the search finds counts
+    assert EngineConfig(weights={"mobility": 3}).key != default.key
+    assert EngineConfig(features={"quiescence": False}).key != default.key
+
+    # Editing the default weights changes the key of every profile that uses them
+    monkeypatch.setitem(engine_config.DEFAULT_WEIGHTS, "mobility", 3)
+    assert EngineConfig().key != default.key
+
+
+def test_changed_weight_misses_the_cache():
+    cache = ResultCache(version="test")
+    search(cache, EngineConfig())
+    search(cache, EngineConfig())
+    assert cache.stats()["hits"] == 1
+
+    search(cache, EngineConfig(weights={"mobility": 3}))
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["stores"] == 2
+
+
+def test_engine_version_covers_settings(monkeypatch):
+    monkeypatch.delenv("SYZYGY_PATH", raising=False)
+    version = result_cache.engine_version()
+    monkeypatch.setenv("SYZYGY_PATH", "/srv/syzygy")
+    assert result_cache.engine_version() != version
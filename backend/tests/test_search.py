@@ -0,0 +1,80 @@
+import threading
+
+import chess
+
+import chess_ai
+
+
+def test_stop_during_first_iteration_plays_the_first_ordered_move():
+    # Rook takes the hanging queen; the first legal move is a king move
+    board = chess.Board("4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1")
+    assert next(iter(board.legal_moves)).uci() != "d1d5"
+    stop = threading.Event()
+    stop.set()
+    move = chess_ai.get_best_move(board, depth=4, searcher=chess_ai.Searcher(), use_book=False, stop_event=stop)
+    assert move.uci() == "d1d5"
+
+
+def search_score(fen, depth):
+    searcher = chess_ai.Searcher()
+    chess_ai.get_best_move(chess.Board(fen), depth=depth, searcher=searcher, use_book=False)
+    return searcher.stats["score"]
+
+
+def test_games_ended_by_rule_are_draws():
+    # A queen up, but every move reaches the 75-move rule
+    assert search_score("8/8/8/4k3/8/8/8/Q3K3 w - - 149 100", 2) == 0
+    # Taking the last pawn leaves bare kings
+    assert search_score("8/8/8/8/6k1/4p3/3K4/8 w - - 0 1", 1) == 0
+
+
+def test_mate_in_two_with_a_warm_transposition_table():
+    board = chess.Board("7k/8/8/5K2/8/8/8/R7 w - - 0 1")
+    searcher = chess_ai.Searcher()
+    for _ in range(2):  # The second search starts from the first one's table
+        move = chess_ai.get_best_move(board, depth=4, searcher=searcher, use_book=False)
+        assert searcher.stats["score"] == chess_ai.MATE_SCORE - 3
+        assert len(searcher.stats["pv"]) == 3
+        line = board.copy()
+        for uci in searcher.stats["pv"]:
+            line.push_uci(uci)
+        assert line.is_checkmate()
+        assert move.uci() == searcher.stats["pv"][0]
+
+
+def minimax(searcher, board, depth, ply=0):
+    """Plain negamax over every move, with the same leaves as the searcher."""
+    if board.is_checkmate():
+        return -chess_ai.MATE_SCORE + ply
+    if board.is_game_over():
+        return 0
+    if depth == 0:
+        return searcher.quiescence(board, -chess_ai.INFINITY, chess_ai.INFINITY, ply)
+    best = -chess_ai.INFINITY
+    for move in list(board.legal_moves):
+        board.push(move)
+        best = max(best, -minimax(searcher, board, depth - 1, ply + 1))
+        board.pop()
+    return best
+
+
+def test_principal_variation_search_matches_minimax():
+    board = chess.Board("4k3/2p5/3q4/8/3P4/2N5/1B6/R3K3 w Q - 0 1")
+    searcher = chess_ai.Searcher()
+    # Sets the searcher up for this config; leaves are then static evaluations
+    config = chess_ai.DEFAULT_CONFIG.replace(features={"quiescence": False})
+    chess_ai.get_best_move(board, depth=1, searcher=searcher, use_book=False, config=config)
+    search_board = chess_ai.SearchBoard.from_board(board)
+    expected = minimax(searcher, search_board, 3)
+
+    def search(alpha, beta):
+        searcher.transposition_table.clear()
+        return searcher.negamax(search_board, 3, alpha, beta, 0)
+
+    assert search(-chess_ai.INFINITY, chess_ai.INFINITY) == expected
+    assert search(expected - 1, expected + 1) == expected
+    # Fail-soft bounds around the true score are exact
+    assert search(expected, expected + 1) == expected
+    assert search(expected - 1, expected) == expected
+    assert search(expected + 50, expected + 51) <= expected + 50
+    assert search(expected - 51, expected - 50) >= expected - 50
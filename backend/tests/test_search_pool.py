@@ -0,0 +1,52 @@
+import time
+
+import chess
+import pytest
+
+from search_pool import PoolSaturated, SearchExecutor
+
+# Out of book, so the search really runs
+FEN = "r2q1rk1/pp2bppp/2n1bn2/3p4/3P4/2NBBN2/PP3PPP/R2Q1RK1 w - - 0 1"
+LONG_SEARCH = {"movetime": 60000, "depth": None}
+
+
+@pytest.fixture
+def executor():
+    executor = SearchExecutor(workers=1, max_queue=1)
+    yield executor
+    executor.shutdown()
+
+
+def test_cancelled_searches_free_their_slots(executor):
+    running = executor.submit(FEN, budget=LONG_SEARCH)
+    queued = executor.submit(FEN, budget=LONG_SEARCH)
+    with pytest.raises(PoolSaturated):
+        executor.submit(FEN, budget=LONG_SEARCH)
+
+    started = time.time()
+    queued.cancel()
+    running.cancel()
+    # A running search stops at its next node and still returns its best move;
+    # a queued one is dropped (or, if the pool already took it, stops at once)
+    assert running.result(timeout=30)["move"] is not None
+    if not queued.future.cancelled():
+        assert queued.result(timeout=30)["move"] is not None
+    assert time.time() - started < 30
+
+    metrics = executor.metrics()
+    assert metrics["cancelled"] + metrics["completed"] == 2
+    assert metrics["in_flight"] == 0
+    executor.search(chess.Board(FEN), budget={"depth": 1}, timeout=30)
+
+
+def test_late_cancel_does_not_stop_the_next_job_in_its_slot():
+    executor = SearchExecutor(workers=1, max_queue=0)
+    try:
+        finished = executor.submit(FEN, budget={"depth": 1})
+        finished.result(timeout=30)
+        next_job = executor.submit(FEN, budget={"depth": 3})
+        assert next_job.slot == finished.slot
+        finished.cancel()  # E.g. a ponder search stopped after it finished
+        assert next_job.result(timeout=60)["depth"] == 3
+    finally:
+        executor.shutdown()
@@ -0,0 +1,44 @@
+import chess
+import pytest
+
+from sessions import SessionConflict, SQLiteSessionStore
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Two stores on one database, as two gunicorn workers would have."""
+    path = str(tmp_path / "sessions.db")
+    return SQLiteSessionStore(path), SQLiteSessionStore(path)
+
+
+def test_checkout_saves_and_other_store_reloads(stores):
+    first, second = stores
+    game_id = first.create().game_id
+    with first.checkout(game_id) as session:
+        session.profile = "casual"
+        session.push(chess.Move.from_uci("e2e4"))
+
+    session = second.get(game_id)
+    assert session.version == 1
+    assert session.profile == "casual"
+    assert [move.uci() for move in session.board.move_stack] == ["e2e4"]
+
+
+def test_stale_save_conflicts_and_reloads(stores):
+    first, second = stores
+    game_id = first.create().game_id
+    stale = second.get(game_id)
+    with first.checkout(game_id) as session:
+        session.push(chess.Move.from_uci("e2e4"))
+
+    stale.push(chess.Move.from_uci("d2d4"))
+    with pytest.raises(SessionConflict):
+        second.save(stale)
+    assert stale.version == -1
+
+    # The other worker's move wins; the next checkout sees it
+    with second.checkout(game_id) as session:
+        assert [move.uci() for move in session.board.move_stack] == ["e2e4"]
+        session.push(chess.Move.from_uci("e7e5"))
+    assert first.get(game_id).board.fen() == second.get(game_id).board.fen()
+    assert first.get(game_id).version == 2
@@ -0,0 +1,57 @@
+import chess
+
+import chess_ai
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    # Castling both ways, pins, en passant and promotions within a few plies
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k1n1/2br4/1R6/2pnP3/2Pp2N1/1P4BP/1P3P1P/5K1R b q c3 0 36",
+    "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",
+]
+
+
+def check_tree(board, depth, killers_by_ply, history, ply=0):
+    """
+    Compares staged_moves with legal_moves at every node. The killers are
+    all quiet moves of the last position searched at the same ply (the
+    search keeps two), to try many moves that need not be legal here.
+    """
+    killers = killers_by_ply[ply]
+    legal = list(board.legal_moves)
+    tt_move = legal[len(legal) // 2] if legal else None
+    staged = list(chess_ai.staged_moves(board, tt_move, killers, history))
+    assert len(staged) == len(set(staged)), board.fen()
+    assert set(staged) == set(legal), board.fen()
+    if tt_move is not None:
+        assert staged[0] == tt_move
+
+    quiet = [move for move in legal if not board.is_capture(move) and not move.promotion]
+    killers_by_ply[ply] = quiet + [None]
+    if depth > 1:
+        for move in legal:
+            board.push(move)
+            check_tree(board, depth - 1, killers_by_ply, history, ply + 1)
+            board.pop()
+
+
+def test_staged_moves_are_the_legal_moves():
+    history = [0] * 8192
+    for fen in POSITIONS:
+        check_tree(chess.Board(fen), 3, [[None] for _ in range(4)], history)
+
+
+def test_king_takes_rook_killer_is_not_a_second_castling_move():
+    board = chess.Board("r3k1n1/2br4/1R6/2pnP3/2Pp2N1/1P4BP/1P3P1P/5K1R b q c3 0 36")
+    staged = [move.uci() for move in chess_ai.staged_moves(board, killers=[chess.Move.from_uci("e8a8"), None])]
+    assert "e8a8" not in staged
+    assert staged.count("e8c8") == 1
+
+
+def test_captures_come_before_quiet_moves():
+    board = chess.Board("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    staged = list(chess_ai.staged_moves(board))
+    captures = [board.is_capture(move) or bool(move.promotion) for move in staged]
+    assert captures == sorted(captures, reverse=True)
+    assert staged == chess_ai.order_moves(board)
@@ -0,0 +1,96 @@
+import chess
+import chess.syzygy
+import pytest
+
+import chess_ai
+import tablebase
+
+
+class FakeTablebase:
+    """
+    Stands in for chess.syzygy.Tablebase: whoever has the rook wins, faster
+    (by DTZ) while Black keeps its pawn; positions with a queen are missing.
+    """
+
+    def __init__(self):
+        self.wdl_probes = 0
+
+    def probe_wdl(self, board):
+        self.wdl_probes += 1
+        if board.queens:
+            raise chess.syzygy.MissingTableError("KQvK")
+        if not board.rooks:
+            return 0
+        return 2 if board.rooks & board.occupied_co[board.turn] else -2
+
+    def probe_dtz(self, board):
+        wdl = self.probe_wdl(board)
+        dtz = 3 if board.pawns else 15
+        return dtz if wdl > 0 else -dtz if wdl < 0 else 0
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_tablebase(monkeypatch):
+    fake = FakeTablebase()
+    monkeypatch.setattr(tablebase, "_tablebase", fake)
+    monkeypatch.setattr(tablebase, "_opened", True)
+    monkeypatch.setattr(tablebase, "_max_pieces", 4)
+    monkeypatch.setattr(tablebase, "_wdl_cache", {})
+    return fake
+
+
+def test_no_tables_configured(monkeypatch):
+    monkeypatch.delenv("SYZYGY_PATH", raising=False)
+    tablebase.close()
+    board = chess.Board("8/8/8/8/8/2k5/8/R3K3 w - - 0 1")
+    assert tablebase.get_tablebase() is None
+    assert tablebase.probe_wdl(board) is None
+    assert tablebase.probe_root(board) is None
+    tablebase.close()
+
+
+def test_wdl_score():
+    assert tablebase.wdl_score(2, ply=3) == tablebase.TB_WIN_SCORE - 3
+    assert tablebase.wdl_score(-2, ply=3) == -tablebase.TB_WIN_SCORE + 3
+    # Cursed wins and blessed losses are draws under the 50-move rule
+    assert [tablebase.wdl_score(wdl) for wdl in (-1, 0, 1)] == [0, 0, 0]
+
+
+def test_probe_wdl_is_cached(fake_tablebase):
+    board = chess.Board("8/8/8/8/8/2k5/8/R3K3 b - - 0 1")
+    cache_hits = tablebase.stats["cache_hits"]
+    assert tablebase.probe_wdl(board) == -2
+    assert tablebase.probe_wdl(board) == -2
+    assert fake_tablebase.wdl_probes == 1
+    assert tablebase.stats["cache_hits"] == cache_hits + 1
+    # Missing tables, castling rights or too many pieces: no probe
+    assert tablebase.probe_wdl(chess.Board("8/8/8/8/8/2k5/8/Q3K3 b - - 0 1")) is None
+    assert tablebase.probe_wdl(chess.Board("4k3/8/8/8/8/8/8/R3K3 w Q - 0 1")) is None
+    assert tablebase.probe_wdl(chess.Board("4k3/8/8/8/8/8/1PP5/R3K3 w - - 0 1")) is None
+
+
+def test_probe_root_prefers_a_winning_zeroing_move(fake_tablebase):
+    # Rxa5 resets the 50-move counter; the fake rates the other wins faster
+    board = chess.Board("7k/8/8/p7/8/8/8/R3K3 w - - 0 1")
+    assert tablebase.probe_root(board) == (chess.Move.from_uci("a1a5"), 2)
+    # Losing: put off the next zeroing move, so a king move rather than ...a4
+    board = chess.Board("7k/8/8/p7/8/8/8/R3K3 b - - 0 1")
+    move, wdl = tablebase.probe_root(board)
+    assert wdl == -2 and move.from_square == chess.H8
+
+
+def test_probe_root_plays_mate_at_once(fake_tablebase):
+    board = chess.Board("7k/8/6K1/8/8/8/8/R7 w - - 0 1")
+    assert tablebase.probe_root(board) == (chess.Move.from_uci("a1a8"), 2)
+
+
+def test_search_plays_the_tablebase_move(fake_tablebase):
+    searcher = chess_ai.Searcher()
+    board = chess.Board("7k/8/8/p7/8/8/8/R3K3 w - - 0 1")
+    move = chess_ai.get_best_move(board, depth=3, searcher=searcher, use_book=False)
+    assert move == chess.Move.from_uci("a1a5")
+    assert searcher.stats["source"] == "tablebase"
+    assert searcher.stats["score"] == tablebase.TB_WIN_SCORE
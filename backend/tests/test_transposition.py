@@ -0,0 +1,51 @@
+import chess
+
+from chess_ai import (MATE_SCORE, TT_EXACT, TT_LOWER, TT_UPPER, WIN_BOUND, TranspositionTable, score_from_tt,
+                      score_to_tt)
+
+
+def test_store_and_probe():
+    tt = TranspositionTable(size_mb=1)
+    key = 0x123456789ABCDEF
+    assert tt.probe(key) is None
+    tt.store(key, 5, -42, TT_LOWER, chess.Move.from_uci("e2e4"))
+    assert tt.probe(key) == (5, -42, TT_LOWER, chess.Move.from_uci("e2e4"))
+    tt.store(key, 6, 17, TT_EXACT, chess.Move.from_uci("a7a8n"))
+    assert tt.probe(key) == (6, 17, TT_EXACT, chess.Move.from_uci("a7a8n"))
+    # No new move: the old one stays for move ordering
+    tt.store(key, 7, 3, TT_UPPER)
+    assert tt.probe(key) == (7, 3, TT_UPPER, chess.Move.from_uci("a7a8n"))
+    assert tt.get_move(key) == chess.Move.from_uci("a7a8n")
+    assert tt.get_move(key ^ 1) is None
+    assert (tt.hits, tt.misses, tt.stores) == (3, 1, 3)
+
+
+def test_replacement_prefers_depth_then_age():
+    tt = TranspositionTable(size_mb=1)
+    deep, shallow = 1, 1 + tt.size  # Same slot
+    tt.store(deep, 8, 100, TT_EXACT)
+    tt.store(shallow, 2, 5, TT_EXACT)
+    assert tt.probe(deep) == (8, 100, TT_EXACT, None)
+    assert tt.probe(shallow) is None
+    assert tt.collisions == 1
+
+    # Entries of an older search give way
+    tt.new_search()
+    tt.store(shallow, 2, 5, TT_EXACT)
+    assert tt.probe(shallow) == (2, 5, TT_EXACT, None)
+    assert tt.probe(deep) is None
+
+    tt.clear()
+    assert tt.probe(shallow) is None
+
+
+def test_mate_scores_are_stored_relative_to_their_node():
+    mate_in_3 = MATE_SCORE - 5  # Found 5 plies from the root
+    stored = score_to_tt(mate_in_3, 2)
+    assert stored == MATE_SCORE - 3  # Mate 3 plies from the node at ply 2
+    assert score_from_tt(stored, 2) == mate_in_3
+    assert score_from_tt(stored, 4) == MATE_SCORE - 7  # The same node reached 2 plies later
+    assert score_from_tt(score_to_tt(-mate_in_3, 2), 2) == -mate_in_3
+    # Ordinary scores are stored as they are
+    for score in (0, 250, -WIN_BOUND):
+        assert score_to_tt(score, 9) == score_from_tt(score, 9) == score
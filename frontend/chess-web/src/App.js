@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import Chessboard from "chessboardjsx";
 import axios from "axios";
 import "./App.css";
@@ -34,6 +34,22 @@ function playSound(type) {
 }
 
 
+// Plays the sound for a move event from the game stream.
+function playMoveSound(data) {
+  if (data.checkmate) {
+      playSound("checkmate");
+  } else if (data.check) {
+      playSound("check");
+  } else if (data.capture) {
+      playSound("capture");
+  } else if (data.castling) {
+      playSound("castle");
+  } else {
+      playSound("move");
+  }
+}
+
+
 function ChessApp() {
     const [fen, setFen] = useState("start");
     const [playerColor, setPlayerColor] = useState(null);
@@ -42,16 +58,74 @@ function ChessApp() {
     const [selectedSquare, setSelectedSquare] = useState(null);
     const [showPromotionModal, setShowPromotionModal] = useState(false);
     const [pendingMove, setPendingMove] = useState(null);
+    const [gameId, setGameId] = useState(null);
+    const [aiProgress, setAiProgress] = useState(null);
+    // Last move shown (UCI), so a resync does not announce it twice
+    const lastMove = useRef(null);
 
     useEffect(() => {
-        if (playerColor) {
+        if (playerColor && gameId) {
             fetchBoard();
         }
-    }, [playerColor]);
+    }, [playerColor, gameId]);
+
+    // One event stream per game carries our move's ack, the bot's progress and its reply
+    useEffect(() => {
+        if (!gameId) return;
+        const events = new EventSource(`${API_URL}/games/${gameId}/events`);
+        // Moves played through another server worker, or while reconnecting, only arrive as a state
+        events.addEventListener("state", e => {
+            const data = JSON.parse(e.data);
+            setFen(data.fen);
+            setAiProgress(null);
+            if (data.last_move && data.last_move !== lastMove.current) {
+                playMoveSound(data);
+            }
+            lastMove.current = data.last_move;
+            setIsCheckmate(data.checkmate);
+            if (data.checkmate) {
+                // The side to move is the one that got mated
+                setWinner(data.turn === playerColor ? "Checkmate! You lost to the bot! 🤖"
+                                                    : "Checkmate! You won against the bot! 🎉");
+            } else {
+                setWinner("");
+            }
+        });
+        events.addEventListener("ack", e => {
+            const data = JSON.parse(e.data);
+            setFen(data.fen);
+            lastMove.current = data.last_move;
+            playMoveSound(data);
+            if (data.checkmate) {
+                setIsCheckmate(true);
+                setWinner("Checkmate! You won against the bot! 🎉");
+            }
+        });
+        events.addEventListener("progress", e => setAiProgress(JSON.parse(e.data)));
+        events.addEventListener("ai_move", e => {
+            const data = JSON.parse(e.data);
+            setAiProgress(null);
+            if (data.status === "success") {
+                setFen(data.fen);
+                lastMove.current = data.move;
+                playMoveSound(data);
+                if (data.checkmate) {
+                    setIsCheckmate(true);
+                    setWinner("Checkmate! You lost to the bot! 🤖");
+                }
+            }
+        });
+        events.addEventListener("error", e => {
+            setAiProgress(null);
+            if (e.data) console.error("Error getting AI move:", JSON.parse(e.data).error);
+        });
+        return () => events.close();
+    }, [gameId, playerColor]);
 
     const selectColor = async (color) => {
         try {
             const response = await axios.post(`${API_URL}/set_color`, { color });
+            setGameId(response.data.game_id);
             setPlayerColor(color);
             setFen(response.data.fen);
             setIsCheckmate(false);
@@ -62,7 +136,7 @@ function ChessApp() {
 
     const fetchBoard = async () => {
       try {
-          const response = await axios.get(`${API_URL}/get_board`);
+          const response = await axios.get(`${API_URL}/get_board`, { params: { game_id: gameId } });
           setFen(response.data.fen);
   
           if (response.data.checkmate) {
@@ -78,7 +152,8 @@ function ChessApp() {
     if (!playerColor) return;
 
     try {
-        const response = await axios.post(`${API_URL}/set_color`, { color: playerColor });
+        const response = await axios.post(`${API_URL}/set_color`, { color: playerColor, game_id: gameId });
+        setGameId(response.data.game_id);
         setFen(response.data.fen);
         setIsCheckmate(false);
         setWinner("");
@@ -89,6 +164,7 @@ function ChessApp() {
 
     const goBack = () => {
         setPlayerColor(null);
+        setGameId(null);
         setFen("start");
         setIsCheckmate(false);
     };
@@ -97,65 +173,15 @@ function ChessApp() {
       if (!playerColor || isCheckmate) return;
   
       try {
-          // Step 1: Make the player's move
-          const playerResponse = await axios.post(`${API_URL}/player_move`, { move });
+          // The ack and the bot's reply arrive on the game's event stream
+          const response = await axios.post(`${API_URL}/games/${gameId}/move`, { move });
           
           // Check if this move requires promotion
-          if (playerResponse.data.promotion) {
+          if (response.data.promotion && !response.data.last_move) {
               setPendingMove(move);
               setShowPromotionModal(true);
               return;
           }
-          
-          // Update board with player's move immediately
-          setFen(playerResponse.data.fen);
-  
-          // Play player move sound
-          if (playerResponse.data.checkmate) {
-              playSound("checkmate");
-              setIsCheckmate(true);
-              setWinner("Checkmate! You won against the bot! 🎉");
-              setSelectedSquare(null);
-              return;
-          } else if (playerResponse.data.check) {
-              playSound("check");
-          } else if (playerResponse.data.capture) {
-              playSound("capture");
-          } else if (playerResponse.data.castling) {
-              playSound("castling");
-          } else {
-              playSound("move");
-          }
-          
-          // Step 2: Get AI move after a short delay
-          setTimeout(async () => {
-              try {
-                  const aiResponse = await axios.get(`${API_URL}/ai_move`);
-                  
-                  if (aiResponse.data.status === "success") {
-                      // Update board with AI move
-                      setFen(aiResponse.data.fen);
-                      
-                      // Play AI move sound
-                      if (aiResponse.data.checkmate) {
-                          playSound("checkmate");
-                          setIsCheckmate(true);
-                          setWinner("Checkmate! You lost to the bot! 🤖");
-                      } else if (aiResponse.data.check) {
-                          playSound("check");
-                      } else if (aiResponse.data.capture) {
-                          playSound("capture");
-                      } else if (aiResponse.data.castling) {
-                          playSound("castling");
-                      } else {
-                          playSound("move");
-                      }
-                  }
-              } catch (error) {
-                  console.error("Error getting AI move:", error);
-              }
-          }, 500); // 500ms delay before AI moves
-          
       } catch (error) {
           console.error("Illegal move");
       }
@@ -167,56 +193,9 @@ function ChessApp() {
         if (!pendingMove) return;
         
         try {
-            // Step 1: Handle promotion move
-            const promotionResponse = await axios.post(`${API_URL}/promote`, { 
-                move: pendingMove, 
-                promotion: promotionPiece 
-            });
-            
-            setFen(promotionResponse.data.fen);
+            await axios.post(`${API_URL}/games/${gameId}/move`, { move: pendingMove + promotionPiece });
             setShowPromotionModal(false);
             setPendingMove(null);
-            
-            // Play promotion sound
-            playSound("move");
-            
-            // Check for checkmate after promotion
-            if (promotionResponse.data.checkmate) {
-                playSound("checkmate");
-                setIsCheckmate(true);
-                setWinner("Checkmate! You won against the bot! 🎉");
-                return;
-            }
-            
-            // Step 2: Get AI move after promotion
-            setTimeout(async () => {
-                try {
-                    const aiResponse = await axios.get(`${API_URL}/ai_move`);
-                    
-                    if (aiResponse.data.status === "success") {
-                        // Update board with AI move
-                        setFen(aiResponse.data.fen);
-                        
-                        // Play AI move sound
-                        if (aiResponse.data.checkmate) {
-                            playSound("checkmate");
-                            setIsCheckmate(true);
-                            setWinner("Checkmate! You lost to the bot! 🤖");
-                        } else if (aiResponse.data.check) {
-                            playSound("check");
-                        } else if (aiResponse.data.capture) {
-                            playSound("capture");
-                        } else if (aiResponse.data.castling) {
-                            playSound("castling");
-                        } else {
-                            playSound("move");
-                        }
-                    }
-                } catch (error) {
-                    console.error("Error getting AI move after promotion:", error);
-                }
-            }, 500); // 500ms delay before AI moves
-            
         } catch (error) {
             console.error("Error promoting pawn:", error);
         }
@@ -263,6 +242,11 @@ function ChessApp() {
                     [selectedSquare]: { backgroundColor: "rgba(255, 255, 0, 0.5)" } //Highlight selected piece
                 }}
             />
+            {aiProgress && (
+                <p className="ai-progress">
+                    Bot thinking: depth {aiProgress.depth}, best {aiProgress.best_move}
+                </p>
+            )}
             <div className="buttons">
                 <button onClick={restartGame}>Restart Game</button>
                 <button onClick={goBack}>Go Back</button>